@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+# Microbenchmark of the conversion of a LogCreate (as received by the API) into the
+# Elasticsearch document of the log.
+#
+# Usage: bench-log-serialization.py [ITERATIONS]
+
+import sys
+import time
+import uuid
+
+from auditize.log.models import Emitter, EmitterType, Log, LogCreate
+
+LOG_DATA = {
+    "action": {"type": "create_configuration_profile", "category": "configuration"},
+    "source": [
+        {"name": "ip", "value": "127.0.0.1"},
+        {"name": "user_agent", "value": "Mozilla/5.0"},
+    ],
+    "actor": {
+        "type": "user",
+        "ref": "user:123",
+        "name": "User 123",
+        "extra": [
+            {"name": "role", "value": "admin", "type": "enum"},
+            {"name": "enabled", "value": True},
+        ],
+    },
+    "resource": {
+        "type": "config_profile",
+        "ref": "config_profile:123",
+        "name": "Config Profile 123",
+        "extra": [{"name": "some_key", "value": "some_value"}],
+    },
+    "details": [
+        {"name": "field_name_1", "value": "value 1"},
+        {"name": "count", "value": 42},
+        {"name": "ratio", "value": 0.5},
+        {"name": "date", "value": "2024-01-01T00:00:00Z", "type": "datetime"},
+    ],
+    "tags": [
+        {"type": "security"},
+        {"type": "rich_tag", "ref": "rich_tag:1", "name": "Rich tag"},
+    ],
+    "entity_path": [
+        {"ref": "1", "name": "Customer 1"},
+        {"ref": "1:1", "name": "Entity A"},
+        {"ref": "1:1:1", "name": "Entity B"},
+    ],
+}
+
+EMITTER = Emitter(type=EmitterType.APIKEY, id=uuid.uuid4(), name="API key")
+
+
+def legacy_path(log_create: LogCreate) -> dict:
+    log_json = log_create.model_dump()
+    log_json["id"] = uuid.uuid4()
+    log_json["emitter"] = EMITTER.model_dump()
+    return Log.model_validate(log_json).model_dump(context="es")
+
+
+def fast_path(log_create: LogCreate) -> dict:
+    return Log.from_log_create(
+        log_create, id=uuid.uuid4(), emitter=EMITTER
+    ).to_es_document()
+
+
+def bench(func, log_create: LogCreate, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(log_create)
+    return iterations / (time.perf_counter() - start)
+
+
+def main(argv):
+    iterations = int(argv[0]) if argv else 20_000
+    log_create = LogCreate.model_validate(LOG_DATA)
+
+    # warm up
+    bench(legacy_path, log_create, 100)
+    bench(fast_path, log_create, 100)
+
+    legacy = bench(legacy_path, log_create, iterations)
+    fast = bench(fast_path, log_create, iterations)
+    print(f"model_dump / model_validate / model_dump: {legacy:10.0f} logs/s")
+    print(f"from_log_create / to_es_document:         {fast:10.0f} logs/s")
+    print(f"speedup: x{fast / legacy:.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -16,6 +16,7 @@ import httpx
 from auditize.config import init_config
 from auditize.database import init_dbm
 from auditize.database.dbm import open_db_session
+from auditize.log.attachment_store import AttachmentContent
 from auditize.log.models import Emitter, EmitterType, Log, LogCreate
 from auditize.log.service import LogService
 
@@ -685,29 +686,28 @@ class ApiInjector:
         self.client = httpx.AsyncClient()
 
     async def __call__(self, log, attachments):
+        # NB: the log and its attachments are sent in a single request
         resp = await self.client.post(
-            f"{self.base_url}/api/repos/{self.repo_id}/logs",
+            f"{self.base_url}/api/repos/{self.repo_id}/logs/multipart",
             headers={"Authorization": f"Bearer {self.api_key}"},
-            json={**log, "emitted_at": self.datetime_provider.get_datetime_str()},
+            data={
+                "log": json.dumps(
+                    {**log, "emitted_at": self.datetime_provider.get_datetime_str()}
+                ),
+                "attachments": json.dumps(
+                    [{"type": attachment["type"]} for attachment in attachments]
+                ),
+            },
+            files=[
+                ("files", (attachment["name"], attachment["data"]))
+                for attachment in attachments
+            ],
         )
         if resp.is_error:
             sys.exit(
                 "Error %s while pushing log:\n%s"
                 % (resp.status_code, jsonify(resp.text))
             )
-        log_id = resp.json()["id"]
-        for attachment in attachments:
-            resp = await self.client.post(
-                f"{self.base_url}/api/repos/{self.repo_id}/logs/{log_id}/attachments",
-                headers={"Authorization": f"Bearer " + self.api_key},
-                files={"file": (attachment["name"], attachment["data"])},
-                data={"type": attachment["type"]},
-            )
-            if resp.is_error:
-                sys.exit(
-                    "Error %s while pushing attachment: %s"
-                    % (resp.status_code, jsonify(resp.text))
-                )
 
 
 class ServiceInjector:
@@ -726,24 +726,25 @@ class ServiceInjector:
         log_model.emitted_at = self.datetime_provider.get_datetime()
         async with open_db_session() as db_session:
             log_service = await LogService.for_maintenance(db_session, self.repo_id)
-            log = await log_service.create_log(
+            await log_service.create_log_with_attachments(
                 log_model,
                 Emitter(
                     type=EmitterType.APIKEY,
                     id="00000000-0000-0000-0000-000000000000",
                     name="UNKNOWN",
                 ),
+                [
+                    (
+                        Log.Attachment(
+                            name=attachment["name"],
+                            type=attachment["type"],
+                            mime_type="text/plain",
+                        ),
+                        AttachmentContent.from_bytes(attachment["data"]),
+                    )
+                    for attachment in attachments
+                ],
             )
-            for attachment in attachments:
-                await log_service.save_log_attachment(
-                    log.id,
-                    Log.Attachment(
-                        name=attachment["name"],
-                        type=attachment["type"],
-                        mime_type="text/plain",
-                        data=attachment["data"],
-                    ),
-                )
 
 
 # Adapted from https://death.andgravity.com/limit-concurrency#asyncio-wait
@@ -158,6 +158,32 @@ async def reindex_repo(repo: UUID | None):
             return
 
 
+async def ingest_worker(batch_size: int, poll_interval: float, once: bool):
+    _lazy_init()
+    if not once:
+        print("Ingest worker started")
+    while True:
+        try:
+            async with open_db_session() as session:
+                count = await LogService.process_ingestion_queue(
+                    session, limit=batch_size
+                )
+        except asyncio.CancelledError:
+            return
+        except Exception as exc:
+            if once:
+                raise
+            print(
+                f"Error while processing the log ingestion queue: {exc}",
+                file=sys.stderr,
+            )
+            count = 0
+        if count == 0:
+            if once:
+                return
+            await asyncio.sleep(poll_interval)
+
+
 async def schedule():
     _lazy_init()
     scheduler = build_scheduler()
@@ -267,6 +293,34 @@ async def async_main(args=None):
     )
     reindex_repo_parser.set_defaults(func=lambda cmd_args: reindex_repo(cmd_args.repo))
 
+    # CMD ingest-worker
+    ingest_worker_parser = sub_parsers.add_parser(
+        "ingest-worker",
+        help="Save the logs of the ingestion queue into Elasticsearch",
+    )
+    ingest_worker_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Maximum number of logs to process at once",
+    )
+    ingest_worker_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Delay in seconds before checking again an empty queue",
+    )
+    ingest_worker_parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Exit as soon as the queue is empty",
+    )
+    ingest_worker_parser.set_defaults(
+        func=lambda cmd_args: ingest_worker(
+            cmd_args.batch_size, cmd_args.poll_interval, cmd_args.once
+        )
+    )
+
     # CMD schedule
     schedule_parser = sub_parsers.add_parser(
         "schedule", help="Schedule Auditize periodic tasks"
@@ -1,3 +1,4 @@
+import math
 from typing import TypeVar
 
 from fastapi import status
@@ -13,6 +14,7 @@ from auditize.exceptions import (
     NotFoundError,
     PayloadTooLarge,
     PermissionDenied,
+    RateLimitExceeded,
     ValidationError,
 )
 from auditize.i18n import Lang, t
@@ -139,6 +141,11 @@ _EXCEPTION_RESPONSES = {
         "Payload too large",
         ApiErrorResponse,
     ),
+    RateLimitExceeded: (
+        status.HTTP_429_TOO_MANY_REQUESTS,
+        "Too many requests",
+        ApiErrorResponse,
+    ),
     InternalError: (
         status.HTTP_500_INTERNAL_SERVER_ERROR,
         "Internal server error",
@@ -160,6 +167,7 @@ _STATUS_CODE_TO_RESPONSE = {
     status.HTTP_404_NOT_FOUND: (ApiErrorResponse, "Not found"),
     status.HTTP_409_CONFLICT: (ApiErrorResponse, "Constraint violation"),
     status.HTTP_413_CONTENT_TOO_LARGE: (ApiErrorResponse, "Payload too large"),
+    status.HTTP_429_TOO_MANY_REQUESTS: (ApiErrorResponse, "Too many requests"),
     status.HTTP_500_INTERNAL_SERVER_ERROR: (ApiErrorResponse, "Internal server error"),
 }
 
@@ -180,14 +188,27 @@ def make_error_response_from_model(
     return JSONResponse(status_code=status_code, content=model.model_dump())
 
 
-def make_error_response_from_exception(exc: E, lang: Lang) -> JSONResponse:
+def build_error_response_from_exception(
+    exc: E, lang: Lang
+) -> tuple[int, ApiErrorResponse]:
     if exc.__class__ not in _EXCEPTION_RESPONSES:
-        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-        error = ApiErrorResponse.build("Internal server error")
-    else:
-        status_code, default_error_message, error_response_class = _EXCEPTION_RESPONSES[
-            exc.__class__
-        ]
-        error = error_response_class.from_exception(exc, default_error_message, lang)
-
-    return make_error_response_from_model(error, status_code)
+        return (
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            ApiErrorResponse.build("Internal server error"),
+        )
+
+    status_code, default_error_message, error_response_class = _EXCEPTION_RESPONSES[
+        exc.__class__
+    ]
+    return (
+        status_code,
+        error_response_class.from_exception(exc, default_error_message, lang),
+    )
+
+
+def make_error_response_from_exception(exc: E, lang: Lang) -> JSONResponse:
+    status_code, error = build_error_response_from_exception(exc, lang)
+    response = make_error_response_from_model(error, status_code)
+    if isinstance(exc, RateLimitExceeded):
+        response.headers["Retry-After"] = str(math.ceil(exc.retry_after))
+    return response
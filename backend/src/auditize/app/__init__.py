@@ -1,17 +1,31 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from auditize.app.app_api import build_app as build_api_app
 from auditize.app.app_static import build_app as build_static_app
 from auditize.config import get_config, init_config
 from auditize.database import init_dbm
+from auditize.log.attachment_store import close_attachment_store
+from auditize.log.buffer import close_log_write_buffer
 
 __all__ = ("build_app", "build_api_app", "app_factory")
 
 
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    yield
+    # Make sure that the logs still waiting in the write buffer are saved
+    # before shutting down
+    await close_log_write_buffer()
+    await close_attachment_store()
+
+
 def build_app():
     # This function is intended to be used in a context where
     # config and core db have already been initialized
-    app = FastAPI(openapi_url=None)
+    # NB: the lifespan of mounted apps is not run, it must be set on the main app
+    app = FastAPI(openapi_url=None, lifespan=_lifespan)
     config = get_config()
     app.mount(
         "/api",
@@ -15,6 +15,14 @@ _DEFAULT_EXPORT_MAX_ROWS = 10_000
 _DEFAULT_USER_SESSION_TOKEN_LIFETIME = 60 * 60 * 12  # 12 hours
 _DEFAULT_ACCESS_TOKEN_LIFETIME = 10 * 60  # 10 minutes
 _DEFAULT_LOG_EXPIRATION_SCHEDULE = "0 1 * * *"
+_DEFAULT_LOG_WRITE_BUFFER_LATENCY = 50  # 50 milliseconds
+_DEFAULT_LOG_ENTITY_CACHE_SIZE = 100_000
+_DEFAULT_LOG_ENTITY_CACHE_TTL = 60 * 60  # 1 hour
+_DEFAULT_LOG_CUSTOM_FIELD_TYPE_CACHE_TTL = 60  # 1 minute
+_DEFAULT_LOG_SEARCH_CACHE_TTL = 10  # 10 seconds
+_DEFAULT_LOG_AGGREGATION_CACHE_TTL = 10  # 10 seconds
+_DEFAULT_LOG_IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # 24 hours
+_DEFAULT_LOG_WRITE_RATE_LIMIT_BURST = 10  # seconds
 
 
 @dataclasses.dataclass
@@ -44,6 +52,27 @@ class Config:
     test_mode: bool
     online_doc: bool
     log_expiration_schedule: str
+    log_write_buffer_size: int
+    log_write_buffer_latency: int
+    log_entity_cache_size: int
+    log_entity_cache_ttl: int
+    log_custom_field_type_cache_ttl: int
+    log_search_cache_size: int
+    log_search_cache_ttl: int
+    log_aggregation_cache_ttl: int
+    log_ingestion_queue: bool
+    log_idempotency_key_ttl: int
+    log_write_rate_limit_apikey: float
+    log_write_rate_limit_repo: float
+    log_write_rate_limit_burst: float
+    attachment_store: str
+    attachment_store_path: str | None
+    attachment_s3_endpoint_url: str | None
+    attachment_s3_bucket: str | None
+    attachment_s3_region: str
+    attachment_s3_access_key_id: str | None
+    attachment_s3_secret_access_key: str | None
+    attachment_compression: bool
 
     @staticmethod
     def _validate_list(value):
@@ -57,6 +86,12 @@ class Config:
             return False
         raise ValueError(f"must be either 'true' or 'false'")
 
+    @staticmethod
+    def _validate_attachment_store(value):
+        if value not in ("elasticsearch", "filesystem", "s3"):
+            raise ValueError("must be either 'elasticsearch', 'filesystem' or 's3'")
+        return value
+
     @staticmethod
     def _validate_cron_expr(value):
         try:
@@ -83,6 +118,27 @@ class Config:
                 "- AUDITIZE_SMTP_PASSWORD\n"
             )
 
+        if self.attachment_store == "filesystem" and not self.attachment_store_path:
+            raise ConfigError(
+                "Attachment store configuration is incomplete, please provide AUDITIZE_ATTACHMENT_STORE_PATH"
+            )
+
+        if self.attachment_store == "s3" and not all(
+            (
+                self.attachment_s3_endpoint_url,
+                self.attachment_s3_bucket,
+                self.attachment_s3_access_key_id,
+                self.attachment_s3_secret_access_key,
+            )
+        ):
+            raise ConfigError(
+                "Attachment store configuration is incomplete, please provide all of the following environment variables:\n"
+                "- AUDITIZE_ATTACHMENT_S3_ENDPOINT_URL\n"
+                "- AUDITIZE_ATTACHMENT_S3_BUCKET\n"
+                "- AUDITIZE_ATTACHMENT_S3_ACCESS_KEY_ID\n"
+                "- AUDITIZE_ATTACHMENT_S3_SECRET_ACCESS_KEY\n"
+            )
+
         if bool(self.elastic_user) ^ bool(self.elastic_password):
             raise ConfigError(
                 "ElasticSearch configuration is incomplete, please provide both AUDITIZE_ES_USER and AUDITIZE_ES_PASSWORD"
@@ -161,6 +217,95 @@ class Config:
                     validator=cls._validate_cron_expr,
                     default=_DEFAULT_LOG_EXPIRATION_SCHEDULE,
                 ),
+                log_write_buffer_size=optional(
+                    "AUDITIZE_LOG_WRITE_BUFFER_SIZE",
+                    default=0,
+                    validator=int,
+                ),
+                log_write_buffer_latency=optional(
+                    "AUDITIZE_LOG_WRITE_BUFFER_LATENCY",
+                    default=_DEFAULT_LOG_WRITE_BUFFER_LATENCY,
+                    validator=int,
+                ),
+                log_entity_cache_size=optional(
+                    "AUDITIZE_LOG_ENTITY_CACHE_SIZE",
+                    default=_DEFAULT_LOG_ENTITY_CACHE_SIZE,
+                    validator=int,
+                ),
+                log_entity_cache_ttl=optional(
+                    "AUDITIZE_LOG_ENTITY_CACHE_TTL",
+                    default=_DEFAULT_LOG_ENTITY_CACHE_TTL,
+                    validator=int,
+                ),
+                log_custom_field_type_cache_ttl=optional(
+                    "AUDITIZE_LOG_CUSTOM_FIELD_TYPE_CACHE_TTL",
+                    default=_DEFAULT_LOG_CUSTOM_FIELD_TYPE_CACHE_TTL,
+                    validator=int,
+                ),
+                log_search_cache_size=optional(
+                    "AUDITIZE_LOG_SEARCH_CACHE_SIZE",
+                    default=0,
+                    validator=int,
+                ),
+                log_search_cache_ttl=optional(
+                    "AUDITIZE_LOG_SEARCH_CACHE_TTL",
+                    default=_DEFAULT_LOG_SEARCH_CACHE_TTL,
+                    validator=int,
+                ),
+                log_aggregation_cache_ttl=optional(
+                    "AUDITIZE_LOG_AGGREGATION_CACHE_TTL",
+                    default=_DEFAULT_LOG_AGGREGATION_CACHE_TTL,
+                    validator=int,
+                ),
+                log_ingestion_queue=optional(
+                    "AUDITIZE_LOG_INGESTION_QUEUE",
+                    validator=cls._validate_bool,
+                    default=False,
+                ),
+                log_idempotency_key_ttl=optional(
+                    "AUDITIZE_LOG_IDEMPOTENCY_KEY_TTL",
+                    default=_DEFAULT_LOG_IDEMPOTENCY_KEY_TTL,
+                    validator=int,
+                ),
+                log_write_rate_limit_apikey=optional(
+                    "AUDITIZE_LOG_WRITE_RATE_LIMIT_APIKEY",
+                    default=0,
+                    validator=float,
+                ),
+                log_write_rate_limit_repo=optional(
+                    "AUDITIZE_LOG_WRITE_RATE_LIMIT_REPO",
+                    default=0,
+                    validator=float,
+                ),
+                log_write_rate_limit_burst=optional(
+                    "AUDITIZE_LOG_WRITE_RATE_LIMIT_BURST",
+                    default=_DEFAULT_LOG_WRITE_RATE_LIMIT_BURST,
+                    validator=float,
+                ),
+                attachment_store=optional(
+                    "AUDITIZE_ATTACHMENT_STORE",
+                    default="elasticsearch",
+                    validator=cls._validate_attachment_store,
+                ),
+                attachment_store_path=optional("AUDITIZE_ATTACHMENT_STORE_PATH"),
+                attachment_s3_endpoint_url=optional(
+                    "AUDITIZE_ATTACHMENT_S3_ENDPOINT_URL"
+                ),
+                attachment_s3_bucket=optional("AUDITIZE_ATTACHMENT_S3_BUCKET"),
+                attachment_s3_region=optional(
+                    "AUDITIZE_ATTACHMENT_S3_REGION", default="us-east-1"
+                ),
+                attachment_s3_access_key_id=optional(
+                    "AUDITIZE_ATTACHMENT_S3_ACCESS_KEY_ID"
+                ),
+                attachment_s3_secret_access_key=optional(
+                    "AUDITIZE_ATTACHMENT_S3_SECRET_ACCESS_KEY"
+                ),
+                attachment_compression=optional(
+                    "AUDITIZE_ATTACHMENT_COMPRESSION",
+                    validator=cls._validate_bool,
+                    default=False,
+                ),
                 cookie_secure=optional(
                     "AUDITIZE_COOKIE_SECURE",
                     validator=cls._validate_bool,
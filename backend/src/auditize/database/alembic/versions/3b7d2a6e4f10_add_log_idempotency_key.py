@@ -0,0 +1,49 @@
+"""Add log idempotency key
+
+Revision ID: 3b7d2a6e4f10
+Revises: 8c1f3e5a9d27
+Create Date: 2026-10-16 10:04:52.731846
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7d2a6e4f10"
+down_revision: Union[str, None] = "8c1f3e5a9d27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "log_idempotency_key",
+        sa.Column("repo_id", sa.Uuid(), nullable=False),
+        sa.Column("key", sa.String(length=255), nullable=False),
+        sa.Column("log_id", sa.Uuid(), nullable=False),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["repo_id"],
+            ["repo.id"],
+            name=op.f("fk_log_idempotency_key_repo_id"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("repo_id", "key", name=op.f("pk_log_idempotency_key")),
+    )
+    op.create_index(
+        op.f("ix_log_idempotency_key_expires_at"),
+        "log_idempotency_key",
+        ["expires_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_log_idempotency_key_expires_at"), table_name="log_idempotency_key"
+    )
+    op.drop_table("log_idempotency_key")
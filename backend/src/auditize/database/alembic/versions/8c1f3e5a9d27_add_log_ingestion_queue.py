@@ -0,0 +1,63 @@
+"""Add log ingestion queue
+
+Revision ID: 8c1f3e5a9d27
+Revises: 51496d22ec2a
+Create Date: 2026-10-16 09:12:31.402117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c1f3e5a9d27"
+down_revision: Union[str, None] = "51496d22ec2a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "log_ingestion_queue",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("repo_id", sa.Uuid(), nullable=False),
+        sa.Column("log", sa.JSON(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["repo_id"],
+            ["repo.id"],
+            name=op.f("fk_log_ingestion_queue_repo_id"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_log_ingestion_queue")),
+    )
+    op.create_index(
+        op.f("ix_log_ingestion_queue_repo_id"),
+        "log_ingestion_queue",
+        ["repo_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_log_ingestion_queue_created_at"),
+        "log_ingestion_queue",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_log_ingestion_queue_created_at"), table_name="log_ingestion_queue"
+    )
+    op.drop_index(
+        op.f("ix_log_ingestion_queue_repo_id"), table_name="log_ingestion_queue"
+    )
+    op.drop_table("log_ingestion_queue")
@@ -0,0 +1,31 @@
+"""Add repo log_entity_generation
+
+Revision ID: a7d4e2c9b813
+Revises: f3c8a1d7e605
+Create Date: 2026-10-19 10:02:37.541286
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7d4e2c9b813"
+down_revision: Union[str, None] = "f3c8a1d7e605"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repo",
+        sa.Column(
+            "log_entity_generation", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repo", "log_entity_generation")
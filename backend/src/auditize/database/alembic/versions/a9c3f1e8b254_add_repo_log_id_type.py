@@ -0,0 +1,29 @@
+"""Add Repo log id type
+
+Revision ID: a9c3f1e8b254
+Revises: e5a41c9b7d03
+Create Date: 2026-10-16 13:37:15.204963
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a9c3f1e8b254"
+down_revision: Union[str, None] = "e5a41c9b7d03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repo",
+        sa.Column("log_id_type", sa.String(), nullable=False, server_default="uuid4"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repo", "log_id_type")
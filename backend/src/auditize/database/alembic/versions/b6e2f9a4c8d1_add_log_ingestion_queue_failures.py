@@ -0,0 +1,50 @@
+"""Add log ingestion queue failures
+
+Revision ID: b6e2f9a4c8d1
+Revises: d4e8b1f7c352
+Create Date: 2026-10-18 10:04:17.518342
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b6e2f9a4c8d1"
+down_revision: Union[str, None] = "d4e8b1f7c352"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("log_ingestion_queue", sa.Column("error", sa.Text(), nullable=True))
+    op.add_column(
+        "log_ingestion_queue",
+        sa.Column("failed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.drop_index(
+        op.f("ix_log_ingestion_queue_created_at"), table_name="log_ingestion_queue"
+    )
+    op.create_index(
+        op.f("ix_log_ingestion_queue_created_at"),
+        "log_ingestion_queue",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("failed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_log_ingestion_queue_created_at"), table_name="log_ingestion_queue"
+    )
+    op.create_index(
+        op.f("ix_log_ingestion_queue_created_at"),
+        "log_ingestion_queue",
+        ["created_at"],
+        unique=False,
+    )
+    op.drop_column("log_ingestion_queue", "failed_at")
+    op.drop_column("log_ingestion_queue", "error")
@@ -0,0 +1,41 @@
+"""Add log attachment blob
+
+Revision ID: c7d2e9f4a1b6
+Revises: a9c3f1e8b254
+Create Date: 2026-10-16 14:21:37.418502
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d2e9f4a1b6"
+down_revision: Union[str, None] = "a9c3f1e8b254"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "log_attachment_blob",
+        sa.Column("repo_id", sa.Uuid(), nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["repo_id"],
+            ["repo.id"],
+            name=op.f("fk_log_attachment_blob_repo_id"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "repo_id", "sha256", name=op.f("pk_log_attachment_blob")
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("log_attachment_blob")
@@ -0,0 +1,64 @@
+"""Add log custom field registry
+
+Revision ID: d4e8b1f7c352
+Revises: f2b8a4c6d913
+Create Date: 2026-10-17 09:12:54.207318
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4e8b1f7c352"
+down_revision: Union[str, None] = "f2b8a4c6d913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "log_custom_field",
+        sa.Column("repo_id", sa.Uuid(), nullable=False),
+        sa.Column("path", sa.String(length=32), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("type", sa.String(length=16), nullable=False),
+        sa.Column("last_seen", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["repo_id"],
+            ["repo.id"],
+            name=op.f("fk_log_custom_field_repo_id"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "repo_id", "path", "name", name=op.f("pk_log_custom_field")
+        ),
+    )
+    op.create_table(
+        "log_custom_field_enum_value",
+        sa.Column("repo_id", sa.Uuid(), nullable=False),
+        sa.Column("path", sa.String(length=32), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("value", sa.String(), nullable=False),
+        sa.Column("last_seen", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["repo_id"],
+            ["repo.id"],
+            name=op.f("fk_log_custom_field_enum_value_repo_id"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint(
+            "repo_id",
+            "path",
+            "name",
+            "value",
+            name=op.f("pk_log_custom_field_enum_value"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("log_custom_field_enum_value")
+    op.drop_table("log_custom_field")
@@ -0,0 +1,32 @@
+"""Add log write rate limit bucket
+
+Revision ID: e5a41c9b7d03
+Revises: 3b7d2a6e4f10
+Create Date: 2026-10-16 11:21:07.518392
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a41c9b7d03"
+down_revision: Union[str, None] = "3b7d2a6e4f10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "log_write_rate_limit_bucket",
+        sa.Column("key", sa.String(length=255), nullable=False),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("key", name=op.f("pk_log_write_rate_limit_bucket")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("log_write_rate_limit_bucket")
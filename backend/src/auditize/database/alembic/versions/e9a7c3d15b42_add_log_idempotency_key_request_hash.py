@@ -0,0 +1,29 @@
+"""Add log idempotency key request hash
+
+Revision ID: e9a7c3d15b42
+Revises: b6e2f9a4c8d1
+Create Date: 2026-10-18 11:27:40.963205
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e9a7c3d15b42"
+down_revision: Union[str, None] = "b6e2f9a4c8d1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "log_idempotency_key",
+        sa.Column("request_hash", sa.String(length=64), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("log_idempotency_key", "request_hash")
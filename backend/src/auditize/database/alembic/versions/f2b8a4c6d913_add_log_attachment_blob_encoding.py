@@ -0,0 +1,29 @@
+"""Add log attachment blob encoding
+
+Revision ID: f2b8a4c6d913
+Revises: c7d2e9f4a1b6
+Create Date: 2026-10-16 15:02:44.650218
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b8a4c6d913"
+down_revision: Union[str, None] = "c7d2e9f4a1b6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "log_attachment_blob",
+        sa.Column("encoding", sa.String(length=16), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("log_attachment_blob", "encoding")
@@ -0,0 +1,29 @@
+"""Add repo log_written_at
+
+Revision ID: f3c8a1d7e605
+Revises: e9a7c3d15b42
+Create Date: 2026-10-19 09:14:52.318640
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f3c8a1d7e605"
+down_revision: Union[str, None] = "e9a7c3d15b42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "repo",
+        sa.Column("log_written_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("repo", "log_written_at")
@@ -51,6 +51,13 @@ class PayloadTooLarge(AuditizeException):
     pass
 
 
+class RateLimitExceeded(AuditizeException):
+    def __init__(self, retry_after: float):
+        super().__init__("Rate limit exceeded")
+        # the number of seconds to wait before retrying
+        self.retry_after = retry_after
+
+
 class InternalError(AuditizeException):
     pass
 
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+
+class LruCache[K, V]:
+    """
+    A bounded in-memory LRU cache with an optional TTL (in seconds).
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[V, float | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        try:
+            value, expires_at = self._entries[key]
+        except KeyError:
+            return None
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (
+            value,
+            time.monotonic() + self.ttl if self.ttl else None,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: K):
+        self._entries.pop(key, None)
+
+    def invalidate(self, predicate: Callable[[K], bool]) -> int:
+        """
+        Remove the entries whose key matches the predicate and return how many
+        entries have been removed.
+        """
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class AsyncCache[K, V]:
+    """
+    A bounded in-memory cache of asynchronously computed values.
+
+    A value is fresh for `ttl` seconds, then it is still served for `stale_ttl`
+    seconds while it is refreshed in the background (stale-while-revalidate).
+    Concurrent computations of the same key are coalesced into a single one.
+    """
+
+    def __init__(self, max_size: int, ttl: float, stale_ttl: float = 0):
+        self.ttl = ttl
+        self._entries: LruCache[K, tuple[V, float]] = LruCache(
+            max_size, ttl + stale_ttl
+        )
+        self._pending: dict[K, asyncio.Task[V]] = {}
+
+    async def get(self, key: K, compute: Callable[[], Awaitable[V]]) -> V:
+        if entry := self._entries.get(key):
+            value, fresh_until = entry
+            if fresh_until <= time.monotonic():
+                self._compute(key, compute)
+            return value
+
+        # NB: shield the computation so that a cancelled caller (e.g. client disconnection)
+        # does not cancel it for the other callers waiting for the same key
+        return await asyncio.shield(self._compute(key, compute))
+
+    def _compute(self, key: K, compute: Callable[[], Awaitable[V]]) -> asyncio.Task[V]:
+        if task := self._pending.get(key):
+            return task
+
+        async def compute_and_cache() -> V:
+            value = await compute()
+            self._entries.set(key, (value, time.monotonic() + self.ttl))
+            return value
+
+        task = asyncio.create_task(compute_and_cache())
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # NB: retrieve the exception of the background refreshes that nobody awaits
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,39 @@
+import secrets
+import time
+from uuid import UUID
+
+_last_timestamp = 0
+_last_counter = 0
+
+
+def uuid7() -> UUID:
+    """
+    Generate a version 7 UUID (RFC 9562): it starts with the Unix timestamp in
+    milliseconds, so that UUIDs sort by creation time.
+
+    The 12 bits following the timestamp are used as a counter so that UUIDs
+    generated within the same millisecond by the process are still ordered.
+    """
+    global _last_timestamp, _last_counter
+
+    timestamp = time.time_ns() // 1_000_000
+    if timestamp > _last_timestamp:
+        # NB: the counter is seeded with a random value whose most significant bit is 0,
+        # leaving room for the increments
+        counter = secrets.randbits(11)
+    else:
+        # same millisecond (or the clock went backwards)
+        timestamp = _last_timestamp
+        counter = _last_counter + 1
+        if counter > 0xFFF:
+            timestamp += 1
+            counter = secrets.randbits(11)
+    _last_timestamp, _last_counter = timestamp, counter
+
+    return UUID(
+        int=(timestamp & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76  # version
+        | counter << 64
+        | 0b10 << 62  # variant
+        | secrets.randbits(62)
+    )
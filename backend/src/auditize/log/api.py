@@ -1,11 +1,15 @@
+import re
 from textwrap import dedent
 from typing import Annotated
 from uuid import UUID
 
 from fastapi import (
     APIRouter,
+    Body,
     Depends,
+    File,
     Form,
+    Header,
     Path,
     Query,
     Request,
@@ -14,9 +18,13 @@ from fastapi import (
     status,
 )
 from fastapi.responses import StreamingResponse
+from pydantic import Json
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from auditize.api.exception import error_responses
+from auditize.api.exception import (
+    build_error_response_from_exception,
+    error_responses,
+)
 from auditize.api.models.cursor_pagination import CursorPaginationParams
 from auditize.api.models.search import CursorPaginatedSearchParams
 from auditize.api.validation import (
@@ -29,18 +37,25 @@ from auditize.auth.authorizer import (
 )
 from auditize.config import get_config
 from auditize.dependencies import get_db_session
-from auditize.exceptions import PayloadTooLarge, ValidationError
+from auditize.exceptions import AuditizeException, ValidationError
 from auditize.helpers.datetime import now
 from auditize.i18n import get_request_lang
+from auditize.log.attachment_store import AttachmentContent
 from auditize.log.csv import stream_logs_as_csv, validate_log_csv_columns
 from auditize.log.jsonl import stream_logs_as_jsonl
 from auditize.log.models import (
+    LOG_BULK_MAX_SIZE,
     CustomFieldEnumValueListResponse,
     CustomFieldListResponse,
     Emitter,
     Log,
     LogActionTypeListParams,
     LogActorResponse,
+    LogAttachmentCreate,
+    LogBulkItemResponse,
+    LogBulkResponse,
+    LogCountParams,
+    LogCountResponse,
     LogCreate,
     LogEntityListParams,
     LogEntityListResponse,
@@ -56,6 +71,7 @@ from auditize.log.models import (
     NameListResponse,
     NameRefPairListResponse,
 )
+from auditize.log.rate_limit import check_log_write_rate_limit
 from auditize.log.service import LogService
 
 router = APIRouter(
@@ -689,25 +705,167 @@ async def get_log_entity(
     )
 
 
+_IdempotencyKeyHeader = Annotated[
+    str | None,
+    Header(
+        alias="Idempotency-Key",
+        description=(
+            "An optional client-generated key (e.g. a UUID) that makes the request safe "
+            "to retry: a request sent again with the same key returns the log created "
+            "by the original request instead of creating a new log. Using the same key "
+            "for a different request is rejected with a 409 status."
+        ),
+        min_length=1,
+        max_length=200,
+    ),
+]
+
+
+_QUEUED_LOG_RESPONSE = {
+    status.HTTP_202_ACCEPTED: {
+        "description": (
+            "The log has been accepted by the ingestion queue (if enabled), "
+            "it will be saved asynchronously"
+        ),
+        "model": LogResponse,
+    }
+}
+
+
 @router.post(
     "/repos/{repo_id}/logs",
     status_code=status.HTTP_201_CREATED,
     summary="Create a log",
     description="Requires `log:write` permission.",
     operation_id="create_log",
-    responses=error_responses(status.HTTP_400_BAD_REQUEST),
+    responses={
+        **_QUEUED_LOG_RESPONSE,
+        **error_responses(
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_409_CONFLICT,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        ),
+    },
     tags=["log"],
     response_model=LogResponse,
 )
 async def create_log(
     session: Annotated[AsyncSession, Depends(get_db_session)],
+    response: Response,
     authorized: Annotated[Authenticated, Depends(RequireLogWritePermission())],
     repo_id: UUID,
     log_create: LogCreate,
+    idempotency_key: _IdempotencyKeyHeader = None,
+):
+    emitter = Emitter.from_authenticated(authorized)
+    service = await LogService.for_writing(session, repo_id)
+    await check_log_write_rate_limit(session, authorized, repo_id)
+    log = await service.create_log(log_create, emitter, idempotency_key=idempotency_key)
+    if service.queued_ingestion:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return log
+
+
+# Attachments are read and saved by chunks of this size, so that the memory used
+# by an upload does not depend on the attachment size
+_ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
+
+def _build_attachment_content(file: UploadFile) -> AttachmentContent:
+    async def read_chunks():
+        while chunk := await file.read(_ATTACHMENT_CHUNK_SIZE):
+            yield chunk
+
+    return AttachmentContent(
+        read_chunks(), length=file.size, max_size=get_config().attachment_max_size
+    )
+
+
+def _build_attachment(
+    file: UploadFile,
+    *,
+    type: str,
+    name: str | None = None,
+    mime_type: str | None = None,
+) -> Log.Attachment:
+    return Log.Attachment(
+        name=name or file.filename,
+        type=type,
+        mime_type=mime_type or file.content_type or "application/octet-stream",
+    )
+
+
+@router.post(
+    "/repos/{repo_id}/logs/multipart",
+    status_code=status.HTTP_201_CREATED,
+    summary="Create a log with attachments",
+    description=dedent("""
+    Requires `log:write` permission.
+
+    This endpoint acts like a create_log operation, except that the log attachments
+    are sent along with the log in a `multipart/form-data` request: the log is saved
+    once with all its attachments instead of requiring an add_log_attachment request
+    per attachment.
+
+    The `attachments` field describes the uploaded `files`, in the same order.
+    """),
+    operation_id="create_log_with_attachments",
+    responses={
+        **_QUEUED_LOG_RESPONSE,
+        **error_responses(
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_413_CONTENT_TOO_LARGE,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        ),
+    },
+    tags=["log"],
+    response_model=LogResponse,
+)
+async def create_log_with_attachments(
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    response: Response,
+    authorized: Annotated[Authenticated, Depends(RequireLogWritePermission())],
+    repo_id: UUID,
+    log_create: Annotated[
+        Json[LogCreate],
+        Form(alias="log", description="The log to create (as a JSON document)"),
+    ],
+    attachments: Annotated[
+        Json[list[LogAttachmentCreate]],
+        Form(description="The description of the files (as a JSON array)"),
+    ] = None,
+    files: Annotated[
+        list[UploadFile], File(description="The files to attach to the log")
+    ] = [],
 ):
+    attachments = attachments or []
+    if len(attachments) != len(files):
+        raise ValidationError(
+            f"The number of attachments ({len(attachments)}) does not match "
+            f"the number of files ({len(files)})"
+        )
     emitter = Emitter.from_authenticated(authorized)
     service = await LogService.for_writing(session, repo_id)
-    return await service.create_log(log_create, emitter)
+    await check_log_write_rate_limit(session, authorized, repo_id)
+    log = await service.create_log_with_attachments(
+        log_create,
+        emitter,
+        [
+            (
+                _build_attachment(
+                    file,
+                    type=attachment.type,
+                    name=attachment.name,
+                    mime_type=attachment.mime_type,
+                ),
+                _build_attachment_content(file),
+            )
+            for attachment, file in zip(attachments, files)
+        ],
+    )
+    if service.queued_ingestion:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return log
 
 
 @router.post(
@@ -723,19 +881,139 @@ async def create_log(
     For classic use cases, it is strongly recommended to use the create_log operation instead.
     """),
     operation_id="import_log",
-    responses=error_responses(status.HTTP_400_BAD_REQUEST, status.HTTP_409_CONFLICT),
+    responses={
+        **_QUEUED_LOG_RESPONSE,
+        **error_responses(
+            status.HTTP_400_BAD_REQUEST,
+            status.HTTP_409_CONFLICT,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        ),
+    },
     tags=["log"],
     response_model=LogResponse,
 )
 async def import_log(
     session: Annotated[AsyncSession, Depends(get_db_session)],
+    response: Response,
     authorized: Annotated[Authenticated, Depends(RequireLogWritePermission())],
     repo_id: UUID,
     log_import: LogImport,
+    idempotency_key: _IdempotencyKeyHeader = None,
 ):
     emitter = Emitter.from_authenticated(authorized)
     service = await LogService.for_writing(session, repo_id)
-    return await service.import_log(log_import, emitter)
+    await check_log_write_rate_limit(session, authorized, repo_id)
+    log = await service.import_log(log_import, emitter, idempotency_key=idempotency_key)
+    if service.queued_ingestion:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return log
+
+
+def _build_log_bulk_response(
+    results: list[Log | AuditizeException], request: Request, *, queued: bool
+) -> LogBulkResponse:
+    lang = get_request_lang(request)
+    items = []
+    for result in results:
+        if isinstance(result, Log):
+            items.append(
+                LogBulkItemResponse(
+                    status=(
+                        status.HTTP_202_ACCEPTED if queued else status.HTTP_201_CREATED
+                    ),
+                    id=result.id,
+                )
+            )
+        else:
+            status_code, error = build_error_response_from_exception(result, lang)
+            items.append(LogBulkItemResponse(status=status_code, error=error))
+    return LogBulkResponse(
+        errors=any(item.error for item in items),
+        items=items,
+    )
+
+
+_BULK_DESCRIPTION = dedent(f"""
+    Requires `log:write` permission.
+
+    Up to {LOG_BULK_MAX_SIZE} logs can be sent in a single request. Logs are processed
+    independently: the failure of one log does not prevent the others from being saved.
+    The `items` of the response are in the same order as the logs of the request.
+    When the ingestion queue is enabled, the status of the accepted logs is `202`
+    instead of `201`.
+    """)
+
+_BULK_IDEMPOTENCY_DESCRIPTION = dedent("""
+    When an `Idempotency-Key` header is provided, each log of the batch is deduplicated
+    independently (based on the key and its position in the batch): a retried batch
+    only saves the logs that have not been saved by the original request.
+    """)
+
+
+@router.post(
+    "/repos/{repo_id}/logs/bulk",
+    summary="Create logs in bulk",
+    description=_BULK_DESCRIPTION + _BULK_IDEMPOTENCY_DESCRIPTION,
+    operation_id="create_logs",
+    responses=error_responses(
+        status.HTTP_400_BAD_REQUEST, status.HTTP_429_TOO_MANY_REQUESTS
+    ),
+    tags=["log"],
+    response_model=LogBulkResponse,
+)
+async def create_logs(
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    request: Request,
+    authorized: Annotated[Authenticated, Depends(RequireLogWritePermission())],
+    repo_id: UUID,
+    log_creates: Annotated[
+        list[LogCreate], Body(min_length=1, max_length=LOG_BULK_MAX_SIZE)
+    ],
+    idempotency_key: _IdempotencyKeyHeader = None,
+):
+    emitter = Emitter.from_authenticated(authorized)
+    service = await LogService.for_writing(session, repo_id)
+    await check_log_write_rate_limit(
+        session, authorized, repo_id, cost=len(log_creates)
+    )
+    results = await service.create_logs(
+        log_creates, emitter, idempotency_key=idempotency_key
+    )
+    return _build_log_bulk_response(results, request, queued=service.queued_ingestion)
+
+
+@router.post(
+    "/repos/{repo_id}/logs/import/bulk",
+    summary="Import logs in bulk",
+    description=_BULK_DESCRIPTION
+    + "\nThe logs are imported the same way as the import_log operation does.\n"
+    + _BULK_IDEMPOTENCY_DESCRIPTION,
+    operation_id="import_logs",
+    responses=error_responses(
+        status.HTTP_400_BAD_REQUEST, status.HTTP_429_TOO_MANY_REQUESTS
+    ),
+    tags=["log"],
+    response_model=LogBulkResponse,
+)
+async def import_logs(
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    request: Request,
+    authorized: Annotated[Authenticated, Depends(RequireLogWritePermission())],
+    repo_id: UUID,
+    log_imports: Annotated[
+        list[LogImport], Body(min_length=1, max_length=LOG_BULK_MAX_SIZE)
+    ],
+    idempotency_key: _IdempotencyKeyHeader = None,
+):
+    emitter = Emitter.from_authenticated(authorized)
+    service = await LogService.for_writing(session, repo_id)
+    await check_log_write_rate_limit(
+        session, authorized, repo_id, cost=len(log_imports)
+    )
+    results = await service.import_logs(
+        log_imports, emitter, idempotency_key=idempotency_key
+    )
+    return _build_log_bulk_response(results, request, queued=service.queued_ingestion)
 
 
 @router.post(
@@ -747,12 +1025,14 @@ async def import_log(
     status_code=status.HTTP_204_NO_CONTENT,
     response_class=Response,
     responses=error_responses(
-        status.HTTP_400_BAD_REQUEST, status.HTTP_413_CONTENT_TOO_LARGE
+        status.HTTP_400_BAD_REQUEST,
+        status.HTTP_413_CONTENT_TOO_LARGE,
+        status.HTTP_429_TOO_MANY_REQUESTS,
     ),
 )
 async def add_attachment(
     session: Annotated[AsyncSession, Depends(get_db_session)],
-    _: Annotated[Authenticated, Depends(RequireLogWritePermission())],
+    authorized: Annotated[Authenticated, Depends(RequireLogWritePermission())],
     repo_id: UUID,
     log_id: Annotated[
         UUID,
@@ -783,21 +1063,13 @@ async def add_attachment(
         ),
     ] = None,
 ) -> None:
-    config = get_config()
-    data = await file.read(config.attachment_max_size + 1)
-    if len(data) > config.attachment_max_size:
-        raise PayloadTooLarge(
-            f"Attachment size exceeds the maximum allowed size ({config.attachment_max_size} bytes)"
-        )
     service = await LogService.for_writing(session, repo_id)
+    # NB: adding an attachment is a log write, it counts as such against the limits
+    await check_log_write_rate_limit(session, authorized, repo_id)
     await service.save_log_attachment(
         log_id,
-        Log.Attachment(
-            name=name or file.filename,
-            type=type,
-            mime_type=mime_type or file.content_type or "application/octet-stream",
-            data=data,
-        ),
+        _build_attachment(file, type=type, name=name, mime_type=mime_type),
+        _build_attachment_content(file),
     )
 
 
@@ -898,6 +1170,29 @@ async def get_logs_as_jsonl(
     )
 
 
+@router.get(
+    "/repos/{repo_id}/logs/count",
+    summary="Count logs",
+    description=_GET_LOGS_DESCRIPTION,
+    operation_id="count_logs",
+    tags=["log"],
+    response_model=LogCountResponse,
+)
+async def count_logs(
+    session: Annotated[AsyncSession, Depends(get_db_session)],
+    authorized: Annotated[Authenticated, Depends(RequireLogReadPermission())],
+    repo_id: UUID,
+    params: Annotated[LogCountParams, Query()],
+):
+    service = await LogService.for_reading(session, repo_id)
+    count, exact = await service.count_logs(
+        authorized_entities=authorized.permissions.get_repo_readable_entities(repo_id),
+        search_params=LogSearchParams.model_validate(params.model_dump()),
+        exact=params.exact,
+    )
+    return LogCountResponse(count=count, exact=exact)
+
+
 @router.get(
     "/repos/{repo_id}/logs/{log_id}",
     summary="Get log",
@@ -920,10 +1215,72 @@ async def get_log(
     )
 
 
+# NB: attachments never change once uploaded
+_ATTACHMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_RANGE_HEADER_REGEX = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _RangeNotSatisfiable(Exception):
+    pass
+
+
+def _parse_range_header(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    Return the [start, stop) slice requested by the Range header, or None if the
+    header is not supported (e.g. multiple ranges) and must be ignored.
+    Raise _RangeNotSatisfiable if the range does not overlap the content.
+    """
+    match = _RANGE_HEADER_REGEX.match(range_header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            raise _RangeNotSatisfiable()
+        return start, min(int(last) + 1, size) if last else size
+    if last:
+        # suffix range, e.g. "bytes=-500" for the last 500 bytes
+        if int(last) == 0 or size == 0:
+            raise _RangeNotSatisfiable()
+        return max(size - int(last), 0), size
+    return None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # NB: If-None-Match uses weak comparison
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def _accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in (encoding, "*"):
+            continue
+        params = params.strip().lower()
+        try:
+            return float(params.removeprefix("q=")) > 0 if params else True
+        except ValueError:
+            return False
+    return False
+
+
 @router.get(
     "/repos/{repo_id}/logs/{log_id}/attachments/{attachment_idx}",
     summary="Download a log attachment",
-    description="Requires `log:read` permission.",
+    description=(
+        "Requires `log:read` permission.\n\n"
+        "Single byte ranges (`Range` header) and conditional requests (`If-None-Match` "
+        "and `If-Range` headers, the `ETag` of an attachment being based on "
+        "the digest of its content) are supported.\n\n"
+        "Compressed attachments are sent as is (with a `Content-Encoding` header) "
+        "to clients that accept their encoding (`Accept-Encoding` header)."
+    ),
     operation_id="get_log_attachment",
     tags=["log"],
     response_class=Response,
@@ -939,6 +1296,20 @@ async def get_log(
                 }
             },
         },
+        status.HTTP_206_PARTIAL_CONTENT: {
+            "description": "The requested range of the attachment content.",
+            "content": {
+                "application/octet-stream": {
+                    "schema": {"type": "string", "format": "binary", "example": None}
+                }
+            },
+        },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The attachment matches the `If-None-Match` header."
+        },
+        status.HTTP_416_RANGE_NOT_SATISFIABLE: {
+            "description": "The requested range does not overlap the attachment content."
+        },
     },
 )
 async def get_log_attachment(
@@ -949,6 +1320,10 @@ async def get_log_attachment(
     attachment_idx: int = Path(
         description="The index of the attachment in the log's attachments list (starts from 0)",
     ),
+    range_header: Annotated[str | None, Header(alias="Range")] = None,
+    if_none_match: Annotated[str | None, Header(alias="If-None-Match")] = None,
+    if_range: Annotated[str | None, Header(alias="If-Range")] = None,
+    accept_encoding: Annotated[str | None, Header(alias="Accept-Encoding")] = None,
 ):
     service = await LogService.for_reading(session, repo_id)
     attachment = await service.get_log_attachment(
@@ -956,10 +1331,67 @@ async def get_log_attachment(
         attachment_idx,
         authorized_entities=authorized.permissions.get_repo_readable_entities(repo_id),
     )
+    # NB: a compressed attachment can be sent as is if the client supports its encoding,
+    # it is then another representation of the attachment with its own ETag
+    send_encoded = bool(
+        attachment.encoding
+        and accept_encoding
+        and _accepts_encoding(accept_encoding, attachment.encoding)
+    )
+    identity_etag = f'"{attachment.sha256}"' if attachment.sha256 else None
+    etag = (
+        f'"{attachment.sha256}-{attachment.encoding}"'
+        if send_encoded
+        else identity_etag
+    )
+    headers = {
+        "Content-Disposition": f"attachment; filename={attachment.name}",
+        "Accept-Ranges": "bytes",
+        "Cache-Control": _ATTACHMENT_CACHE_CONTROL,
+        **({"ETag": etag} if etag else {}),
+        **({"Vary": "Accept-Encoding"} if attachment.encoding else {}),
+    }
+
+    if etag and if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # NB: If-Range makes the range conditional, the whole content is returned
+    # if the attachment does not match.
+    # Ranges always apply to the original (decoded) content.
+    if range_header and (not if_range or if_range.strip() == identity_etag):
+        if identity_etag:
+            headers["ETag"] = identity_etag
+        try:
+            byte_range = _parse_range_header(range_header, attachment.size)
+        except _RangeNotSatisfiable:
+            return Response(
+                status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{attachment.size}"},
+            )
+        if byte_range:
+            start, stop = byte_range
+            return Response(
+                content=await service.get_log_attachment_content(
+                    attachment, start, stop
+                ),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=attachment.mime_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {start}-{stop - 1}/{attachment.size}",
+                },
+            )
+
+    if send_encoded:
+        return Response(
+            content=await service.get_log_attachment_stored_content(attachment),
+            media_type=attachment.mime_type,
+            headers={**headers, "Content-Encoding": attachment.encoding},
+        )
     return Response(
-        content=attachment.data,
+        content=await service.get_log_attachment_content(attachment),
         media_type=attachment.mime_type,
-        headers={"Content-Disposition": f"attachment; filename={attachment.name}"},
+        headers=headers,
     )
 
 
@@ -984,5 +1416,6 @@ async def get_logs(
         search_params=LogSearchParams.model_validate(params.model_dump()),
         limit=params.limit,
         pagination_cursor=params.cursor,
+        use_pit=params.pit,
     )
     return LogListResponse.build(logs, next_cursor)
@@ -0,0 +1,693 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
+import os
+import os.path as osp
+import shutil
+import tempfile
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Self
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+import aiohttp
+from elasticsearch import AsyncElasticsearch
+from elasticsearch import NotFoundError as ElasticNotFoundError
+from yarl import URL
+
+from auditize.config import get_config
+from auditize.database import get_dbm
+from auditize.exceptions import InternalError, NotFoundError, PayloadTooLarge
+
+# MIME types (besides text/*) whose content is worth compressing
+_COMPRESSIBLE_MIME_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/csv",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/x-yaml",
+    "application/yaml",
+    "application/x-sh",
+    "image/svg+xml",
+}
+
+
+# The Elasticsearch store holds the whole content in memory (and sends it base64-encoded
+# in a single document), the size of the stored content is therefore capped regardless
+# of AUDITIZE_ATTACHMENT_MAX_SIZE (larger attachments require the filesystem or S3 store)
+_ELASTICSEARCH_STORE_MAX_SIZE = 20 * 1024 * 1024
+
+
+def is_compressible_mime_type(mime_type: str) -> bool:
+    mime_type = mime_type.split(";")[0].strip().lower()
+    return (
+        mime_type.startswith("text/")
+        or mime_type.endswith(("+json", "+xml"))
+        or mime_type in _COMPRESSIBLE_MIME_TYPES
+    )
+
+
+def decode_attachment_content(data: bytes, encoding: str | None) -> bytes:
+    """
+    Return the original content of an attachment stored with the given encoding.
+    """
+    match encoding:
+        case None:
+            return data
+        case "gzip":
+            return gzip.decompress(data)
+        case _:
+            raise InternalError(f"Unsupported attachment encoding {encoding!r}")
+
+
+class AttachmentContent:
+    """
+    The content of an attachment being saved, consumed chunk by chunk so that it
+    never has to be held in memory as a whole. Its size and SHA-256 digest are
+    computed on the fly and its maximum size is enforced as it is consumed.
+
+    If encoding is set to "gzip", the content is compressed as it is consumed.
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterable[bytes],
+        *,
+        length: int | None = None,
+        max_size: int | None = None,
+    ):
+        # NB: length is the announced size of the content (if known), some stores need it
+        # before starting to write
+        if max_size is not None and length is not None and length > max_size:
+            raise PayloadTooLarge(
+                f"Attachment size exceeds the maximum allowed size ({max_size} bytes)"
+            )
+        self._chunks = chunks
+        self.length = length
+        self.max_size = max_size
+        self.encoding: str | None = None
+        # size of the original content
+        self.size = 0
+        # size of the content as stored (i.e. once encoded)
+        self.stored_size = 0
+        self._digest = hashlib.sha256()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Self:
+        async def chunks():
+            yield data
+
+        return cls(chunks(), length=len(data))
+
+    @property
+    def sha256(self) -> str:
+        """
+        The digest of the original content.
+        """
+        return self._digest.hexdigest()
+
+    @property
+    def stored_length(self) -> int | None:
+        """
+        The announced size of the content as stored (if known).
+        """
+        return self.length if self.encoding is None else None
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        # NB: wbits=31 makes zlib produce the gzip format
+        compressor = zlib.compressobj(wbits=31) if self.encoding == "gzip" else None
+        async for chunk in self._chunks:
+            self.size += len(chunk)
+            if self.max_size is not None and self.size > self.max_size:
+                raise PayloadTooLarge(
+                    f"Attachment size exceeds the maximum allowed size ({self.max_size} bytes)"
+                )
+            self._digest.update(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                self.stored_size += len(chunk)
+                yield chunk
+        if compressor:
+            chunk = compressor.flush()
+            self.stored_size += len(chunk)
+            yield chunk
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self])
+
+
+class AttachmentStore(ABC):
+    """
+    Storage backend for the content of log attachments: the log document only
+    holds the attachment metadata and the key of its content in the store.
+
+    Keys are "/"-separated paths (e.g. "<repo_id>/<log_id>/<id>").
+    """
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes):
+        pass
+
+    async def put_stream(self, key: str, content: AttachmentContent):
+        """
+        Save the content as it is consumed. The default implementation
+        reads the whole content first, stores that can write incrementally
+        override it.
+        """
+        await self.put(key, await content.read())
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """
+        Raise NotFoundError if the key does not exist.
+        """
+
+    async def get_range(self, key: str, start: int, stop: int) -> bytes:
+        """
+        Return the [start, stop) slice of the content. The default implementation
+        reads the whole content, stores that can do better override it.
+        Raise NotFoundError if the key does not exist.
+        """
+        return (await self.get(key))[start:stop]
+
+    @abstractmethod
+    async def move(self, src_key: str, dst_key: str):
+        """
+        Move the content of src_key to dst_key (replacing its content if any).
+        """
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """
+        Deleting a key that does not exist is not an error.
+        """
+
+    @abstractmethod
+    async def delete_all(self, prefix: str):
+        """
+        Delete all the keys starting with the given prefix.
+        """
+
+    @abstractmethod
+    def list_keys(self, prefix: str) -> AsyncIterator[str]:
+        """
+        Iterate over the keys starting with the given prefix.
+        """
+
+    async def close(self):
+        pass
+
+
+class ElasticsearchAttachmentStore(AttachmentStore):
+    """
+    Store attachments in a dedicated Elasticsearch index (one document per attachment),
+    this is the default store as it does not require any extra setup.
+    """
+
+    def __init__(self, es: AsyncElasticsearch, index: str):
+        self.es = es
+        self.index = index
+        self._index_created = False
+
+    async def _ensure_index(self):
+        if self._index_created:
+            return
+        if not await self.es.indices.exists(index=self.index):
+            await self.es.options(ignore_status=400).indices.create(
+                index=self.index,
+                mappings={
+                    "dynamic": False,
+                    "properties": {
+                        "key": {"type": "keyword"},
+                        "data": {"type": "binary"},
+                    },
+                },
+            )
+        self._index_created = True
+
+    async def put_stream(self, key: str, content: AttachmentContent):
+        # NB: the content is buffered as a whole, its size is checked as it is read
+        # so that an oversized upload is rejected before being fully buffered
+        if (
+            content.stored_length is not None
+            and content.stored_length > _ELASTICSEARCH_STORE_MAX_SIZE
+        ):
+            raise self._payload_too_large()
+        chunks = []
+        async for chunk in content:
+            if content.stored_size > _ELASTICSEARCH_STORE_MAX_SIZE:
+                raise self._payload_too_large()
+            chunks.append(chunk)
+        await self.put(key, b"".join(chunks))
+
+    @staticmethod
+    def _payload_too_large() -> PayloadTooLarge:
+        return PayloadTooLarge(
+            "Attachment size exceeds the maximum size allowed by the Elasticsearch "
+            f"attachment store ({_ELASTICSEARCH_STORE_MAX_SIZE} bytes)"
+        )
+
+    async def put(self, key: str, data: bytes):
+        await self._ensure_index()
+        await self.es.index(
+            index=self.index,
+            id=key,
+            document={"key": key, "data": base64.b64encode(data).decode()},
+        )
+
+    async def get(self, key: str) -> bytes:
+        try:
+            resp = await self.es.get(index=self.index, id=key)
+        except ElasticNotFoundError:
+            raise NotFoundError()
+        return base64.b64decode(resp["_source"]["data"])
+
+    async def move(self, src_key: str, dst_key: str):
+        # NB: this is not atomic, a source key left behind by an interrupted move
+        # is expected to be cleaned up by the caller
+        await self.put(dst_key, await self.get(src_key))
+        await self.delete(src_key)
+
+    async def delete(self, key: str):
+        await self.es.options(ignore_status=404).delete(index=self.index, id=key)
+
+    async def delete_all(self, prefix: str):
+        if not await self.es.indices.exists(index=self.index):
+            return
+        # NB: make sure recently added attachments are visible to the query
+        await self.es.indices.refresh(index=self.index)
+        await self.es.delete_by_query(
+            index=self.index,
+            query={"prefix": {"key": prefix}},
+            refresh=True,
+        )
+
+    async def list_keys(self, prefix: str) -> AsyncIterator[str]:
+        if not await self.es.indices.exists(index=self.index):
+            return
+        # NB: make sure recently added attachments are visible to the query
+        await self.es.indices.refresh(index=self.index)
+        search_after = None
+        while True:
+            resp = await self.es.search(
+                index=self.index,
+                query={"prefix": {"key": prefix}},
+                source=False,
+                sort=[{"key": "asc"}],
+                search_after=search_after,
+                size=1000,
+                track_total_hits=False,
+            )
+            hits = resp["hits"]["hits"]
+            for hit in hits:
+                yield hit["_id"]
+            if len(hits) < 1000:
+                break
+            search_after = hits[-1]["sort"]
+
+
+class FilesystemAttachmentStore(AttachmentStore):
+    """
+    Store attachments as files in a local (or network-mounted) directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = osp.abspath(path)
+
+    def _get_path(self, key: str) -> str:
+        path = osp.normpath(osp.join(self.path, key))
+        if not path.startswith(self.path + os.sep):
+            raise InternalError(f"Invalid attachment key {key!r}")
+        return path
+
+    @staticmethod
+    def _open_tmp_file(path: str):
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=osp.dirname(path))
+        return os.fdopen(fd, "wb"), tmp_path
+
+    @staticmethod
+    def _read(path: str, start: int = 0, stop: int | None = None) -> bytes:
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            return fh.read() if stop is None else fh.read(max(stop - start, 0))
+
+    async def put(self, key: str, data: bytes):
+        await self.put_stream(key, AttachmentContent.from_bytes(data))
+
+    async def put_stream(self, key: str, content: AttachmentContent):
+        path = self._get_path(key)
+        # NB: write to a temporary file first so that a partially written file
+        # is never visible under the final path
+        fh, tmp_path = await asyncio.to_thread(self._open_tmp_file, path)
+        try:
+            with fh:
+                async for chunk in content:
+                    await asyncio.to_thread(fh.write, chunk)
+            await asyncio.to_thread(os.replace, tmp_path, path)
+        except BaseException:
+            await asyncio.to_thread(os.unlink, tmp_path)
+            raise
+
+    async def get(self, key: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._read, self._get_path(key))
+        except FileNotFoundError:
+            raise NotFoundError()
+
+    async def get_range(self, key: str, start: int, stop: int) -> bytes:
+        try:
+            return await asyncio.to_thread(self._read, self._get_path(key), start, stop)
+        except FileNotFoundError:
+            raise NotFoundError()
+
+    @staticmethod
+    def _move(src_path: str, dst_path: str):
+        os.makedirs(osp.dirname(dst_path), exist_ok=True)
+        os.replace(src_path, dst_path)
+
+    async def move(self, src_key: str, dst_key: str):
+        try:
+            await asyncio.to_thread(
+                self._move, self._get_path(src_key), self._get_path(dst_key)
+            )
+        except FileNotFoundError:
+            raise NotFoundError()
+
+    async def delete(self, key: str):
+        try:
+            await asyncio.to_thread(os.unlink, self._get_path(key))
+        except FileNotFoundError:
+            pass
+
+    async def delete_all(self, prefix: str):
+        # NB: prefixes always are "directories" (e.g. "<repo_id>/")
+        path = self._get_path(prefix)
+        await asyncio.to_thread(shutil.rmtree, path, ignore_errors=True)
+
+    def _list_keys(self, prefix: str) -> list[str]:
+        keys = []
+        for dirpath, _, filenames in os.walk(self._get_path(prefix)):
+            for filename in filenames:
+                path = osp.join(dirpath, filename)
+                keys.append(osp.relpath(path, self.path).replace(os.sep, "/"))
+        return sorted(keys)
+
+    async def list_keys(self, prefix: str) -> AsyncIterator[str]:
+        # NB: prefixes always are "directories" (e.g. "<repo_id>/tmp/")
+        for key in await asyncio.to_thread(self._list_keys, prefix):
+            yield key
+
+
+def _hmac_sha256(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def sign_s3_request(
+    method: str,
+    url: str,
+    headers: dict[str, str],
+    *,
+    payload_hash: str,
+    access_key_id: str,
+    secret_access_key: str,
+    region: str,
+    timestamp: datetime,
+) -> dict[str, str]:
+    """
+    Sign a request using AWS Signature Version 4 and return the headers to send
+    (the given headers plus the signature related headers).
+    The URL must be already encoded.
+    """
+    parsed_url = urlsplit(url)
+    amz_date = timestamp.strftime("%Y%m%dT%H%M%SZ")
+    date = timestamp.strftime("%Y%m%d")
+    headers = {
+        **headers,
+        "host": parsed_url.netloc,
+        "x-amz-content-sha256": payload_hash,
+        "x-amz-date": amz_date,
+    }
+
+    canonical_headers = {
+        name.lower(): " ".join(value.split()) for name, value in headers.items()
+    }
+    signed_headers = ";".join(sorted(canonical_headers))
+    canonical_query = "&".join(
+        sorted(
+            (part if "=" in part else part + "=")
+            for part in parsed_url.query.split("&")
+            if part
+        )
+    )
+    canonical_request = "\n".join(
+        (
+            method,
+            parsed_url.path or "/",
+            canonical_query,
+            "".join(
+                f"{name}:{canonical_headers[name]}\n"
+                for name in sorted(canonical_headers)
+            ),
+            signed_headers,
+            payload_hash,
+        )
+    )
+
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(
+        (
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        )
+    )
+    signing_key = _hmac_sha256(
+        _hmac_sha256(
+            _hmac_sha256(
+                _hmac_sha256(f"AWS4{secret_access_key}".encode(), date), region
+            ),
+            "s3",
+        ),
+        "aws4_request",
+    )
+    signature = hmac.new(
+        signing_key, string_to_sign.encode(), hashlib.sha256
+    ).hexdigest()
+
+    headers["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key_id}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return headers
+
+
+def _quote(value: str, safe: str = "") -> str:
+    return quote(value, safe="-_.~" + safe)
+
+
+class S3AttachmentStore(AttachmentStore):
+    """
+    Store attachments in a S3-compatible object storage (AWS S3, MinIO, etc...)
+    using path-style requests.
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoint_url: str,
+        bucket: str,
+        region: str,
+        access_key_id: str,
+        secret_access_key: str,
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_url(self, key: str = "", query: dict[str, str] = None) -> str:
+        url = f"{self.endpoint_url}/{_quote(self.bucket)}/{_quote(key, safe='/')}"
+        if query:
+            url += "?" + "&".join(
+                f"{_quote(name)}={_quote(value)}" for name, value in query.items()
+            )
+        return url
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] = None,
+        data: bytes | AsyncIterable[bytes] = b"",
+        length: int | None = None,
+        expected_statuses: tuple[int, ...] = (200,),
+    ) -> tuple[int, bytes]:
+        if not self._session:
+            self._session = aiohttp.ClientSession()
+        headers = sign_s3_request(
+            method,
+            url,
+            headers or {},
+            # NB: a streamed payload cannot be hashed before being sent
+            payload_hash=(
+                hashlib.sha256(data).hexdigest()
+                if isinstance(data, bytes)
+                else "UNSIGNED-PAYLOAD"
+            ),
+            access_key_id=self.access_key_id,
+            secret_access_key=self.secret_access_key,
+            region=self.region,
+            timestamp=datetime.now(timezone.utc),
+        )
+        if length is not None:
+            # NB: S3 does not support chunked transfer encoding
+            headers["content-length"] = str(length)
+        # NB: the URL must be sent as is since it is part of the signature
+        async with self._session.request(
+            method, URL(url, encoded=True), data=data or None, headers=headers
+        ) as resp:
+            content = await resp.read()
+            if resp.status not in expected_statuses:
+                raise InternalError(
+                    f"S3 {method} request failed with status {resp.status}: {content[:500]!r}"
+                )
+            return resp.status, content
+
+    async def put(self, key: str, data: bytes):
+        await self._request("PUT", self._get_url(key), data=data)
+
+    async def put_stream(self, key: str, content: AttachmentContent):
+        # NB: the size of a compressed content is only known once it has been consumed
+        if content.stored_length is None:
+            await super().put_stream(key, content)
+        else:
+            await self._request(
+                "PUT",
+                self._get_url(key),
+                data=aiter(content),
+                length=content.stored_length,
+            )
+
+    async def get(self, key: str) -> bytes:
+        status, content = await self._request(
+            "GET", self._get_url(key), expected_statuses=(200, 404)
+        )
+        if status == 404:
+            raise NotFoundError()
+        return content
+
+    async def get_range(self, key: str, start: int, stop: int) -> bytes:
+        if stop <= start:
+            return b""
+        status, content = await self._request(
+            "GET",
+            self._get_url(key),
+            headers={"range": f"bytes={start}-{stop - 1}"},
+            # NB: 416 is returned when start is beyond the end of the content
+            expected_statuses=(200, 206, 404, 416),
+        )
+        if status == 404:
+            raise NotFoundError()
+        if status == 416:
+            return b""
+        # NB: a server that does not support ranges returns the whole content
+        return content[start:stop] if status == 200 else content
+
+    async def move(self, src_key: str, dst_key: str):
+        # NB: S3 has no move operation, copy the object then delete the original
+        status, _ = await self._request(
+            "PUT",
+            self._get_url(dst_key),
+            headers={
+                "x-amz-copy-source": f"/{_quote(self.bucket)}/{_quote(src_key, safe='/')}"
+            },
+            expected_statuses=(200, 404),
+        )
+        if status == 404:
+            raise NotFoundError()
+        await self.delete(src_key)
+
+    async def delete(self, key: str):
+        await self._request(
+            "DELETE", self._get_url(key), expected_statuses=(200, 204, 404)
+        )
+
+    async def list_keys(self, prefix: str) -> AsyncIterator[str]:
+        continuation_token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix}
+            if continuation_token:
+                query["continuation-token"] = continuation_token
+            _, content = await self._request("GET", self._get_url(query=query))
+            root = ElementTree.fromstring(content)
+            # NB: ignore the XML namespace
+            for element in root.iter():
+                if element.tag.endswith("}Key") or element.tag == "Key":
+                    yield element.text
+            continuation_token = next(
+                (
+                    element.text
+                    for element in root.iter()
+                    if element.tag.endswith("NextContinuationToken")
+                ),
+                None,
+            )
+            if not continuation_token:
+                break
+
+    async def delete_all(self, prefix: str):
+        async for key in self.list_keys(prefix):
+            await self.delete(key)
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+
+_attachment_store: AttachmentStore | None = None
+
+
+def get_attachment_store() -> AttachmentStore:
+    global _attachment_store
+
+    if not _attachment_store:
+        config = get_config()
+        match config.attachment_store:
+            case "filesystem":
+                _attachment_store = FilesystemAttachmentStore(
+                    config.attachment_store_path
+                )
+            case "s3":
+                _attachment_store = S3AttachmentStore(
+                    endpoint_url=config.attachment_s3_endpoint_url,
+                    bucket=config.attachment_s3_bucket,
+                    region=config.attachment_s3_region,
+                    access_key_id=config.attachment_s3_access_key_id,
+                    secret_access_key=config.attachment_s3_secret_access_key,
+                )
+            case _:
+                dbm = get_dbm()
+                _attachment_store = ElasticsearchAttachmentStore(
+                    dbm.elastic_client, f"{dbm.name}_attachments"
+                )
+    return _attachment_store
+
+
+async def close_attachment_store():
+    global _attachment_store
+
+    if _attachment_store:
+        await _attachment_store.close()
+        _attachment_store = None
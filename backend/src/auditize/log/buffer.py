@@ -0,0 +1,170 @@
+import asyncio
+from typing import Iterable
+
+from elasticsearch import AsyncElasticsearch, helpers
+
+from auditize.config import get_config
+from auditize.database import get_elastic_client
+from auditize.exceptions import AuditizeException, ConstraintViolation, InternalError
+
+
+async def bulk_create_log_documents(
+    es: AsyncElasticsearch,
+    index: str,
+    documents: Iterable[tuple[str, dict]],
+    *,
+    refresh: bool = False,
+    raise_on_exception: bool = False,
+) -> list[AuditizeException | None]:
+    """
+    Create the given (log_id, document) pairs using the Elasticsearch bulk API.
+    Return, for each document and in the same order, the error that prevented
+    its creation or None if the document has been successfully created.
+    If raise_on_exception is True, transport errors are raised instead of being
+    reported as per-document errors.
+    """
+    errors = []
+    # NB: async_streaming_bulk yields the results in the same order as the actions
+    # as long as no retry is involved (max_retries=0, the default)
+    async for ok, result in helpers.async_streaming_bulk(
+        es,
+        (
+            {"_op_type": "create", "_index": index, "_id": log_id, "_source": document}
+            for log_id, document in documents
+        ),
+        raise_on_error=False,
+        raise_on_exception=raise_on_exception,
+        refresh=refresh,
+    ):
+        if ok:
+            errors.append(None)
+            continue
+        (item,) = result.values()
+        if item.get("status") == 409:
+            errors.append(ConstraintViolation(f"Log {item['_id']} already exists"))
+        else:
+            errors.append(
+                InternalError(
+                    f"Could not save log {item['_id']}: {item.get('error') or item.get('exception')}"
+                )
+            )
+    return errors
+
+
+class LogWriteBuffer:
+    """
+    Coalesce log documents that are saved one by one into Elasticsearch bulk requests.
+
+    Documents are queued per index and flushed as soon as `max_size` documents
+    are queued or `max_latency` seconds after the first document has been queued.
+    """
+
+    def __init__(self, es: AsyncElasticsearch, *, max_size: int, max_latency: float):
+        self.es = es
+        self.max_size = max_size
+        self.max_latency = max_latency
+        self._queues: dict[
+            tuple[str, bool], list[tuple[str, dict, asyncio.Future]]
+        ] = {}
+        self._timers: dict[tuple[str, bool], asyncio.TimerHandle] = {}
+        self._flushes: set[asyncio.Task] = set()
+        self._closed = False
+
+    async def create(
+        self, index: str, log_id: str, document: dict, *, refresh: bool = False
+    ):
+        """
+        Queue the document and wait until Elasticsearch has acknowledged it.
+        Raise ConstraintViolation if a log with the same id already exists.
+        """
+        if self._closed:
+            raise InternalError("The log write buffer is closed")
+
+        loop = asyncio.get_running_loop()
+        # NB: documents that require a refresh are not mixed with the others so that
+        # we don't refresh more than necessary
+        key = (index, refresh)
+        future = loop.create_future()
+        queue = self._queues.setdefault(key, [])
+        queue.append((log_id, document, future))
+        if len(queue) >= self.max_size:
+            self._flush_queue(key)
+        elif len(queue) == 1:
+            self._timers[key] = loop.call_later(
+                self.max_latency, self._flush_queue, key
+            )
+
+        # NB: shield the future so that a cancelled request (e.g. client disconnection)
+        # does not prevent the other items of the batch from being resolved
+        await asyncio.shield(future)
+
+    def _flush_queue(self, key: tuple[str, bool]):
+        if timer := self._timers.pop(key, None):
+            timer.cancel()
+        items = self._queues.pop(key, None)
+        if not items:
+            return
+        task = asyncio.create_task(self._flush(key, items))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(
+        self, key: tuple[str, bool], items: list[tuple[str, dict, asyncio.Future]]
+    ):
+        index, refresh = key
+        try:
+            errors = await bulk_create_log_documents(
+                self.es,
+                index,
+                ((log_id, document) for log_id, document, _ in items),
+                refresh=refresh,
+            )
+        except Exception as exc:
+            errors = [InternalError(f"Could not save logs: {exc}")] * len(items)
+
+        for (_, _, future), error in zip(items, errors):
+            if future.done():
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    async def close(self):
+        """
+        Flush all the queued documents and wait for all pending flushes to complete.
+        """
+        self._closed = True
+        for key in list(self._queues):
+            self._flush_queue(key)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+_log_write_buffer: LogWriteBuffer | None = None
+
+
+def get_log_write_buffer() -> LogWriteBuffer | None:
+    """
+    Return the process-wide log write buffer, or None if it's disabled.
+    """
+    global _log_write_buffer
+
+    config = get_config()
+    if not config.log_write_buffer_size:
+        return None
+    if not _log_write_buffer:
+        _log_write_buffer = LogWriteBuffer(
+            get_elastic_client(),
+            max_size=config.log_write_buffer_size,
+            max_latency=config.log_write_buffer_latency / 1000,
+        )
+    return _log_write_buffer
+
+
+async def close_log_write_buffer():
+    global _log_write_buffer
+
+    if _log_write_buffer:
+        await _log_write_buffer.close()
+        _log_write_buffer = None
@@ -145,27 +145,35 @@ async def stream_logs_as_csv(
     max_rows = get_config().export_max_rows
     exported_rows = 0
     cursor = None
-    for i in count(0):
-        csv_buffer = StringIO()
-        csv_writer = csv.writer(csv_buffer)
-        if i == 0:
-            csv_writer.writerow(
-                _translate_csv_column(col, log_service.repo.log_i18n_profile, lang)
-                for col in columns
+    try:
+        for i in count(0):
+            csv_buffer = StringIO()
+            csv_writer = csv.writer(csv_buffer)
+            if i == 0:
+                csv_writer.writerow(
+                    _translate_csv_column(col, log_service.repo.log_i18n_profile, lang)
+                    for col in columns
+                )
+            logs, cursor = await log_service.get_logs(
+                authorized_entities=authorized_entities,
+                search_params=search_params,
+                pagination_cursor=cursor,
+                limit=min(100, max_rows - exported_rows) if max_rows > 0 else 100,
+                # NB: export a consistent snapshot of the logs
+                use_pit=True,
             )
-        logs, cursor = await log_service.get_logs(
-            authorized_entities=authorized_entities,
-            search_params=search_params,
-            pagination_cursor=cursor,
-            limit=min(100, max_rows - exported_rows) if max_rows > 0 else 100,
-        )
-        exported_rows += len(logs)
-        csv_writer.writerows(
-            _log_dict_to_csv_row(
-                _log_to_dict(log, log_service.repo.log_i18n_profile, lang), columns
+            exported_rows += len(logs)
+            csv_writer.writerows(
+                _log_dict_to_csv_row(
+                    _log_to_dict(log, log_service.repo.log_i18n_profile, lang), columns
+                )
+                for log in logs
             )
-            for log in logs
-        )
-        yield csv_buffer.getvalue()
-        if not cursor or (max_rows > 0 and exported_rows >= max_rows):
-            break
+            yield csv_buffer.getvalue()
+            if not cursor or (max_rows > 0 and exported_rows >= max_rows):
+                break
+    finally:
+        # NB: the export may stop before the last page (max rows reached, client
+        # disconnected), don't keep its point in time open until it expires
+        if cursor:
+            await log_service.close_pagination_cursor(cursor)
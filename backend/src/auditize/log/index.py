@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from auditize.database import get_elastic_client
 from auditize.repo.sql_models import Repo
 
-_MAPPING_VERSION = 5
+_MAPPING_VERSION = 9
 
 # Elasticsearch mapping history:
 # - 0.7.0:
@@ -19,6 +19,11 @@ _MAPPING_VERSION = 5
 #   - v3: unchanged mapping, use '_' instead of '-' in custom field names and identifiers in general
 #   - v4: add emitter field
 #   - v5: add emitted_at field and update sorting to use emitted_at and log_id
+#   - v6: move attachment data out of the log document (into the attachment store)
+#   - v7: add search_text field (denormalized text values used by the full-text search)
+#   - v8: add entity_refs field (flattened entity_path refs used by the entity filtering)
+#   - v9: add tag_*, attachment_* and attachment_count fields (flattened tags and attachments
+#     used by the tag and attachment filters)
 
 _TYPE_TEXT_CUSTOM_ASCIIFOLDING = {
     "type": "text",
@@ -100,7 +105,10 @@ _MAPPING = {
                 "type": {"type": "keyword"},
                 "mime_type": {"type": "keyword"},
                 "saved_at": {"type": "date"},
-                "data": {"type": "binary"},
+                "key": {"type": "keyword", "index": False},
+                "size": {"type": "long"},
+                "sha256": {"type": "keyword", "index": False},
+                "encoding": {"type": "keyword", "index": False},
             },
         },
         "entity_path": {
@@ -113,6 +121,14 @@ _MAPPING = {
                 },
             },
         },
+        "search_text": _TYPE_TEXT_CUSTOM_ASCIIFOLDING,
+        "entity_refs": {"type": "keyword"},
+        "tag_refs": {"type": "keyword"},
+        "tag_types": {"type": "keyword"},
+        "tag_names": {"type": "keyword"},
+        "attachment_types": {"type": "keyword"},
+        "attachment_mime_types": {"type": "keyword"},
+        "attachment_count": {"type": "integer"},
     }
 }
 
@@ -194,6 +210,16 @@ async def _get_index_mapping_version(index: str) -> int:
     return int(match.group(1)) if match else 1
 
 
+async def get_read_index_mapping_version(repo: Repo) -> int:
+    """
+    Return the mapping version of the index the logs of the repository are read from
+    (it is the former index during a reindex operation).
+    """
+    return await _get_index_mapping_version(
+        await _get_alias_index(get_elastic_client(), get_read_alias(repo))
+    )
+
+
 async def _copy_logs(session: AsyncSession, repo: Repo, *, target_index: str):
     from auditize.log.service import LogService
     from auditize.repo.service import update_repo_reindex_progress
@@ -210,13 +236,22 @@ async def _copy_logs(session: AsyncSession, repo: Repo, *, target_index: str):
             limit=100,
             pagination_cursor=pagination_cursor,
         )
+        # NB: attachment data is no longer saved inline since v6. If the reindex is
+        # interrupted and resumed, the attachments of the last batch are referenced twice,
+        # which may only prevent the removal of their content, never remove a used content.
+        for log in logs:
+            for attachment in log.attachments:
+                if attachment.data is not None:
+                    await log_service.move_attachment_data_to_store(attachment)
+        # NB: the custom field registry is populated from the existing logs
+        await log_service.register_log_custom_fields(logs)
         await helpers.async_bulk(
             log_service.es,
             [
                 {
                     "_index": target_index,
                     "_id": log.id,
-                    "_source": log.model_dump(context="es"),
+                    "_source": log.to_es_document(),
                 }
                 for log in logs
             ],
@@ -268,12 +303,13 @@ async def _prepare_reindex(
     print(f"Created new index {target_write_index} for repository {repo.id}")
 
 
-async def _finalize_reindex(repo: Repo):
+async def _finalize_reindex(session: AsyncSession, repo: Repo):
     """
     Completes the reindex operation by:
     - pointing the read alias to the newly created index,
     - deleting the former index.
     """
+    from auditize.log.service import bump_log_write_generation
 
     elastic_client = get_elastic_client()
 
@@ -307,6 +343,8 @@ async def _finalize_reindex(repo: Repo):
     ###
     await elastic_client.indices.delete(index=current_read_index)
 
+    await bump_log_write_generation(session, repo)
+
     print(f"Reindex operation for repository {repo.id} completed")
 
 
@@ -390,4 +428,4 @@ async def reindex_index(
     ###
     # Finalize the reindex operation
     ###
-    await _finalize_reindex(repo)
+    await _finalize_reindex(session, repo)
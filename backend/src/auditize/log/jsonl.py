@@ -14,17 +14,25 @@ async def stream_logs_as_jsonl(
     max_rows = get_config().export_max_rows
     exported_rows = 0
     cursor = None
-    while True:
-        logs, cursor = await log_service.get_logs(
-            authorized_entities=authorized_entities,
-            search_params=search_params,
-            pagination_cursor=cursor,
-            limit=min(100, max_rows - exported_rows) if max_rows > 0 else 100,
-        )
-        yield "\n".join(
-            LogResponse.model_validate(log.model_dump()).model_dump_json()
-            for log in logs
-        )
-        exported_rows += len(logs)
-        if not cursor or (max_rows > 0 and exported_rows >= max_rows):
-            break
+    try:
+        while True:
+            logs, cursor = await log_service.get_logs(
+                authorized_entities=authorized_entities,
+                search_params=search_params,
+                pagination_cursor=cursor,
+                limit=min(100, max_rows - exported_rows) if max_rows > 0 else 100,
+                # NB: export a consistent snapshot of the logs
+                use_pit=True,
+            )
+            yield "\n".join(
+                LogResponse.model_validate(log.model_dump()).model_dump_json()
+                for log in logs
+            )
+            exported_rows += len(logs)
+            if not cursor or (max_rows > 0 and exported_rows >= max_rows):
+                break
+    finally:
+        # NB: the export may stop before the last page (max rows reached, client
+        # disconnected), don't keep its point in time open until it expires
+        if cursor:
+            await log_service.close_pagination_cursor(cursor)
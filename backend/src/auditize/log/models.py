@@ -18,6 +18,7 @@ from pydantic import (
     model_validator,
 )
 
+from auditize.api.exception import ApiErrorResponse
 from auditize.api.models.common import IdField
 from auditize.api.models.cursor_pagination import (
     CursorPaginatedResponse,
@@ -76,6 +77,14 @@ class CustomField(BaseModel):
 
         return serialized
 
+    def to_es_document(self) -> dict:
+        # NB: this is a fast equivalent of self.model_dump(context="es")
+        return {
+            "type": self.type,
+            "name": self.name,
+            self._ES_MAPPING.get(self.type, "value"): self.value,
+        }
+
     @model_validator(mode="before")
     @classmethod
     def pre_validation(cls, data: Any, info: ValidationInfo) -> Any:
@@ -161,6 +170,13 @@ class Log(BaseModel):
         type: Annotated[str, BeforeValidator(normalize_identifier)]
         mime_type: str
         saved_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+        # NB: the attachment content is kept in the attachment store under this key,
+        # it is None for attachments whose content is still inline (pre-v6 indexes)
+        key: str | None = None
+        size: int | None = None
+        sha256: str | None = None
+        # NB: the encoding (e.g. "gzip") of the content in the attachment store
+        encoding: str | None = None
         # NB: the default is set to None so that we can retrieve a log without attachment data
         data: bytes | None = Field(default=None)
 
@@ -201,8 +217,127 @@ class Log(BaseModel):
         if info.context != "es":
             return serialized
         serialized["log_id"] = serialized.pop("id")
+        # NB: the attachment content is saved in the attachment store
+        for attachment in serialized["attachments"]:
+            del attachment["data"]
+        serialized.update(self._get_es_search_fields())
         return serialized
 
+    def _get_es_search_fields(self) -> dict:
+        """
+        Return the fields that are denormalized from the log into its Elasticsearch
+        document so that the most common filters do not require nested queries.
+        """
+        return {
+            "search_text": self.get_search_text(),
+            "entity_refs": [entity.ref for entity in self.entity_path],
+            "tag_refs": [tag.ref for tag in self.tags if tag.ref is not None],
+            "tag_types": [tag.type for tag in self.tags],
+            "tag_names": [tag.name for tag in self.tags if tag.name is not None],
+            "attachment_types": [attachment.type for attachment in self.attachments],
+            "attachment_mime_types": [
+                attachment.mime_type for attachment in self.attachments
+            ],
+            "attachment_count": len(self.attachments),
+        }
+
+    def get_search_text(self) -> list[str]:
+        """
+        Return the texts that are matched by the full-text search: the values of the text
+        custom fields (source, actor extra, resource extra and details) and the resource name.
+        They are denormalized into the "search_text" field of the Elasticsearch document
+        so that a search does not have to go through nested queries.
+        """
+        fields = [*self.source, *self.details]
+        if self.actor:
+            fields.extend(self.actor.extra)
+        if self.resource:
+            fields.extend(self.resource.extra)
+        texts = [
+            str(field.value)
+            for field in fields
+            if field.type not in CustomField._ES_MAPPING
+        ]
+        if self.resource:
+            texts.append(self.resource.name)
+        return texts
+
+    @classmethod
+    def from_log_create(
+        cls,
+        log_create: "LogCreate",
+        *,
+        id: UUID,
+        emitter: Emitter,
+        saved_at: datetime | None = None,
+    ) -> Self:
+        """
+        Build a Log from an already validated LogCreate (or LogImport).
+        """
+        # NB: model_construct() would avoid the validation pass but, as it is implemented
+        # in pure Python, it turns out to be slower than model_validate() for a whole log
+        log_json = log_create.model_dump(exclude={"id"})
+        log_json["id"] = id
+        log_json["emitter"] = emitter
+        if saved_at:
+            log_json["saved_at"] = saved_at
+        return cls.model_validate(log_json)
+
+    def to_es_document(self) -> dict:
+        """
+        Return the Elasticsearch document of the log, this is a fast equivalent of
+        self.model_dump(context="es").
+        """
+
+        def custom_fields(fields: list[CustomField]) -> list[dict]:
+            return [field.to_es_document() for field in fields]
+
+        return {
+            "log_id": self.id,
+            "emitter": {
+                "type": self.emitter.type,
+                "id": self.emitter.id,
+                "name": self.emitter.name,
+            },
+            "action": {"type": self.action.type, "category": self.action.category},
+            "saved_at": self.saved_at,
+            "emitted_at": self.emitted_at,
+            "source": custom_fields(self.source),
+            "actor": (
+                {
+                    "ref": self.actor.ref,
+                    "type": self.actor.type,
+                    "name": self.actor.name,
+                    "extra": custom_fields(self.actor.extra),
+                }
+                if self.actor
+                else None
+            ),
+            "resource": (
+                {
+                    "ref": self.resource.ref,
+                    "type": self.resource.type,
+                    "name": self.resource.name,
+                    "extra": custom_fields(self.resource.extra),
+                }
+                if self.resource
+                else None
+            ),
+            "details": custom_fields(self.details),
+            "tags": [
+                {"ref": tag.ref, "type": tag.type, "name": tag.name}
+                for tag in self.tags
+            ],
+            "attachments": [
+                attachment.model_dump(exclude={"data"})
+                for attachment in self.attachments
+            ],
+            "entity_path": [
+                {"ref": entity.ref, "name": entity.name} for entity in self.entity_path
+            ],
+            **self._get_es_search_fields(),
+        }
+
     @model_validator(mode="before")
     @classmethod
     def pre_validation(cls, data: Any, info: ValidationInfo) -> Any:
@@ -575,10 +710,56 @@ class LogImport(LogCreate):
     emitted_at: datetime = _EmittedAtField()
 
 
+class LogAttachmentCreate(BaseModel):
+    type: str = Field(
+        description="The 'functional' type of the attachment",
+        json_schema_extra={"example": "configuration_file"},
+        pattern=IDENTIFIER_PATTERN,
+    )
+    name: str | None = Field(
+        description="The name of the attachment. If not provided, the name of the uploaded file will be used.",
+        json_schema_extra={"example": "config.json"},
+        default=None,
+    )
+    mime_type: str | None = Field(
+        description="The MIME type of the attachment. If not provided, the MIME type of the uploaded "
+        "file will be used.",
+        json_schema_extra={"example": "application/json"},
+        default=None,
+    )
+
+
 class LogCreationResponse(BaseModel):
     id: UUID = _LogIdField()
 
 
+# Maximum number of logs that can be sent in a single bulk request
+LOG_BULK_MAX_SIZE = 1000
+
+
+class LogBulkItemResponse(BaseModel):
+    status: int = Field(
+        description="The HTTP status code of the log creation (201 on success)",
+        json_schema_extra={"example": 201},
+    )
+    id: UUID | None = IdField(
+        "Log ID (only set if the log has been successfully created)", default=None
+    )
+    error: ApiErrorResponse | None = Field(
+        description="The error that prevented the log creation (if any)",
+        default=None,
+    )
+
+
+class LogBulkResponse(BaseModel):
+    errors: bool = Field(
+        description="Whether at least one log of the batch could not be created"
+    )
+    items: list[LogBulkItemResponse] = Field(
+        description="The result of each log creation (in the same order as the request)"
+    )
+
+
 class _AttachmentData(BaseModel, HasDatetimeSerialization):
     name: str
     type: str
@@ -876,7 +1057,36 @@ class LogSearchQueryParams(BaseLogSearchParams):
 
 
 class LogListParams(CursorPaginationParams, LogSearchQueryParams):
-    pass
+    pit: bool = Field(
+        description=(
+            "Whether to paginate over a point in time of the logs, so that the pages are "
+            "consistent with each other regardless of the logs saved in the meantime "
+            "(only taken into account for the first page, a page must then be requested "
+            "within one minute after the previous one)"
+        ),
+        default=False,
+    )
+
+
+class LogCountParams(LogSearchQueryParams):
+    exact: bool = Field(
+        description=(
+            "Whether to count all the matching logs, otherwise the count is only exact "
+            "up to a threshold (10000) above which it is a lower bound"
+        ),
+        default=False,
+    )
+
+
+class LogCountResponse(BaseModel):
+    count: int = Field(
+        description="The number of logs matching the search parameters",
+        json_schema_extra={"example": 42},
+    )
+    exact: bool = Field(
+        description="Whether the count is exact or only a lower bound",
+        json_schema_extra={"example": True},
+    )
 
 
 LOG_CSV_BUILTIN_COLUMNS = (
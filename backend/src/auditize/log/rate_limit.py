@@ -0,0 +1,124 @@
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auditize.auth.authorizer import Authenticated
+from auditize.config import get_config
+from auditize.exceptions import RateLimitExceeded
+from auditize.log.sql_models import LogWriteRateLimitBucket
+
+
+class TokenBucketRateLimiter:
+    """
+    A token bucket rate limiter whose buckets are stored in PostgreSQL, so that
+    the limits are enforced across all the application processes.
+
+    A bucket holds up to `capacity` tokens and is refilled at `rate` tokens
+    per second. A request costing more tokens than the bucket capacity is
+    allowed once the bucket is full and puts the bucket into debt (negative
+    tokens), so that the overall rate is still enforced.
+    """
+
+    async def consume(
+        self,
+        session: AsyncSession,
+        key: str,
+        *,
+        rate: float,
+        capacity: float,
+        cost: float = 1,
+    ):
+        """
+        Take `cost` tokens from the bucket identified by `key`, or raise
+        RateLimitExceeded if the bucket does not hold enough tokens.
+        """
+        # A request costing more than the bucket capacity would never be allowed
+        # if it had to wait for `cost` tokens: it waits for a full bucket instead
+        required = min(cost, capacity)
+
+        bucket = LogWriteRateLimitBucket
+        # NB: now() is the start time of the transaction, a transaction started
+        # before the last update of the bucket would see a negative elapsed time
+        elapsed = func.greatest(
+            func.extract("epoch", func.clock_timestamp() - bucket.updated_at), 0
+        )
+        available_tokens = func.least(capacity, bucket.tokens + elapsed * rate)
+        stmt = insert(bucket).values(
+            key=key, tokens=capacity - cost, updated_at=func.clock_timestamp()
+        )
+        result = await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[bucket.key],
+                set_=dict(
+                    tokens=available_tokens - cost, updated_at=func.clock_timestamp()
+                ),
+                where=available_tokens >= required,
+            ).returning(bucket.tokens)
+        )
+        if result.scalar() is not None:
+            await session.commit()
+            return
+
+        tokens = await session.scalar(select(available_tokens).where(bucket.key == key))
+        await session.commit()
+        raise RateLimitExceeded(retry_after=(required - (tokens or 0)) / rate)
+
+    async def refund(
+        self, session: AsyncSession, key: str, *, capacity: float, cost: float = 1
+    ):
+        """
+        Give back `cost` tokens previously taken from the bucket identified by `key`.
+        """
+        bucket = LogWriteRateLimitBucket
+        await session.execute(
+            update(bucket)
+            .where(bucket.key == key)
+            .values(tokens=func.least(capacity, bucket.tokens + cost))
+        )
+        await session.commit()
+
+
+_log_write_rate_limiter = TokenBucketRateLimiter()
+
+
+def get_log_write_rate_limiter() -> TokenBucketRateLimiter:
+    return _log_write_rate_limiter
+
+
+async def check_log_write_rate_limit(
+    session: AsyncSession, authenticated: Authenticated, repo_id: UUID, cost: int = 1
+):
+    """
+    Enforce the configured log write rate limits (per repository and per API key)
+    for a request that writes `cost` logs.
+    """
+    config = get_config()
+    limiter = get_log_write_rate_limiter()
+
+    if authenticated.apikey:
+        apikey = authenticated.apikey
+    elif authenticated.access_token:
+        apikey = authenticated.access_token.apikey
+    else:
+        apikey = None
+
+    buckets = []
+    if rate := config.log_write_rate_limit_repo:
+        buckets.append((f"repo:{repo_id}", rate))
+    if apikey and (rate := config.log_write_rate_limit_apikey):
+        buckets.append((f"apikey:{apikey.id}", rate))
+
+    # Tokens taken from a bucket are given back if a subsequent bucket rejects
+    # the request, so that a rejected request does not count against any limit
+    consumed = []
+    try:
+        for key, rate in buckets:
+            capacity = max(rate * config.log_write_rate_limit_burst, 1)
+            await limiter.consume(session, key, rate=rate, capacity=capacity, cost=cost)
+            consumed.append((key, capacity))
+    except RateLimitExceeded:
+        for key, capacity in consumed:
+            await limiter.refund(session, key, capacity=capacity, cost=cost)
+        raise
@@ -1,19 +1,34 @@
+import base64
+import hashlib
+import json
 import re
 import string
 import unicodedata
 import uuid
+from collections import Counter
 from datetime import datetime, timedelta
 from functools import partial, partialmethod
-from typing import Any, AsyncIterator, Awaitable, Callable, Self
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Self
 from uuid import UUID
 
 import elasticsearch
-from aiocache import Cache
-from elasticsearch import AsyncElasticsearch
+from elasticsearch import AsyncElasticsearch, helpers
 from elasticsearch import NotFoundError as ElasticNotFoundError
-from sqlalchemy import and_, delete, select
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import (
+    BigInteger,
+    and_,
+    bindparam,
+    case,
+    delete,
+    func,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 
 from auditize.api.models.cursor_pagination import (
     load_pagination_cursor,
@@ -29,14 +44,29 @@ from auditize.config import get_config
 from auditize.database import DatabaseManager
 from auditize.database.sql.service import get_sql_model
 from auditize.exceptions import (
+    AuditizeException,
     ConstraintViolation,
     InvalidPaginationCursor,
     NotFoundError,
     PermissionDenied,
 )
+from auditize.helpers.cache import AsyncCache, LruCache
 from auditize.helpers.datetime import now
-from auditize.log.index import get_read_alias, get_write_alias
+from auditize.helpers.uuid import uuid7
+from auditize.log.attachment_store import (
+    AttachmentContent,
+    decode_attachment_content,
+    get_attachment_store,
+    is_compressible_mime_type,
+)
+from auditize.log.buffer import bulk_create_log_documents, get_log_write_buffer
+from auditize.log.index import (
+    get_read_alias,
+    get_read_index_mapping_version,
+    get_write_alias,
+)
 from auditize.log.models import (
+    CustomField,
     CustomFieldType,
     Emitter,
     Log,
@@ -44,12 +74,286 @@ from auditize.log.models import (
     LogImport,
     LogSearchParams,
 )
-from auditize.log.sql_models import LogEntity
+from auditize.log.sql_models import (
+    LogAttachmentBlob,
+    LogCustomField,
+    LogCustomFieldEnumValue,
+    LogEntity,
+    LogIdempotencyKey,
+    LogIngestionQueueItem,
+)
 from auditize.log_i18n_profile.models import LogLabels
-from auditize.repo.service import get_repo, get_retention_period_enabled_repos
-from auditize.repo.sql_models import Repo, RepoStatus
+from auditize.repo.service import (
+    get_all_repos,
+    get_repo,
+    get_retention_period_enabled_repos,
+)
+from auditize.repo.sql_models import Repo, RepoLogIdType, RepoStatus
+
+# (repo_id, entity generation, entity ref, entity name, parent entity id) => entity id
+type _LogEntityCacheKey = tuple[UUID, int, str, str, UUID | None]
+
+_consolidated_log_entities: LruCache[_LogEntityCacheKey, UUID] | None = None
+
+
+def get_consolidated_log_entities_cache() -> LruCache[_LogEntityCacheKey, UUID]:
+    global _consolidated_log_entities
+
+    if _consolidated_log_entities is None:
+        config = get_config()
+        _consolidated_log_entities = LruCache(
+            config.log_entity_cache_size, config.log_entity_cache_ttl
+        )
+    return _consolidated_log_entities
+
+
+def invalidate_consolidated_log_entities(repo_id: UUID):
+    get_consolidated_log_entities_cache().invalidate(lambda key: key[0] == repo_id)
+
+
+# The mapping versions from which the flattened search fields exist (see the mapping
+# history in auditize.log.index): the logs of an index of a former version are
+# searched on the nested fields until the repository is reindexed
+_SEARCH_TEXT_MAPPING_VERSION = 7
+_ENTITY_REFS_MAPPING_VERSION = 8
+_TAG_AND_ATTACHMENT_FIELDS_MAPPING_VERSION = 9
+
+# read alias => mapping version of the index it points to
+_READ_INDEX_MAPPING_VERSION_CACHE_SIZE = 1000
+# NB: once a reindex is completed, a process may keep searching the nested fields
+# during this time, which is harmless as they still exist in the new index
+_READ_INDEX_MAPPING_VERSION_CACHE_TTL = 60
+
+_read_index_mapping_versions: LruCache[str, int] | None = None
+
+
+def get_read_index_mapping_versions_cache() -> LruCache[str, int]:
+    global _read_index_mapping_versions
+
+    if _read_index_mapping_versions is None:
+        _read_index_mapping_versions = LruCache(
+            _READ_INDEX_MAPPING_VERSION_CACHE_SIZE,
+            _READ_INDEX_MAPPING_VERSION_CACHE_TTL,
+        )
+    return _read_index_mapping_versions
+
+
+# (repo_id, custom field path, custom field name) => custom field type
+type _CustomFieldTypeCacheKey = tuple[UUID, str, str]
+
+_CUSTOM_FIELD_TYPE_CACHE_SIZE = 10_000
+
+_custom_field_types: LruCache[_CustomFieldTypeCacheKey, CustomFieldType] | None = None
+
+
+def get_custom_field_types_cache() -> LruCache[
+    _CustomFieldTypeCacheKey, CustomFieldType
+]:
+    global _custom_field_types
+
+    if _custom_field_types is None:
+        ttl = get_config().log_custom_field_type_cache_ttl
+        # NB: unlike log entities, the type of a custom field may change over time,
+        # the cache is disabled if no TTL is set
+        _custom_field_types = LruCache(_CUSTOM_FIELD_TYPE_CACHE_SIZE if ttl else 0, ttl)
+    return _custom_field_types
+
+
+def invalidate_custom_field_types(repo_id: UUID):
+    get_custom_field_types_cache().invalidate(lambda key: key[0] == repo_id)
+
+
+# (repo_id, custom field path, custom field name, enum value) => (type, last seen),
+# the enum value being None for the entry of the custom field itself
+type _RegisteredCustomFieldCacheKey = tuple[UUID, str, str, str | None]
+
+_REGISTERED_CUSTOM_FIELD_CACHE_SIZE = 100_000
+
+# The last seen date of a registered custom field (or enum value) is only updated
+# once it is outdated by this delay, so that most logs don't involve any write
+_CUSTOM_FIELD_LAST_SEEN_RESOLUTION = timedelta(hours=1)
+
+# Enum values longer than this (in bytes) are not registered, they would not fit
+# in the registry index
+_CUSTOM_FIELD_ENUM_VALUE_MAX_SIZE = 1024
+
+_registered_custom_fields: (
+    LruCache[_RegisteredCustomFieldCacheKey, tuple[str, datetime]] | None
+) = None
+
+
+def get_registered_custom_fields_cache() -> LruCache[
+    _RegisteredCustomFieldCacheKey, tuple[str, datetime]
+]:
+    global _registered_custom_fields
+
+    if _registered_custom_fields is None:
+        # NB: the TTL bounds the time during which a process may ignore a custom field
+        # registration performed by another process
+        _registered_custom_fields = LruCache(
+            _REGISTERED_CUSTOM_FIELD_CACHE_SIZE,
+            _CUSTOM_FIELD_LAST_SEEN_RESOLUTION.total_seconds(),
+        )
+    return _registered_custom_fields
+
+
+def invalidate_registered_custom_fields(repo_id: UUID):
+    get_registered_custom_fields_cache().invalidate(lambda key: key[0] == repo_id)
+
+
+async def bump_log_write_generation(
+    session: AsyncSession, repo: Repo, *, min_interval: timedelta = timedelta(0)
+):
+    """
+    Record that the logs of the repository have been written (or deleted). The write
+    generation (the time of the last write) is stored along with the repository, so
+    that the cached log searches of all the application processes are invalidated.
+    The generation is not bumped if it has been bumped less than `min_interval` ago.
+    """
+    if (
+        min_interval
+        and repo.log_written_at
+        and now() - repo.log_written_at < min_interval
+    ):
+        return
+
+    query = update(Repo).where(Repo.id == repo.id)
+    if min_interval:
+        # NB: the condition is checked again as another process may have bumped
+        # the generation since the repository has been loaded
+        query = query.where(
+            or_(
+                Repo.log_written_at.is_(None),
+                Repo.log_written_at < func.clock_timestamp() - min_interval,
+            )
+        )
+    written_at = await session.scalar(
+        query.values(
+            log_written_at=func.greatest(Repo.log_written_at, func.clock_timestamp()),
+            # NB: the repository itself is not modified
+            updated_at=Repo.updated_at,
+        ).returning(Repo.log_written_at)
+    )
+    await session.commit()
+    if written_at:
+        # NB: update the loaded repository without marking it as modified
+        set_committed_value(repo, "log_written_at", written_at)
+
+
+# Writing logs bumps the write generation at most once per interval, so that
+# concurrent writers do not all queue on the lock of the repository row
+_LOG_WRITE_GENERATION_INTERVAL = timedelta(seconds=2)
+
+# Elasticsearch makes new documents searchable once the index has been refreshed
+# (every second by default): searches are not cached until the last write is older
+# than this delay (which includes a margin for clock differences between hosts).
+# NB: the writes made within the generation interval that follows a bump do not
+# bump the generation, hence the interval being part of the delay.
+_LOG_WRITE_SETTLE_DELAY = _LOG_WRITE_GENERATION_INTERVAL + timedelta(seconds=2)
+
+# (repo_id, write generation, normalized search) => (log documents, next cursor)
+type _LogSearchCacheKey = tuple[UUID, datetime | None, str]
+
+_log_search_cache: (
+    LruCache[_LogSearchCacheKey, tuple[list[dict], str | None]] | None
+) = None
+
+
+def get_log_search_cache() -> LruCache[
+    _LogSearchCacheKey, tuple[list[dict], str | None]
+]:
+    global _log_search_cache
+
+    if _log_search_cache is None:
+        config = get_config()
+        _log_search_cache = LruCache(
+            config.log_search_cache_size, config.log_search_cache_ttl
+        )
+    return _log_search_cache
+
+
+# (repo_id, normalized aggregation) => (aggregated values, next cursor)
+type _LogAggregationCacheKey = tuple[UUID, str]
+
+_LOG_AGGREGATION_CACHE_SIZE = 10_000
+
+# Once outdated, aggregated values are still served during this delay (in seconds)
+# while being refreshed in the background
+_LOG_AGGREGATION_CACHE_STALE_TTL = 60
+
+_log_aggregation_cache: (
+    AsyncCache[_LogAggregationCacheKey, tuple[list[list[str]], str | None]] | None
+) = None
+
+
+def get_log_aggregation_cache() -> AsyncCache[
+    _LogAggregationCacheKey, tuple[list[list[str]], str | None]
+]:
+    global _log_aggregation_cache
+
+    if _log_aggregation_cache is None:
+        _log_aggregation_cache = AsyncCache(
+            _LOG_AGGREGATION_CACHE_SIZE,
+            get_config().log_aggregation_cache_ttl,
+            _LOG_AGGREGATION_CACHE_STALE_TTL,
+        )
+    return _log_aggregation_cache
 
-_CONSOLIDATED_LOG_ENTITIES = Cache(Cache.MEMORY)
+
+# (repo_id, write generation, normalized query) => exact log count
+type _LogCountCacheKey = tuple[UUID, datetime | None, str]
+
+_LOG_COUNT_CACHE_SIZE = 1000
+_LOG_COUNT_CACHE_TTL = 60
+
+# Up to this number of matching logs, the approximate log count is exact
+_LOG_COUNT_APPROXIMATE_THRESHOLD = 10_000
+
+_log_count_cache: AsyncCache[_LogCountCacheKey, int] | None = None
+
+
+def get_log_count_cache() -> AsyncCache[_LogCountCacheKey, int]:
+    global _log_count_cache
+
+    if _log_count_cache is None:
+        _log_count_cache = AsyncCache(_LOG_COUNT_CACHE_SIZE, _LOG_COUNT_CACHE_TTL)
+    return _log_count_cache
+
+
+# How long (in Elasticsearch time units) a point in time used for log pagination
+# is kept alive between two pages
+_LOG_PIT_KEEP_ALIVE = "1m"
+
+# Fields of the Elasticsearch log document that are only derived from the log
+# for search purposes, they are not needed when reading logs
+_ES_DERIVED_FIELDS = [
+    "search_text",
+    "entity_refs",
+    "tag_refs",
+    "tag_types",
+    "tag_names",
+    "attachment_types",
+    "attachment_mime_types",
+    "attachment_count",
+]
+
+_ADD_ATTACHMENT_SCRIPT = """
+ctx._source.attachments.add(params.attachment);
+ctx._source.attachment_types = [];
+ctx._source.attachment_mime_types = [];
+for (def attachment : ctx._source.attachments) {
+    ctx._source.attachment_types.add(attachment.type);
+    ctx._source.attachment_mime_types.add(attachment.mime_type);
+}
+ctx._source.attachment_count = ctx._source.attachments.size();
+"""
+
+# Temporary attachment contents older than this are left behind by interrupted
+# uploads and can be purged
+_ATTACHMENT_TMP_CONTENT_MAX_AGE = timedelta(days=1)
+
+# Maximum number of attempts to save a log from the ingestion queue
+_INGESTION_QUEUE_MAX_ATTEMPTS = 5
 
 
 class _OffsetPaginationCursor:
@@ -62,7 +366,7 @@ class _OffsetPaginationCursor:
             decoded = load_pagination_cursor(value)
             try:
                 return cls(int(decoded["offset"]))
-            except (KeyError, ValueError):
+            except (KeyError, TypeError, ValueError):
                 raise InvalidPaginationCursor(value)
         else:
             return cls(offset=0)
@@ -81,6 +385,15 @@ class _OffsetPaginationCursor:
         return next_cursor
 
 
+def _load_registry_pagination_cursor(value: str | None, key: str) -> str | None:
+    if value is None:
+        return None
+    decoded = load_pagination_cursor(value)
+    if not (isinstance(decoded, dict) and isinstance(decoded.get(key), str)):
+        raise InvalidPaginationCursor(value)
+    return decoded[key]
+
+
 class LogService:
     def __init__(self, repo: Repo, es: AsyncElasticsearch, session: AsyncSession):
         self.repo = repo
@@ -88,7 +401,11 @@ class LogService:
         self.session = session
         self.read_alias = get_read_alias(repo)
         self.write_alias = get_write_alias(repo)
-        self._refresh = get_config().test_mode
+        config = get_config()
+        self._refresh = config.test_mode
+        # When enabled, logs are not directly saved into Elasticsearch but put
+        # in the ingestion queue, to be processed by the ingest worker
+        self.queued_ingestion = config.log_ingestion_queue
 
     @classmethod
     async def _for_statuses(
@@ -130,38 +447,115 @@ class LogService:
 
     for_maintenance = for_config
 
-    async def check_log(self, log: LogCreate | LogImport):
+    async def _get_sibling_entity_refs(
+        self, names: set[str]
+    ) -> dict[tuple[str | None, str], set[str]]:
+        # Fetch in a single query all the entities that may conflict with the given names
+        # and index their refs by (parent ref, name)
+        parent_entity = aliased(LogEntity)
+        result = await self.session.execute(
+            select(LogEntity.ref, LogEntity.name, parent_entity.ref)
+            .outerjoin(parent_entity, LogEntity.parent_entity_id == parent_entity.id)
+            .where(LogEntity.repo_id == self.repo.id, LogEntity.name.in_(names))
+        )
+        sibling_entity_refs = {}
+        for ref, name, parent_entity_ref in result.all():
+            sibling_entity_refs.setdefault((parent_entity_ref, name), set()).add(ref)
+        return sibling_entity_refs
+
+    @staticmethod
+    def _check_entity_path(
+        entity_path: list, sibling_entity_refs: dict[tuple[str | None, str], set[str]]
+    ):
         parent_entity_ref = None
-        for entity in log.entity_path:
-            existing_entity = await self.session.scalar(
-                select(LogEntity).where(
-                    LogEntity.repo_id == self.repo.id,
-                    LogEntity.parent_entity_ref == parent_entity_ref,
-                    LogEntity.name == entity.name,
-                    LogEntity.ref != entity.ref,
-                )
-            )
-            if existing_entity:
+        for entity in entity_path:
+            refs = sibling_entity_refs.get((parent_entity_ref, entity.name), set())
+            if refs - {entity.ref}:
                 raise ConstraintViolation(
                     f"Entity {entity.ref!r} is invalid, there are other logs with "
                     f"the same entity name but with another ref at the same level (same parent)"
                 )
             parent_entity_ref = entity.ref
 
+    async def check_log(self, log: LogCreate | LogImport):
+        self._check_entity_path(
+            log.entity_path,
+            await self._get_sibling_entity_refs(
+                {entity.name for entity in log.entity_path}
+            ),
+        )
+
+    def _generate_log_id(self) -> UUID:
+        if self.repo.log_id_type == RepoLogIdType.UUID7:
+            return uuid7()
+        return uuid.uuid4()
+
+    async def _enqueue_logs(self, logs: list[Log]) -> list[AuditizeException | None]:
+        result = await self.session.execute(
+            insert(LogIngestionQueueItem)
+            .values(
+                [
+                    dict(
+                        id=log.id,
+                        repo_id=self.repo.id,
+                        log=log.model_dump(mode="json"),
+                    )
+                    for log in logs
+                ]
+            )
+            .on_conflict_do_nothing()
+            .returning(LogIngestionQueueItem.id)
+        )
+        queued_log_ids = set(result.scalars().all())
+        await self.session.commit()
+
+        errors = []
+        for log in logs:
+            if log.id in queued_log_ids:
+                # NB: remove the id so that a duplicate id in the same batch is reported
+                queued_log_ids.remove(log.id)
+                errors.append(None)
+            else:
+                errors.append(ConstraintViolation(f"Log {log.id} already exists"))
+        return errors
+
     async def _save_log(self, log: Log) -> Log:
-        try:
-            await self.es.create(
-                index=self.write_alias,
-                id=str(log.id),
-                document=log.model_dump(context="es"),
+        if await self._write_log(log):
+            await self._bump_log_write_generation()
+            await self._consolidate_logs([log])
+        return log
+
+    async def _write_log(self, log: Log) -> bool:
+        """
+        Write the log document, or queue it if the ingestion queue is enabled.
+        Return True if the log document has been written.
+        """
+        if self.queued_ingestion:
+            (error,) = await self._enqueue_logs([log])
+            if error:
+                raise error
+            return False
+
+        if log_write_buffer := get_log_write_buffer():
+            await log_write_buffer.create(
+                self.write_alias,
+                str(log.id),
+                log.to_es_document(),
                 refresh=self._refresh,
             )
-        except elasticsearch.ConflictError:
-            # NB: this should only happen in case of log import where the id
-            # is provided and already exists
-            raise ConstraintViolation(f"Log {log.id} already exists")
-        await self._consolidate_log_entity_path(log.entity_path)
-        return log
+        else:
+            try:
+                await self.es.create(
+                    index=self.write_alias,
+                    id=str(log.id),
+                    document=log.to_es_document(),
+                    refresh=self._refresh,
+                )
+            except elasticsearch.ConflictError:
+                # NB: this should only happen in case of log import where the id
+                # is provided and already exists
+                raise ConstraintViolation(f"Log {log.id} already exists")
+        return True
 
     async def create_log(
         self,
@@ -169,72 +563,705 @@ class LogService:
         emitter: Emitter,
         *,
         saved_at: datetime | None = None,
+        idempotency_key: str | None = None,
     ) -> Log:
-        await self.check_log(log_create)
+        log = Log.from_log_create(
+            log_create, id=self._generate_log_id(), emitter=emitter, saved_at=saved_at
+        )
+        if idempotency_key:
+            (result,) = await self._save_logs_with_idempotency_keys(
+                [log_create], [log], [idempotency_key]
+            )
+            if isinstance(result, AuditizeException):
+                raise result
+            return result
 
-        log_json = log_create.model_dump()
-        log_json["id"] = uuid.uuid4()
-        log_json["emitter"] = emitter.model_dump()
-        if saved_at:
-            log_json["saved_at"] = saved_at
+        await self.check_log(log_create)
+        return await self._save_log(log)
 
-        return await self._save_log(Log.model_validate(log_json))
+    async def import_log(
+        self,
+        log_import: LogImport,
+        emitter: Emitter,
+        *,
+        idempotency_key: str | None = None,
+    ) -> Log:
+        log = Log.from_log_create(
+            log_import, id=log_import.id or self._generate_log_id(), emitter=emitter
+        )
+        if idempotency_key:
+            (result,) = await self._save_logs_with_idempotency_keys(
+                [log_import], [log], [idempotency_key]
+            )
+            if isinstance(result, AuditizeException):
+                raise result
+            return result
 
-    async def import_log(self, log_import: LogImport, emitter: Emitter) -> Log:
         await self.check_log(log_import)
+        return await self._save_log(log)
+
+    async def _save_logs(
+        self, logs: list[Log | AuditizeException]
+    ) -> list[Log | AuditizeException]:
+        """
+        Save the logs in a single pass using the Elasticsearch bulk API.
 
-        log_json = log_import.model_dump(exclude_unset=True)
-        log_json.setdefault("id", uuid.uuid4())
-        log_json["emitter"] = emitter.model_dump()
-        return await self._save_log(Log.model_validate(log_json))
+        Items that are already exceptions (logs that did not pass the checks)
+        are passed through. The returned list has the same order as the input
+        list, failed items being replaced by the corresponding exception.
+        """
+        results = await self._write_logs(logs)
+        await self._consolidate_written_logs(results)
+        return results
+
+    async def _write_logs(
+        self, logs: list[Log | AuditizeException]
+    ) -> list[Log | AuditizeException]:
+        """
+        Write the log documents (or queue them if the ingestion queue is enabled),
+        the results are the same as _save_logs.
+        """
+        results = list(logs)
+        logs_to_save = [(i, log) for i, log in enumerate(logs) if isinstance(log, Log)]
+        if not logs_to_save:
+            return results
+
+        if self.queued_ingestion:
+            errors = await self._enqueue_logs([log for _, log in logs_to_save])
+        else:
+            errors = await bulk_create_log_documents(
+                self.es,
+                self.write_alias,
+                ((str(log.id), log.to_es_document()) for _, log in logs_to_save),
+                refresh=self._refresh,
+            )
+        for (i, _), error in zip(logs_to_save, errors):
+            if error:
+                results[i] = error
+
+        return results
+
+    async def _consolidate_written_logs(self, results: list[Log | AuditizeException]):
+        # NB: queued logs are consolidated once they have been saved by the ingest worker
+        if self.queued_ingestion:
+            return
+        saved_logs = [log for log in results if isinstance(log, Log)]
+        if saved_logs:
+            await self._bump_log_write_generation()
+            await self._consolidate_logs(saved_logs)
+
+    @classmethod
+    async def process_ingestion_queue(
+        cls, session: AsyncSession, *, limit: int = 500
+    ) -> int:
+        """
+        Save a batch of queued logs into Elasticsearch and return the number of
+        processed queue items (0 means that the queue is empty).
+        Several workers can process the queue concurrently.
+
+        Items whose log cannot be saved are kept in the queue along with their
+        error (and are no longer processed once they have failed for good) so that
+        no log is silently lost.
+        """
+        items = (
+            (
+                await session.execute(
+                    select(LogIngestionQueueItem)
+                    .where(LogIngestionQueueItem.failed_at.is_(None))
+                    .order_by(LogIngestionQueueItem.created_at)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                )
+            )
+            .scalars()
+            .all()
+        )
+        if not items:
+            await session.rollback()
+            return 0
+
+        items_by_repo: dict[UUID, list[LogIngestionQueueItem]] = {}
+        for item in items:
+            items_by_repo.setdefault(item.repo_id, []).append(item)
+
+        processed_item_ids = []
+        saved_logs_by_service = []
+        for repo_id, repo_items in items_by_repo.items():
+            service = await cls.for_maintenance(session, repo_id)
+            logs = [Log.model_validate(item.log) for item in repo_items]
+            # NB: transport errors (e.g. Elasticsearch is unavailable) are raised, which
+            # leaves the whole batch in the queue so that it is retried later
+            errors = await bulk_create_log_documents(
+                service.es,
+                service.write_alias,
+                ((str(log.id), log.to_es_document()) for log in logs),
+                refresh=service._refresh,
+                raise_on_exception=True,
+            )
+            saved_logs = []
+            conflicts = []
+            for item, log, error in zip(repo_items, logs, errors):
+                if error is None:
+                    saved_logs.append(log)
+                    processed_item_ids.append(item.id)
+                elif isinstance(error, ConstraintViolation):
+                    conflicts.append((item, log, error))
+                else:
+                    item.attempts += 1
+                    item.error = str(error)
+                    if item.attempts < _INGESTION_QUEUE_MAX_ATTEMPTS:
+                        print(f"Could not save log {log.id}, will retry later: {error}")
+                        continue
+                    print(
+                        f"Could not save log {log.id} after {item.attempts} attempts, "
+                        f"giving up: {error}"
+                    )
+                    item.failed_at = now()
+
+            if conflicts:
+                # The log has either been saved by a previous attempt whose queue item
+                # could not be deleted, or it has been imported with an already used id
+                existing_logs = await service._get_logs_by_ids(
+                    [log.id for _, log, _ in conflicts]
+                )
+                for item, log, error in conflicts:
+                    existing_log = existing_logs.get(log.id)
+                    # NB: attachments may have been added since the log has been saved
+                    if existing_log and existing_log.model_dump(
+                        exclude={"attachments"}
+                    ) == log.model_dump(exclude={"attachments"}):
+                        saved_logs.append(log)
+                        processed_item_ids.append(item.id)
+                    else:
+                        print(f"Could not save log {log.id}, giving up: {error}")
+                        item.error = str(error)
+                        item.failed_at = now()
+
+            saved_logs_by_service.append((service, saved_logs))
+
+        await session.execute(
+            delete(LogIngestionQueueItem).where(
+                LogIngestionQueueItem.id.in_(processed_item_ids)
+            )
+        )
+        await session.commit()
+
+        for service, saved_logs in saved_logs_by_service:
+            if saved_logs:
+                await service._bump_log_write_generation()
+            await service._consolidate_logs(saved_logs)
+
+        return len(items)
+
+    async def _get_logs_by_ids(self, log_ids: list[UUID]) -> dict[UUID, Log]:
+        resp = await self.es.mget(
+            index=self.write_alias,
+            ids=[str(log_id) for log_id in log_ids],
+            source_excludes=["attachments.data", *_ES_DERIVED_FIELDS],
+        )
+        logs = [
+            Log.model_validate(doc["_source"], context="es")
+            for doc in resp["docs"]
+            if doc.get("found")
+        ]
+        return {log.id: log for log in logs}
+
+    async def _check_logs(
+        self, logs: list[LogCreate | LogImport]
+    ) -> list[AuditizeException | None]:
+        sibling_entity_refs = await self._get_sibling_entity_refs(
+            {entity.name for log in logs for entity in log.entity_path}
+        )
+        errors = []
+        for log in logs:
+            try:
+                self._check_entity_path(log.entity_path, sibling_entity_refs)
+            except ConstraintViolation as exc:
+                errors.append(exc)
+                continue
+            errors.append(None)
+            # The entities of a valid log must also be taken into account
+            # when checking the next logs of the batch
+            parent_entity_ref = None
+            for entity in log.entity_path:
+                sibling_entity_refs.setdefault(
+                    (parent_entity_ref, entity.name), set()
+                ).add(entity.ref)
+                parent_entity_ref = entity.ref
+        return errors
+
+    async def create_logs(
+        self,
+        log_creates: list[LogCreate],
+        emitter: Emitter,
+        *,
+        idempotency_key: str | None = None,
+    ) -> list[Log | AuditizeException]:
+        logs = [
+            Log.from_log_create(log_create, id=self._generate_log_id(), emitter=emitter)
+            for log_create in log_creates
+        ]
+        if idempotency_key:
+            # Each log of the batch gets its own key so that a replayed batch
+            # only saves the logs that have not been saved the first time
+            return await self._save_logs_with_idempotency_keys(
+                log_creates,
+                logs,
+                [f"{idempotency_key}#{i}" for i in range(len(logs))],
+            )
 
-    async def save_log_attachment(self, log_id: UUID, attachment: Log.Attachment):
+        errors = await self._check_logs(log_creates)
+        return await self._save_logs([error or log for log, error in zip(logs, errors)])
+
+    async def _claim_idempotency_keys(
+        self, claims: list[tuple[str, UUID, str]]
+    ) -> list[UUID | AuditizeException]:
+        """
+        Claim the given (idempotency key, log id, request hash) tuples. For each tuple,
+        return the claimed log id if the key was free (or expired), the id of the
+        original log if the key has already been used for the same request, or an
+        exception if the key has been used for a different request or if the original
+        request is still being processed.
+        """
+        current_time = now()
+        stmt = insert(LogIdempotencyKey).values(
+            [
+                dict(
+                    repo_id=self.repo.id,
+                    key=key,
+                    log_id=log_id,
+                    request_hash=request_hash,
+                    expires_at=current_time
+                    + timedelta(seconds=get_config().log_idempotency_key_ttl),
+                )
+                for key, log_id, request_hash in claims
+            ]
+        )
+        result = await self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[LogIdempotencyKey.repo_id, LogIdempotencyKey.key],
+                set_=dict(
+                    log_id=stmt.excluded.log_id,
+                    request_hash=stmt.excluded.request_hash,
+                    completed=False,
+                    expires_at=stmt.excluded.expires_at,
+                ),
+                # an expired key can be reused
+                where=LogIdempotencyKey.expires_at <= current_time,
+            ).returning(LogIdempotencyKey.key)
+        )
+        claimed_keys = set(result.scalars().all())
+        used_keys = {}
+        if len(claimed_keys) < len(claims):
+            result = await self.session.execute(
+                select(LogIdempotencyKey).where(
+                    LogIdempotencyKey.repo_id == self.repo.id,
+                    LogIdempotencyKey.key.in_(
+                        [key for key, _, _ in claims if key not in claimed_keys]
+                    ),
+                )
+            )
+            used_keys = {item.key: item for item in result.scalars().all()}
+        await self.session.commit()
+
+        results = []
+        for key, log_id, request_hash in claims:
+            if key in claimed_keys:
+                results.append(log_id)
+            elif key in used_keys and used_keys[key].request_hash not in (
+                # NB: keys claimed by former versions have no request hash
+                request_hash,
+                None,
+            ):
+                results.append(
+                    ConstraintViolation(
+                        f"Idempotency key {key!r} has already been used for a different request"
+                    )
+                )
+            elif key in used_keys and used_keys[key].completed:
+                results.append(used_keys[key].log_id)
+            else:
+                results.append(
+                    ConstraintViolation(
+                        f"A request with idempotency key {key!r} is already being processed"
+                    )
+                )
+        return results
+
+    async def _complete_idempotency_keys(self, keys: list[str]):
+        if keys:
+            await self.session.execute(
+                update(LogIdempotencyKey)
+                .where(
+                    LogIdempotencyKey.repo_id == self.repo.id,
+                    LogIdempotencyKey.key.in_(keys),
+                )
+                .values(completed=True)
+            )
+            await self.session.commit()
+
+    async def _release_idempotency_keys(self, keys: list[str]):
+        if keys:
+            await self.session.execute(
+                delete(LogIdempotencyKey).where(
+                    LogIdempotencyKey.repo_id == self.repo.id,
+                    LogIdempotencyKey.key.in_(keys),
+                )
+            )
+            await self.session.commit()
+
+    async def _get_saved_or_queued_logs(self, log_ids: list[UUID]) -> dict[UUID, Log]:
+        logs = await self._get_logs_by_ids(log_ids)
+        if missing_log_ids := [log_id for log_id in log_ids if log_id not in logs]:
+            items = await self.session.scalars(
+                select(LogIngestionQueueItem).where(
+                    LogIngestionQueueItem.id.in_(missing_log_ids)
+                )
+            )
+            logs.update((item.id, Log.model_validate(item.log)) for item in items)
+        return logs
+
+    async def _save_logs_with_idempotency_keys(
+        self,
+        log_creates: list[LogCreate | LogImport],
+        logs: list[Log],
+        keys: list[str],
+    ) -> list[Log | AuditizeException]:
+        """
+        Like _save_logs, but a log whose idempotency key has already been used is
+        not saved again: the original log is returned instead.
+        """
+        # NB: the request hash only covers the fields set by the client, fields with a
+        # default value (such as emitted_at) would differ from one request to another
+        claims = await self._claim_idempotency_keys(
+            [
+                (
+                    key,
+                    log.id,
+                    hashlib.sha256(
+                        log_create.model_dump_json(exclude_unset=True).encode()
+                    ).hexdigest(),
+                )
+                for key, log, log_create in zip(keys, logs, log_creates)
+            ]
+        )
+        results: list[Log | AuditizeException] = []
+        to_save = []
+        replayed = []
+        for i, (log, claim) in enumerate(zip(logs, claims)):
+            if isinstance(claim, AuditizeException):
+                results.append(claim)
+            elif claim == log.id:
+                results.append(log)
+                to_save.append(i)
+            else:
+                # NB: the request hash guarantees that the replayed log has the same
+                # content as the original one, the original log is used if it can still
+                # be found (to get its actual saved_at and emitter)
+                results.append(log.model_copy(update={"id": claim}))
+                replayed.append(i)
+
+        if replayed:
+            original_logs = await self._get_saved_or_queued_logs(
+                [results[i].id for i in replayed]
+            )
+            for i in replayed:
+                results[i] = original_logs.get(results[i].id, results[i])
+        if not to_save:
+            return results
+
+        try:
+            errors = await self._check_logs([log_creates[i] for i in to_save])
+            written = await self._write_logs(
+                [error or logs[i] for i, error in zip(to_save, errors)]
+            )
+        except BaseException:
+            # don't prevent the client from retrying
+            await self._release_idempotency_keys([keys[i] for i in to_save])
+            raise
+
+        for i, result in zip(to_save, written):
+            results[i] = result
+        # NB: the keys are completed before the written logs are consolidated, so that
+        # a client retrying after a consolidation failure gets the written logs back
+        # instead of saving them again
+        await self._release_idempotency_keys(
+            [keys[i] for i in to_save if isinstance(results[i], AuditizeException)]
+        )
+        await self._complete_idempotency_keys(
+            [keys[i] for i in to_save if isinstance(results[i], Log)]
+        )
+        await self._consolidate_written_logs([results[i] for i in to_save])
+        return results
+
+    @classmethod
+    async def purge_expired_idempotency_keys(cls, session: AsyncSession):
+        await session.execute(
+            delete(LogIdempotencyKey).where(LogIdempotencyKey.expires_at <= now())
+        )
+        await session.commit()
+
+    async def import_logs(
+        self,
+        log_imports: list[LogImport],
+        emitter: Emitter,
+        *,
+        idempotency_key: str | None = None,
+    ) -> list[Log | AuditizeException]:
+        logs = [
+            Log.from_log_create(
+                log_import,
+                id=log_import.id or self._generate_log_id(),
+                emitter=emitter,
+            )
+            for log_import in log_imports
+        ]
+        if idempotency_key:
+            # NB: see create_logs
+            return await self._save_logs_with_idempotency_keys(
+                log_imports,
+                logs,
+                [f"{idempotency_key}#{i}" for i in range(len(logs))],
+            )
+
+        errors = await self._check_logs(log_imports)
+        return await self._save_logs([error or log for log, error in zip(logs, errors)])
+
+    def _get_attachment_content_key(self, sha256: str) -> str:
+        return f"{self.repo.id}/sha256/{sha256}"
+
+    async def _add_attachment_content_ref(
+        self, sha256: str
+    ) -> LogAttachmentBlob | None:
+        """
+        Add a reference to an already stored attachment content.
+        Return None if there is no such content.
+        """
+        blob = await self.session.scalar(
+            update(LogAttachmentBlob)
+            .where(
+                LogAttachmentBlob.repo_id == self.repo.id,
+                LogAttachmentBlob.sha256 == sha256,
+            )
+            .values(ref_count=LogAttachmentBlob.ref_count + 1)
+            .returning(LogAttachmentBlob)
+        )
+        await self.session.commit()
+        return blob
+
+    @staticmethod
+    def _get_attachment_encoding(mime_type: str) -> str | None:
+        if get_config().attachment_compression and is_compressible_mime_type(mime_type):
+            return "gzip"
+        return None
+
+    async def _store_attachment_content(
+        self, content: AttachmentContent, mime_type: str
+    ) -> str | None:
+        """
+        Save the content in the attachment store, unless the same content is
+        already stored, and add a reference to it.
+        Return the encoding of the stored content.
+        """
+        attachment_store = get_attachment_store()
+        content.encoding = self._get_attachment_encoding(mime_type)
+
+        # NB: the digest is only known once the content has been consumed, so the content
+        # is first saved under a temporary key
+        # (temporary keys are named after a UUIDv7 so that they can be purged by age,
+        # see _purge_stale_attachment_tmp_contents)
+        tmp_key = f"{self.repo.id}/tmp/{uuid7()}"
+        await attachment_store.put_stream(tmp_key, content)
+        try:
+            # NB: if the content is already stored, it is kept as is (along with its
+            # encoding, which may differ from the encoding of the new content)
+            ref_count, encoding = (
+                await self.session.execute(
+                    insert(LogAttachmentBlob)
+                    .values(
+                        repo_id=self.repo.id,
+                        sha256=content.sha256,
+                        size=content.stored_size,
+                        encoding=content.encoding,
+                        ref_count=1,
+                    )
+                    .on_conflict_do_update(
+                        index_elements=[
+                            LogAttachmentBlob.repo_id,
+                            LogAttachmentBlob.sha256,
+                        ],
+                        set_={"ref_count": LogAttachmentBlob.ref_count + 1},
+                    )
+                    .returning(LogAttachmentBlob.ref_count, LogAttachmentBlob.encoding)
+                )
+            ).one()
+            # NB: the blob row stays locked until commit, so that a concurrent upload of
+            # the same content waits for the content to be in place
+            if ref_count == 1:
+                await attachment_store.move(
+                    tmp_key, self._get_attachment_content_key(content.sha256)
+                )
+            else:
+                await attachment_store.delete(tmp_key)
+            await self.session.commit()
+        except BaseException:
+            await self.session.rollback()
+            await attachment_store.delete(tmp_key)
+            raise
+        return encoding
+
+    async def _release_attachment_contents(self, sha256s: list[str]):
+        """
+        Remove a reference to each given attachment content, contents that are no
+        longer referenced are removed from the attachment store.
+        """
+        attachment_store = get_attachment_store()
+        for sha256, count in Counter(sha256s).items():
+            blob_filter = (
+                LogAttachmentBlob.repo_id == self.repo.id,
+                LogAttachmentBlob.sha256 == sha256,
+            )
+            ref_count = await self.session.scalar(
+                update(LogAttachmentBlob)
+                .where(*blob_filter)
+                .values(ref_count=LogAttachmentBlob.ref_count - count)
+                .returning(LogAttachmentBlob.ref_count)
+            )
+            if ref_count is not None and ref_count <= 0:
+                await self.session.execute(
+                    delete(LogAttachmentBlob).where(*blob_filter)
+                )
+                await attachment_store.delete(self._get_attachment_content_key(sha256))
+            await self.session.commit()
+
+    async def _store_attachment(
+        self, attachment: Log.Attachment, content: AttachmentContent
+    ) -> Log.Attachment:
+        # The attachment content is streamed to the attachment store, the log document
+        # only keeps the attachment metadata along with the content key
+        encoding = await self._store_attachment_content(content, attachment.mime_type)
+        return attachment.model_copy(
+            update={
+                "key": self._get_attachment_content_key(content.sha256),
+                "size": content.size,
+                "sha256": content.sha256,
+                "encoding": encoding,
+            }
+        )
+
+    async def create_log_with_attachments(
+        self,
+        log_create: LogCreate,
+        emitter: Emitter,
+        attachments: list[tuple[Log.Attachment, AttachmentContent]],
+    ) -> Log:
+        """
+        Create a log along with its attachments: the log document is written once,
+        with the metadata of all its attachments.
+        """
+        await self.check_log(log_create)
+        log = Log.from_log_create(
+            log_create, id=self._generate_log_id(), emitter=emitter
+        )
+        # NB: the attachment contents must be released if the log document
+        # does not get written, otherwise their references would leak
+        try:
+            for attachment, content in attachments:
+                log.attachments.append(
+                    await self._store_attachment(attachment, content)
+                )
+            written = await self._write_log(log)
+        except BaseException:
+            await self._release_attachment_contents(
+                [attachment.sha256 for attachment in log.attachments]
+            )
+            raise
+        if written:
+            await self._bump_log_write_generation()
+            await self._consolidate_logs([log])
+        return log
+
+    async def save_log_attachment(
+        self, log_id: UUID, attachment: Log.Attachment, content: AttachmentContent
+    ):
+        attachment = await self._store_attachment(attachment, content)
         try:
             await self.es.update(
                 index=self.write_alias,
                 id=str(log_id),
                 script={
-                    "source": "ctx._source.attachments.add(params.attachment)",
-                    "params": {"attachment": attachment.model_dump()},
+                    # NB: the flattened attachment fields are rebuilt along with
+                    # the attachments
+                    "source": _ADD_ATTACHMENT_SCRIPT,
+                    "params": {"attachment": attachment.model_dump(exclude={"data"})},
                 },
                 refresh=self._refresh,
             )
         except ElasticNotFoundError:
+            await self._release_attachment_contents([content.sha256])
             raise NotFoundError()
+        await self._bump_log_write_generation()
 
-    @staticmethod
-    def _build_authorized_entities_es_query(
+    async def move_attachment_data_to_store(self, attachment: Log.Attachment):
+        """
+        Move the inline content of an attachment (as saved in pre-v6 indexes)
+        to the attachment store.
+        """
+        sha256 = hashlib.sha256(attachment.data).hexdigest()
+        # NB: avoid writing the content again if it is already stored
+        if blob := await self._add_attachment_content_ref(sha256):
+            encoding = blob.encoding
+        else:
+            encoding = await self._store_attachment_content(
+                AttachmentContent.from_bytes(attachment.data), attachment.mime_type
+            )
+        attachment.key = self._get_attachment_content_key(sha256)
+        attachment.size = len(attachment.data)
+        attachment.sha256 = sha256
+        attachment.encoding = encoding
+        attachment.data = None
+
+    async def _build_authorized_entities_es_query(
+        self,
         authorized_entities: set[str] | None,
     ) -> dict | None:
         if not authorized_entities:
             return None
-        return {
-            "nested": {
-                "path": "entity_path",
-                "query": {
-                    "bool": {
-                        "filter": {
-                            "terms": {"entity_path.ref": list(authorized_entities)}
-                        }
-                    }
-                },
-            }
-        }
+        if await self._get_read_index_mapping_version() < _ENTITY_REFS_MAPPING_VERSION:
+            return self._nested_filter(
+                "entity_path", {"terms": {"entity_path.ref": list(authorized_entities)}}
+            )
+        # NB: entity_refs is a flattened copy of entity_path.ref, filtering on it
+        # avoids a nested query on every read of entity-restricted users
+        return {"terms": {"entity_refs": list(authorized_entities)}}
+
+    async def _get_read_index_mapping_version(self) -> int:
+        cache = get_read_index_mapping_versions_cache()
+        version = cache.get(self.read_alias)
+        if version is None:
+            version = await get_read_index_mapping_version(self.repo)
+            cache.set(self.read_alias, version)
+        return version
 
     @staticmethod
-    def _check_log_visibility(log: Log, authorized_entities: set[str]):
-        if (
-            authorized_entities
-            and not set(entity.ref for entity in log.entity_path) & authorized_entities
-        ):
+    def _check_entity_path_visibility(
+        entity_refs: set[str], authorized_entities: set[str]
+    ):
+        if authorized_entities and not entity_refs & authorized_entities:
             raise NotFoundError()
 
+    @classmethod
+    def _check_log_visibility(cls, log: Log, authorized_entities: set[str]):
+        cls._check_entity_path_visibility(
+            set(entity.ref for entity in log.entity_path), authorized_entities
+        )
+
     async def get_log(self, log_id: UUID, authorized_entities: set[str]) -> Log:
         try:
             resp = await self.es.get(
                 index=self.read_alias,
                 id=str(log_id),
-                source_excludes=["attachments.data"],
+                source_excludes=["attachments.data", *_ES_DERIVED_FIELDS],
             )
         except ElasticNotFoundError:
             raise NotFoundError()
@@ -247,25 +1274,73 @@ class LogService:
     async def get_log_attachment(
         self, log_id: UUID, attachment_idx: int, authorized_entities: set[str]
     ) -> Log.Attachment:
-        # NB: we retrieve all attachments here, which is not really efficient if the log contains
-        # more than 1 log, unfortunately ES does not a let us retrieve a nested object to a specific
-        # array index unless adding an extra metadata such as "index" to the stored document
+        """
+        Return the metadata of the attachment, its content is loaded separately
+        using get_log_attachment_content().
+        """
+        # NB: only fetch what we need from the log: the entities to check the log visibility
+        # and the metadata of the attachments (which are small compared to their content)
         try:
-            resp = await self.es.get(index=self.read_alias, id=str(log_id))
+            resp = await self.es.get(
+                index=self.read_alias,
+                id=str(log_id),
+                source_includes=["entity_path.ref", "attachments"],
+                source_excludes=["attachments.data"],
+            )
         except ElasticNotFoundError:
             raise NotFoundError()
 
-        self._check_log_visibility(
-            Log.model_validate(resp["_source"], context="es"),
+        self._check_entity_path_visibility(
+            set(entity["ref"] for entity in resp["_source"].get("entity_path", [])),
             authorized_entities,
         )
 
-        try:
-            attachment = resp["_source"]["attachments"][attachment_idx]
-        except IndexError:
+        attachments = resp["_source"].get("attachments", [])
+        if not 0 <= attachment_idx < len(attachments):
             raise NotFoundError()
+        attachment = Log.Attachment.model_validate(attachments[attachment_idx])
+
+        # NB: the content of attachments saved in a pre-v6 index (not reindexed yet)
+        # is still inline, unfortunately ES does not let us retrieve a single item of an
+        # array, so we have to retrieve the content of all the attachments of the log
+        if attachment.key is None:
+            resp = await self.es.get(
+                index=self.read_alias,
+                id=str(log_id),
+                source_includes=["attachments.data"],
+            )
+            attachment.data = base64.b64decode(
+                resp["_source"]["attachments"][attachment_idx]["data"]
+            )
+            attachment.size = len(attachment.data)
+            attachment.sha256 = hashlib.sha256(attachment.data).hexdigest()
 
-        return Log.Attachment.model_validate(attachment)
+        return attachment
+
+    async def get_log_attachment_content(
+        self, attachment: Log.Attachment, start: int = 0, stop: int | None = None
+    ) -> bytes:
+        """
+        Return the [start, stop) slice of the (decoded) attachment content.
+        """
+        if stop is None:
+            stop = attachment.size
+        if attachment.data is not None:
+            return attachment.data[start:stop]
+        if attachment.encoding is None:
+            return await get_attachment_store().get_range(attachment.key, start, stop)
+        # NB: an encoded content must be decoded as a whole
+        return decode_attachment_content(
+            await get_attachment_store().get(attachment.key), attachment.encoding
+        )[start:stop]
+
+    async def get_log_attachment_stored_content(
+        self, attachment: Log.Attachment
+    ) -> bytes:
+        """
+        Return the attachment content as stored, i.e. encoded with attachment.encoding.
+        """
+        return await get_attachment_store().get(attachment.key)
 
     @staticmethod
     def _nested_filter(path, filter):
@@ -277,22 +1352,25 @@ class LogService:
         }
 
     @classmethod
-    def _nested_filter_term(cls, path, name, value):
-        return cls._nested_filter(path, {"term": {name: value}})
-
-    @classmethod
-    def _query_filter(cls, query: str):
+    def _query_filter(cls, query: str, *, mapping_version: int):
         """
         Build a filter to match words in the query against the searchable fields
-        (source.value, actor.extra.value, resource.extra.value, details.value).
+        (source, actor extra, resource extra and details text values, resource name).
         Each word must match indifferently of the field they are in the log.
         """
-        # This is a working but costly implementation of the query filter (which is due
-        # to the fact that we use nested fields).
-        # A more efficient implementation would be to first normalize the searchable plain text fields
-        # in a dedicated text fields and then use a simple "match" query to match the words against the text field.
-
         words = cls._split_words(query)
+        if mapping_version < _SEARCH_TEXT_MAPPING_VERSION:
+            return cls._nested_query_filter(words)
+
+        # NB: the searchable fields are denormalized at write time into the "search_text"
+        # field, which avoids a costly nested query per word and per field
+        return {"bool": {"must": [{"match": {"search_text": word}} for word in words]}}
+
+    @staticmethod
+    def _nested_query_filter(words: list[str]):
+        # This is a working but costly implementation of the query filter (which is due
+        # to the fact that we use nested fields), it is only used for the indexes
+        # created before the "search_text" field
         searchable_fields = {
             "source": "source.value",
             "actor.extra": "actor.extra.value",
@@ -308,27 +1386,46 @@ class LogService:
             clauses.append({"match": {"resource.name": word}})
             return clauses
 
-        def must_clauses():
-            return [
-                {
-                    "bool": {
-                        "should": should_clauses(word),
-                        "minimum_should_match": 1,
+        return {
+            "bool": {
+                "must": [
+                    {
+                        "bool": {
+                            "should": should_clauses(word),
+                            "minimum_should_match": 1,
+                        }
                     }
-                }
-                for word in words
-            ]
-
-        return {"bool": {"must": must_clauses()}}
+                    for word in words
+                ]
+            }
+        }
 
-    async def _get_custom_field_type(
-        self, path: str, field_name: str
-    ) -> CustomFieldType:
+    async def _get_custom_field_types(
+        self, fields: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], CustomFieldType]:
+        """
+        Return the types of the given (path, field name) custom fields, the type of
+        a field being the type of its latest occurrence.
+        The types that are not cached are fetched in a single aggregation request.
+        """
+        cache = get_custom_field_types_cache()
+        field_types = {}
+        missing_fields: dict[str, list[str]] = {}
+        for path, field_name in fields:
+            if field_type := cache.get((self.repo.id, path, field_name)):
+                field_types[(path, field_name)] = field_type
+            else:
+                missing_fields.setdefault(path, []).append(field_name)
+        if not missing_fields:
+            return field_types
+
+        # NB: aggregations are named after the position of the path and the field name
+        # since field names are not restricted to valid aggregation names
         aggregations = {
-            "custom_fields": {
+            f"path_{i}": {
                 "nested": {"path": path},
                 "aggs": {
-                    "filter_field": {
+                    f"field_{j}": {
                         "filter": {"term": {f"{path}.name": field_name}},
                         "aggs": {
                             "latest_type": {
@@ -340,8 +1437,10 @@ class LogService:
                             }
                         },
                     }
+                    for j, field_name in enumerate(field_names)
                 },
             }
+            for i, (path, field_names) in enumerate(missing_fields.items())
         }
 
         resp = await self.es.search(
@@ -350,16 +1449,23 @@ class LogService:
             size=0,
         )
 
-        hits = resp["aggregations"]["custom_fields"]["filter_field"]["latest_type"]["hits"]["hits"]  # fmt: skip
-        if hits:
-            return CustomFieldType(hits[0]["_source"]["type"])
-        # NB: fallback to string type, this should never happen
-        return CustomFieldType.STRING
+        for i, (path, field_names) in enumerate(missing_fields.items()):
+            for j, field_name in enumerate(field_names):
+                hits = resp["aggregations"][f"path_{i}"][f"field_{j}"]["latest_type"]["hits"]["hits"]  # fmt: skip
+                if hits:
+                    field_type = CustomFieldType(hits[0]["_source"]["type"])
+                    cache.set((self.repo.id, path, field_name), field_type)
+                else:
+                    # NB: fallback to string type, this should never happen
+                    field_type = CustomFieldType.STRING
+                field_types[(path, field_name)] = field_type
+        return field_types
 
-    async def _custom_field_search_filter(
-        self, path: str, field_name: str, field_value: str
+    @staticmethod
+    def _custom_field_search_filter(
+        path: str, field_name: str, field_value: str, field_type: CustomFieldType
     ) -> dict:
-        match await self._get_custom_field_type(path, field_name):
+        match field_type:
             case CustomFieldType.ENUM:
                 field_value_filter = {
                     "term": {
@@ -416,14 +1522,83 @@ class LogService:
             }
         }
 
-    async def _custom_fields_search_filter(
-        self, path: str, fields: dict[str, str]
+    @classmethod
+    def _custom_fields_search_filter(
+        cls,
+        path: str,
+        fields: dict[str, str],
+        field_types: dict[tuple[str, str], CustomFieldType],
     ) -> list[dict]:
         return [
-            await self._custom_field_search_filter(path, name, value)
+            cls._custom_field_search_filter(
+                path, name, value, field_types[(path, name)]
+            )
             for name, value in fields.items()
         ]
 
+    @staticmethod
+    def _tag_and_attachment_filters(sp: LogSearchParams) -> list[dict]:
+        filter = []
+        if sp.tag_ref:
+            filter.append({"term": {"tag_refs": sp.tag_ref}})
+        if sp.tag_type:
+            filter.append({"term": {"tag_types": sp.tag_type}})
+        if sp.tag_name:
+            filter.append({"term": {"tag_names": sp.tag_name}})
+        if sp.has_attachment is not None:
+            has_attachment = {"range": {"attachment_count": {"gt": 0}}}
+            if sp.has_attachment:
+                filter.append(has_attachment)
+            else:
+                # NB: must_not also matches the logs without an attachment_count
+                filter.append({"bool": {"must_not": has_attachment}})
+        if sp.attachment_type:
+            filter.append({"term": {"attachment_types": sp.attachment_type}})
+        if sp.attachment_mime_type:
+            filter.append({"term": {"attachment_mime_types": sp.attachment_mime_type}})
+        return filter
+
+    @classmethod
+    def _nested_tag_and_attachment_filters(cls, sp: LogSearchParams) -> list[dict]:
+        filter = []
+        if sp.tag_ref:
+            filter.append(
+                cls._nested_filter("tags", {"term": {"tags.ref": sp.tag_ref}})
+            )
+        if sp.tag_type:
+            filter.append(
+                cls._nested_filter("tags", {"term": {"tags.type": sp.tag_type}})
+            )
+        if sp.tag_name:
+            filter.append(
+                cls._nested_filter("tags", {"term": {"tags.name.keyword": sp.tag_name}})
+            )
+        if sp.has_attachment is not None:
+            has_attachment = {
+                "nested": {
+                    "path": "attachments",
+                    "query": {"exists": {"field": "attachments"}},
+                }
+            }
+            if sp.has_attachment:
+                filter.append(has_attachment)
+            else:
+                filter.append({"bool": {"must_not": has_attachment}})
+        if sp.attachment_type:
+            filter.append(
+                cls._nested_filter(
+                    "attachments", {"term": {"attachments.type": sp.attachment_type}}
+                )
+            )
+        if sp.attachment_mime_type:
+            filter.append(
+                cls._nested_filter(
+                    "attachments",
+                    {"term": {"attachments.mime_type": sp.attachment_mime_type}},
+                )
+            )
+        return filter
+
     async def _build_es_query(
         self,
         search_params: LogSearchParams | None = None,
@@ -434,15 +1609,33 @@ class LogService:
         filter = []
 
         if sp:
+            custom_fields = {
+                "source": sp.source or {},
+                "actor.extra": sp.actor_extra or {},
+                "resource.extra": sp.resource_extra or {},
+                "details": sp.details or {},
+            }
+            custom_field_types = await self._get_custom_field_types(
+                [
+                    (path, name)
+                    for path, fields in custom_fields.items()
+                    for name in fields
+                ]
+            )
+            mapping_version = await self._get_read_index_mapping_version()
             if sp.query:
-                filter.append(self._query_filter(sp.query))
+                filter.append(
+                    self._query_filter(sp.query, mapping_version=mapping_version)
+                )
             if sp.action_type:
                 filter.append({"term": {"action.type": sp.action_type}})
             if sp.action_category:
                 filter.append({"term": {"action.category": sp.action_category}})
             if sp.source:
                 filter.extend(
-                    await self._custom_fields_search_filter("source", sp.source)
+                    self._custom_fields_search_filter(
+                        "source", sp.source, custom_field_types
+                    )
                 )
             if sp.actor_type:
                 filter.append({"term": {"actor.type": sp.actor_type}})
@@ -452,8 +1645,8 @@ class LogService:
                 filter.append({"term": {"actor.ref": sp.actor_ref}})
             if sp.actor_extra:
                 filter.extend(
-                    await self._custom_fields_search_filter(
-                        "actor.extra", sp.actor_extra
+                    self._custom_fields_search_filter(
+                        "actor.extra", sp.actor_extra, custom_field_types
                     )
                 )
             if sp.resource_type:
@@ -464,47 +1657,22 @@ class LogService:
                 filter.append({"term": {"resource.ref": sp.resource_ref}})
             if sp.resource_extra:
                 filter.extend(
-                    await self._custom_fields_search_filter(
-                        "resource.extra", sp.resource_extra
+                    self._custom_fields_search_filter(
+                        "resource.extra", sp.resource_extra, custom_field_types
                     )
                 )
             if sp.details:
                 filter.extend(
-                    await self._custom_fields_search_filter("details", sp.details)
-                )
-            if sp.tag_ref:
-                filter.append(self._nested_filter_term("tags", "tags.ref", sp.tag_ref))
-            if sp.tag_type:
-                filter.append(
-                    self._nested_filter_term("tags", "tags.type", sp.tag_type)
-                )
-            if sp.tag_name:
-                filter.append(
-                    self._nested_filter_term("tags", "tags.name.keyword", sp.tag_name)
-                )
-            if sp.has_attachment is not None:
-                if sp.has_attachment:
-                    filter.append(
-                        {
-                            "nested": {
-                                "path": "attachments",
-                                "query": {"exists": {"field": "attachments"}},
-                            }
-                        }
-                    )
-                else:
-                    filter.append(
-                        {
-                            "bool": {
-                                "must_not": {
-                                    "nested": {
-                                        "path": "attachments",
-                                        "query": {"exists": {"field": "attachments"}},
-                                    }
-                                }
-                            }
-                        }
+                    self._custom_fields_search_filter(
+                        "details", sp.details, custom_field_types
                     )
+                )
+            if mapping_version >= _TAG_AND_ATTACHMENT_FIELDS_MAPPING_VERSION:
+                # NB: tag and attachment filters don't need to match the same nested
+                # object, they use the flattened fields of the log document
+                filter.extend(self._tag_and_attachment_filters(sp))
+            else:
+                filter.extend(self._nested_tag_and_attachment_filters(sp))
 
             if sp.attachment_name:
                 filter.append(
@@ -521,24 +1689,15 @@ class LogService:
                     )
                 )
 
-            if sp.attachment_type:
-                filter.append(
-                    self._nested_filter_term(
-                        "attachments", "attachments.type", sp.attachment_type
-                    )
-                )
-            if sp.attachment_mime_type:
-                filter.append(
-                    self._nested_filter_term(
-                        "attachments", "attachments.mime_type", sp.attachment_mime_type
-                    )
-                )
             if sp.entity_ref:
-                filter.append(
-                    self._nested_filter_term(
-                        "entity_path", "entity_path.ref", sp.entity_ref
+                if mapping_version >= _ENTITY_REFS_MAPPING_VERSION:
+                    filter.append({"term": {"entity_refs": sp.entity_ref}})
+                else:
+                    filter.append(
+                        self._nested_filter(
+                            "entity_path", {"term": {"entity_path.ref": sp.entity_ref}}
+                        )
                     )
-                )
             if sp.since:
                 filter.append({"range": {"emitted_at": {"gte": sp.since}}})
             if sp.until:
@@ -553,7 +1712,9 @@ class LogService:
                 )
 
         if authorized_entities:
-            filter.append(self._build_authorized_entities_es_query(authorized_entities))
+            filter.append(
+                await self._build_authorized_entities_es_query(authorized_entities)
+            )
 
         return {"bool": {"filter": filter}} if filter else None
 
@@ -566,40 +1727,193 @@ class LogService:
         sort_by_saved_at: bool = False,
         limit: int = 10,
         pagination_cursor: str = None,
+        use_pit: bool = False,
     ) -> tuple[list[Log], str | None]:
-        resp = await self.es.search(
-            index=self.read_alias,
-            query=await self._build_es_query(
-                search_params, authorized_entities=authorized_entities
-            ),
-            search_after=(
-                load_pagination_cursor(pagination_cursor) if pagination_cursor else None
-            ),
-            source_excludes=None if include_attachment_data else ["attachments.data"],
-            sort=[
-                {
-                    "saved_at" if sort_by_saved_at else "emitted_at": "desc",
-                    "log_id": "desc",
-                }
-            ],
-            size=limit + 1,
-            track_total_hits=False,
+        """
+        Return a page of logs along with the cursor to the next page (if any).
+
+        If use_pit is True, a point in time is opened on the first page and its id is
+        carried by the pagination cursor, so that all the pages are consistent with
+        each other regardless of the logs saved in the meantime.
+        """
+        query = await self._build_es_query(
+            search_params, authorized_entities=authorized_entities
+        )
+        sort = [
+            {
+                "saved_at" if sort_by_saved_at else "emitted_at": "desc",
+                "log_id": "desc",
+            }
+        ]
+
+        search_after = None
+        pit_id = None
+        if pagination_cursor:
+            cursor = load_pagination_cursor(pagination_cursor)
+            # NB: a point in time cursor is a dict while a plain cursor is
+            # the "sort" value of the last log
+            if isinstance(cursor, dict):
+                try:
+                    pit_id, search_after = cursor["pit_id"], cursor["search_after"]
+                except KeyError:
+                    raise InvalidPaginationCursor(pagination_cursor)
+                # NB: the point in time must have been opened on the logs of this
+                # repository (see also the check on the returned logs below)
+                if cursor.get("repo_id") != str(self.repo.id):
+                    await self._close_point_in_time(pit_id)
+                    raise InvalidPaginationCursor(pagination_cursor)
+            else:
+                search_after = cursor
+
+        # NB: searches including attachment data are maintenance operations (reindex),
+        # and point in time searches are never repeated, they are not worth caching
+        cache = get_log_search_cache()
+        use_cache = (
+            cache.max_size > 0
+            and not include_attachment_data
+            and not (use_pit or pit_id)
+            and self._is_log_write_settled()
         )
+        if use_cache:
+            # NB: the authorized entities are part of the query
+            cache_key = (
+                self.repo.id,
+                # NB: the generation has been loaded along with the repository, before
+                # searching, so that the results of a search that is concurrent to a
+                # write are never served after the write
+                self.repo.log_written_at,
+                json.dumps(
+                    [query, sort, limit, pagination_cursor], sort_keys=True, default=str
+                ),
+            )
+            if cached := cache.get(cache_key):
+                documents, next_cursor = cached
+                return [
+                    Log.model_validate(document, context="es") for document in documents
+                ], next_cursor
+
+        if use_pit and not pagination_cursor:
+            resp = await self.es.open_point_in_time(
+                index=self.read_alias, keep_alive=_LOG_PIT_KEEP_ALIVE
+            )
+            pit_id = resp["id"]
+
+        try:
+            resp = await self.es.search(
+                # NB: a point in time search targets the indices of the point in time
+                **(
+                    {"pit": {"id": pit_id, "keep_alive": _LOG_PIT_KEEP_ALIVE}}
+                    if pit_id
+                    else {"index": self.read_alias}
+                ),
+                query=query,
+                search_after=search_after,
+                source_excludes=(
+                    _ES_DERIVED_FIELDS
+                    if include_attachment_data
+                    else ["attachments.data", *_ES_DERIVED_FIELDS]
+                ),
+                sort=sort,
+                size=limit + 1,
+                track_total_hits=False,
+            )
+        except (ElasticNotFoundError, elasticsearch.BadRequestError):
+            if pit_id and pagination_cursor:
+                # NB: the point in time has expired or its id is invalid
+                raise InvalidPaginationCursor(pagination_cursor)
+            if pit_id:
+                await self._close_point_in_time(pit_id)
+            raise
+        except BaseException:
+            # NB: a point in time opened for this page would never be used
+            if pit_id and not pagination_cursor:
+                await self._close_point_in_time(pit_id)
+            raise
         hits = list(resp["hits"]["hits"])
 
+        if pit_id:
+            # NB: the repository id of the cursor is sent by the client, make sure
+            # that the point in time has actually been opened on the logs of this
+            # repository
+            if any(
+                not hit["_index"].startswith(f"{self.repo.log_db_name}_v")
+                for hit in hits
+            ):
+                await self._close_point_in_time(resp["pit_id"])
+                raise InvalidPaginationCursor(pagination_cursor)
+            # NB: the point in time id may change from one search to another
+            pit_id = resp["pit_id"]
+
         # we previously fetched one extra log to check if there are more logs to fetch
         if len(hits) == limit + 1:
             # there is still more logs to fetch, so we need to return a next_cursor based on the last log WITHIN the
             # limit range
-            next_cursor = serialize_pagination_cursor(hits[-2]["sort"])
+            if pit_id:
+                next_cursor = serialize_pagination_cursor(
+                    {
+                        "repo_id": str(self.repo.id),
+                        "pit_id": pit_id,
+                        "search_after": hits[-2]["sort"],
+                    }
+                )
+            else:
+                next_cursor = serialize_pagination_cursor(hits[-2]["sort"])
             hits.pop(-1)
         else:
             next_cursor = None
+            if pit_id:
+                await self._close_point_in_time(pit_id)
 
-        logs = [Log.model_validate(hit["_source"], context="es") for hit in hits]
+        documents = [hit["_source"] for hit in hits]
+        if use_cache:
+            cache.set(cache_key, (documents, next_cursor))
+        logs = [Log.model_validate(document, context="es") for document in documents]
 
         return logs, next_cursor
 
+    async def close_pagination_cursor(self, pagination_cursor: str):
+        """
+        Release the resources of a pagination cursor returned by get_logs (i.e. its
+        point in time) when the next pages are not going to be fetched.
+        """
+        cursor = load_pagination_cursor(pagination_cursor)
+        if (
+            isinstance(cursor, dict)
+            and cursor.get("repo_id") == str(self.repo.id)
+            and "pit_id" in cursor
+        ):
+            await self._close_point_in_time(cursor["pit_id"])
+
+    async def _close_point_in_time(self, pit_id: str):
+        try:
+            await self.es.close_point_in_time(id=pit_id)
+        except (ElasticNotFoundError, elasticsearch.BadRequestError):
+            # NB: the point in time has already expired or its id is invalid
+            pass
+
+    async def _bump_log_write_generation(self):
+        await bump_log_write_generation(
+            self.session,
+            self.repo,
+            # NB: in test mode, the logs are searchable as soon as they are written
+            min_interval=(
+                timedelta(0) if self._refresh else _LOG_WRITE_GENERATION_INTERVAL
+            ),
+        )
+
+    def _is_log_write_settled(self) -> bool:
+        """
+        Return whether the last write of the repository logs is visible to searches,
+        and thus whether search results can be cached.
+        """
+        written_at = self.repo.log_written_at
+        return (
+            written_at is None
+            # NB: in test mode, the logs are searchable as soon as they are written
+            or self._refresh
+            or now() - written_at > _LOG_WRITE_SETTLE_DELAY
+        )
+
     async def get_newest_log(
         self,
         search_params: LogSearchParams | None = None,
@@ -619,6 +1933,17 @@ class LogService:
             return None
         return Log.model_validate(hits[0]["_source"], context="es")
 
+    async def get_failed_ingestion_count(self) -> int:
+        """
+        Return the number of queued logs that could not be saved.
+        """
+        return await self.session.scalar(
+            select(func.count()).where(
+                LogIngestionQueueItem.repo_id == self.repo.id,
+                LogIngestionQueueItem.failed_at.is_not(None),
+            )
+        )
+
     async def get_log_count(self) -> int:
         resp = await self.es.count(
             index=self.read_alias,
@@ -626,9 +1951,61 @@ class LogService:
         )
         return resp["count"]
 
+    async def count_logs(
+        self,
+        *,
+        authorized_entities: set[str] = None,
+        search_params: LogSearchParams = None,
+        exact: bool = False,
+    ) -> tuple[int, bool]:
+        """
+        Count the logs matching the search parameters and return the count along with
+        whether it is exact. Unless `exact` is True, the count stops at a threshold
+        above which it is only a lower bound.
+        """
+        query = await self._build_es_query(
+            search_params, authorized_entities=authorized_entities
+        )
+
+        if not exact:
+            resp = await self.es.search(
+                index=self.read_alias,
+                query=query,
+                size=0,
+                track_total_hits=_LOG_COUNT_APPROXIMATE_THRESHOLD,
+            )
+            total = resp["hits"]["total"]
+            return total["value"], total["relation"] == "eq"
+
+        async def count():
+            resp = await self.es.count(index=self.read_alias, query=query)
+            return resp["count"]
+
+        # NB: like searches, a count that may miss the last write is not cached
+        if not self._is_log_write_settled():
+            return await count(), True
+
+        # NB: an exact count may require a full scan of the repository logs, it is
+        # performed in a background task shared by the identical concurrent requests
+        # and its result is kept until the next write
+        count = await get_log_count_cache().get(
+            (
+                self.repo.id,
+                self.repo.log_written_at,
+                json.dumps(query, sort_keys=True, default=str),
+            ),
+            count,
+        )
+        return count, True
+
     async def get_storage_size(self) -> int:
         resp = await self.es.indices.stats(index=self.read_alias)
-        return resp["_all"]["primaries"]["store"]["size_in_bytes"]
+        attachments_size = await self.session.scalar(
+            select(func.coalesce(func.sum(LogAttachmentBlob.size), 0)).where(
+                LogAttachmentBlob.repo_id == self.repo.id
+            )
+        )
+        return resp["_all"]["primaries"]["store"]["size_in_bytes"] + attachments_size
 
     async def _get_paginated_agg_multi_fields(
         self,
@@ -697,15 +2074,36 @@ class LogService:
         limit: int,
         pagination_cursor: str | None,
     ) -> tuple[list[str], str]:
-        values, next_cursor = await self._get_paginated_agg_multi_fields(
-            nested=nested,
-            fields=[field],
-            query=await self._build_es_query(
-                search_params, authorized_entities=authorized_entities
-            ),
-            limit=limit,
-            pagination_cursor=pagination_cursor,
+        query = await self._build_es_query(
+            search_params, authorized_entities=authorized_entities
         )
+
+        async def aggregate():
+            return await self._get_paginated_agg_multi_fields(
+                nested=nested,
+                fields=[field],
+                query=query,
+                limit=limit,
+                pagination_cursor=pagination_cursor,
+            )
+
+        # NB: the values listed by the log filters are requested by every user opening
+        # the log page, identical concurrent aggregations are performed only once
+        if get_config().log_aggregation_cache_ttl:
+            values, next_cursor = await get_log_aggregation_cache().get(
+                (
+                    self.repo.id,
+                    # NB: the authorized entities are part of the query
+                    json.dumps(
+                        [field, query, limit, pagination_cursor],
+                        sort_keys=True,
+                        default=str,
+                    ),
+                ),
+                aggregate,
+            )
+        else:
+            values, next_cursor = await aggregate()
         return [value[0] for value in values], next_cursor
 
     get_log_action_categories = partialmethod(
@@ -791,13 +2189,13 @@ class LogService:
             ]
             if authorized_entities:
                 filter.append(
-                    self._build_authorized_entities_es_query(authorized_entities)
+                    await self._build_authorized_entities_es_query(authorized_entities)
                 )
             query = {"bool": {"filter": filter}}
             if nested:
                 query = {"nested": {"path": path, "query": query}}
         else:
-            query = self._build_authorized_entities_es_query(authorized_entities)
+            query = await self._build_authorized_entities_es_query(authorized_entities)
 
         values, next_cursor = await self._get_paginated_agg_multi_fields(
             nested=path if nested else None,
@@ -851,6 +2249,27 @@ class LogService:
                     return tag
         raise NotFoundError(f"Tag {tag_ref!r} not found")
 
+    async def _get_registered_custom_fields(
+        self, *, path: str, limit: int, pagination_cursor: str | None
+    ) -> tuple[list[tuple[str, CustomFieldType]], str | None]:
+        filters = [LogCustomField.repo_id == self.repo.id, LogCustomField.path == path]
+        if after := _load_registry_pagination_cursor(pagination_cursor, "name"):
+            filters.append(LogCustomField.name > after)
+        result = await self.session.execute(
+            select(LogCustomField.name, LogCustomField.type)
+            .where(*filters)
+            .order_by(LogCustomField.name)
+            .limit(limit)
+        )
+        rows = result.all()
+        # NB: the cursor has the same format as the aggregation-based one
+        next_cursor = (
+            serialize_pagination_cursor({"name": rows[-1].name})
+            if len(rows) == limit
+            else None
+        )
+        return [(row.name, CustomFieldType(row.type)) for row in rows], next_cursor
+
     async def _get_custom_fields(
         self,
         *,
@@ -859,6 +2278,13 @@ class LogService:
         limit: int,
         pagination_cursor: str | None,
     ) -> tuple[list[tuple[str, CustomFieldType]], str | None]:
+        # NB: the registry is not aware of the log entities, it can only be used
+        # if the user can see all the logs of the repository
+        if not authorized_entities:
+            return await self._get_registered_custom_fields(
+                path=path, limit=limit, pagination_cursor=pagination_cursor
+            )
+
         after = load_pagination_cursor(pagination_cursor) if pagination_cursor else None
 
         aggregations = {
@@ -900,7 +2326,7 @@ class LogService:
 
         resp = await self.es.search(
             index=self.read_alias,
-            query=self._build_authorized_entities_es_query(authorized_entities),
+            query=await self._build_authorized_entities_es_query(authorized_entities),
             aggregations=aggregations,
             size=0,
         )
@@ -934,6 +2360,31 @@ class LogService:
         _get_custom_fields, path="resource.extra"
     )
 
+    async def _get_registered_custom_field_enum_values(
+        self, *, path: str, field_name: str, limit: int, pagination_cursor: str | None
+    ) -> tuple[list[str], str | None]:
+        filters = [
+            LogCustomFieldEnumValue.repo_id == self.repo.id,
+            LogCustomFieldEnumValue.path == path,
+            LogCustomFieldEnumValue.name == field_name,
+        ]
+        if after := _load_registry_pagination_cursor(pagination_cursor, "value_enum"):
+            filters.append(LogCustomFieldEnumValue.value > after)
+        values = (
+            await self.session.scalars(
+                select(LogCustomFieldEnumValue.value)
+                .where(*filters)
+                .order_by(LogCustomFieldEnumValue.value)
+                .limit(limit)
+            )
+        ).all()
+        next_cursor = (
+            serialize_pagination_cursor({"value_enum": values[-1]})
+            if len(values) == limit
+            else None
+        )
+        return list(values), next_cursor
+
     async def _get_custom_field_enum_values(
         self,
         *,
@@ -943,6 +2394,14 @@ class LogService:
         limit: int,
         pagination_cursor: str | None,
     ) -> tuple[list[str], str | None]:
+        if not authorized_entities:
+            return await self._get_registered_custom_field_enum_values(
+                path=path,
+                field_name=field_name,
+                limit=limit,
+                pagination_cursor=pagination_cursor,
+            )
+
         after = load_pagination_cursor(pagination_cursor) if pagination_cursor else None
 
         aggregations = {
@@ -976,7 +2435,7 @@ class LogService:
 
         resp = await self.es.search(
             index=self.read_alias,
-            query=self._build_authorized_entities_es_query(authorized_entities),
+            query=await self._build_authorized_entities_es_query(authorized_entities),
             aggregations=aggregations,
             size=0,
         )
@@ -1040,32 +2499,78 @@ class LogService:
         for entity in leaf_entities:
             await self._purge_orphan_log_entity_if_needed(entity)
 
+        await self._bump_log_entity_generation()
+        await self.session.commit()
+        invalidate_consolidated_log_entities(self.repo.id)
+        invalidate_custom_field_types(self.repo.id)
+
+    async def _purge_custom_field_registry(self, expired_before: datetime):
+        """
+        Remove the custom fields and enum values that have not been seen since the
+        given date.
+        """
+        # NB: take into account that last seen dates may lag behind
+        expired_before -= _CUSTOM_FIELD_LAST_SEEN_RESOLUTION
+        for model in LogCustomField, LogCustomFieldEnumValue:
+            await self.session.execute(
+                delete(model).where(
+                    model.repo_id == self.repo.id, model.last_seen < expired_before
+                )
+            )
         await self.session.commit()
+        invalidate_registered_custom_fields(self.repo.id)
 
     async def _apply_log_retention_period(self):
         if not self.repo.retention_period:
             return
 
-        resp = await self.es.delete_by_query(
+        expiration_filter = {
+            "range": {
+                "emitted_at": {"lt": now() - timedelta(days=self.repo.retention_period)}
+            }
+        }
+
+        # Collect the attachments of the expired logs so that their content can be
+        # released once the logs have been deleted
+        attachment_sha256s = []
+        async for hit in helpers.async_scan(
+            self.es,
             index=self.write_alias,
             query={
-                "bool": {
-                    "filter": [
-                        {
-                            "range": {
-                                "emitted_at": {
-                                    "lt": (
-                                        now()
-                                        - timedelta(days=self.repo.retention_period)
-                                    )
+                "query": {
+                    "bool": {
+                        "filter": [
+                            expiration_filter,
+                            {
+                                "nested": {
+                                    "path": "attachments",
+                                    "query": {
+                                        "exists": {"field": "attachments.sha256"}
+                                    },
                                 }
-                            }
-                        }
-                    ]
+                            },
+                        ]
+                    }
                 }
             },
+            _source=["attachments.sha256"],
+        ):
+            attachment_sha256s.extend(
+                attachment["sha256"]
+                for attachment in hit["_source"]["attachments"]
+                if attachment.get("sha256")
+            )
+
+        resp = await self.es.delete_by_query(
+            index=self.write_alias,
+            query={"bool": {"filter": [expiration_filter]}},
             refresh=self._refresh,
         )
+        await bump_log_write_generation(self.session, self.repo)
+        await self._release_attachment_contents(attachment_sha256s)
+        await self._purge_custom_field_registry(
+            now() - timedelta(days=self.repo.retention_period)
+        )
         if resp["deleted"] > 0:
             print(
                 f"Deleted {resp['deleted']} logs older than {self.repo.retention_period} days "
@@ -1087,49 +2592,369 @@ class LogService:
             await service._apply_log_retention_period()
             # FIXME: we should also delete the consolidated entities that are not referenced by any log
 
-    async def _consolidate_log_entity(
+    async def _purge_stale_attachment_tmp_contents(self):
+        attachment_store = get_attachment_store()
+        min_timestamp = (now() - _ATTACHMENT_TMP_CONTENT_MAX_AGE).timestamp() * 1000
+        async for key in attachment_store.list_keys(f"{self.repo.id}/tmp/"):
+            try:
+                key_uuid = UUID(key.rsplit("/", 1)[-1])
+            except ValueError:
+                # NB: not a temporary key (e.g. a file being written by the
+                # filesystem store)
+                continue
+            # NB: the UUIDv7 starts with its creation time in milliseconds,
+            # temporary keys of former versions are random UUIDs
+            if key_uuid.version != 7 or (key_uuid.int >> 80) < min_timestamp:
+                await attachment_store.delete(key)
+
+    @classmethod
+    async def purge_stale_attachment_tmp_contents(cls, session: AsyncSession):
+        """
+        Purge the temporary attachment contents left behind by uploads that have
+        been interrupted before the content could be moved to its final key.
+        """
+        for repo in await get_all_repos(session):
+            service = await cls.for_maintenance(session, repo)
+            await service._purge_stale_attachment_tmp_contents()
+
+    def _get_log_entity_cache_key(
         self, entity: Log.EntityPathNode, parent_entity_id: UUID | None
-    ) -> UUID:
-        cache_key = "\t".join(
-            (
-                str(self.repo.id),
-                entity.ref,
-                entity.name,
-                str(parent_entity_id) if parent_entity_id else "",
+    ) -> _LogEntityCacheKey:
+        return (
+            self.repo.id,
+            # NB: the generation is bumped by the process that deletes or modifies
+            # log entities, so that the entries cached by the other processes are
+            # no longer used
+            self.repo.log_entity_generation,
+            entity.ref,
+            entity.name,
+            parent_entity_id,
+        )
+
+    async def _bump_log_entity_generation(self):
+        """
+        Bump the log entity generation of the repository (without committing).
+        """
+        generation = await self.session.scalar(
+            update(Repo)
+            .where(Repo.id == self.repo.id)
+            .values(
+                log_entity_generation=Repo.log_entity_generation + 1,
+                # NB: the repository itself is not modified
+                updated_at=Repo.updated_at,
             )
+            .returning(Repo.log_entity_generation)
         )
-        if entity_id := await _CONSOLIDATED_LOG_ENTITIES.get(cache_key):
-            return entity_id
+        set_committed_value(self.repo, "log_entity_generation", generation)
+
+    async def _is_log_entity_path_consolidated(
+        self, entity_path: list[Log.EntityPathNode]
+    ) -> bool:
+        cache = get_consolidated_log_entities_cache()
+        parent_entity_id = None
+        for entity in entity_path:
+            parent_entity_id = cache.get(
+                self._get_log_entity_cache_key(entity, parent_entity_id)
+            )
+            if not parent_entity_id:
+                return False
+        return True
 
+    async def _upsert_log_entity_path(
+        self, entity_path: list[Log.EntityPathNode]
+    ) -> tuple[bool, bool, dict[_LogEntityCacheKey, UUID]]:
+        """
+        Upsert the entities of the path (without committing) and return whether
+        a write has been actually performed, whether an existing entity has been
+        modified (renamed or moved) along with the entries to be cached.
+        """
+        # Fetch the current state of the whole path at once, so that we only write
+        # the entities that are new or whose name or parent has changed
         result = await self.session.execute(
-            insert(LogEntity)
-            .values(
-                repo_id=self.repo.id,
-                ref=entity.ref,
-                name=entity.name,
-                parent_entity_id=parent_entity_id,
+            select(
+                LogEntity.ref,
+                LogEntity.id,
+                LogEntity.name,
+                LogEntity.parent_entity_id,
+            ).where(
+                LogEntity.repo_id == self.repo.id,
+                LogEntity.ref.in_([entity.ref for entity in entity_path]),
             )
-            .on_conflict_do_update(
-                index_elements=[LogEntity.repo_id, LogEntity.ref],
-                set_=dict(
-                    name=entity.name,
-                    parent_entity_id=parent_entity_id,
-                ),
+        )
+        existing_entities = {row.ref: row for row in result.all()}
+
+        written = False
+        modified = False
+        cache_entries = {}
+        parent_entity_id = None
+        for entity in entity_path:
+            existing_entity = existing_entities.get(entity.ref)
+            if (
+                existing_entity
+                and existing_entity.name == entity.name
+                and existing_entity.parent_entity_id == parent_entity_id
+            ):
+                entity_id = existing_entity.id
+            else:
+                result = await self.session.execute(
+                    insert(LogEntity)
+                    .values(
+                        repo_id=self.repo.id,
+                        ref=entity.ref,
+                        name=entity.name,
+                        parent_entity_id=parent_entity_id,
+                    )
+                    .on_conflict_do_update(
+                        index_elements=[LogEntity.repo_id, LogEntity.ref],
+                        set_=dict(
+                            name=entity.name,
+                            parent_entity_id=parent_entity_id,
+                        ),
+                    )
+                    .returning(LogEntity.id)
+                )
+                entity_id = result.scalar_one()
+                written = True
+                modified |= existing_entity is not None
+
+            cache_entries[self._get_log_entity_cache_key(entity, parent_entity_id)] = (
+                entity_id
+            )
+            parent_entity_id = entity_id
+
+        return written, modified, cache_entries
+
+    async def _lock_log_entity_refs(self, refs: set[str]):
+        """
+        Lock the given entity refs until the end of the transaction.
+        """
+        # A parent entity must be written before its children, the entities of a path
+        # cannot be written in a consistent order (by ref) as the custom fields are.
+        # Instead, all the refs are locked in a consistent order before any write, so
+        # that concurrent consolidations of the same new entities cannot deadlock.
+        lock_ids = sorted(
+            int.from_bytes(
+                hashlib.sha256(f"log_entity:{self.repo.id}:{ref}".encode()).digest()[
+                    :8
+                ],
+                signed=True,
+            )
+            for ref in refs
+        )
+        # NB: the set-returning unnest() takes the locks in the order of the array
+        await self.session.execute(
+            select(
+                func.pg_advisory_xact_lock(
+                    func.unnest(
+                        bindparam("lock_ids", lock_ids, type_=ARRAY(BigInteger))
+                    )
+                )
             )
-            .returning(LogEntity.id)
         )
-        entity_id = result.scalar_one()
+
+    async def _consolidate_log_entity_paths(
+        self, entity_paths: list[list[Log.EntityPathNode]]
+    ):
+        # NB: logs of a same batch commonly share the same entity paths
+        consolidated = set()
+        paths_to_upsert = []
+        for entity_path in entity_paths:
+            key = tuple((entity.ref, entity.name) for entity in entity_path)
+            if key in consolidated:
+                continue
+            consolidated.add(key)
+            if not await self._is_log_entity_path_consolidated(entity_path):
+                paths_to_upsert.append(entity_path)
+        if not paths_to_upsert:
+            return
+
+        await self._lock_log_entity_refs(
+            {entity.ref for entity_path in paths_to_upsert for entity in entity_path}
+        )
+        written = False
+        modified = False
+        cache_entries = {}
+        for entity_path in paths_to_upsert:
+            (
+                path_written,
+                path_modified,
+                path_cache_entries,
+            ) = await self._upsert_log_entity_path(entity_path)
+            written |= path_written
+            modified |= path_modified
+            cache_entries.update(path_cache_entries)
+
+        # The entities cached by the other processes may no longer match the
+        # modified ones, the entries of the former generation are then discarded
+        # (modifications are rare, the entities will be cached by the next logs)
+        if modified:
+            await self._bump_log_entity_generation()
+            cache_entries = {}
+
+        # All the entities are committed at once, so that the locks are held
+        # for a single short transaction
         await self.session.commit()
 
-        await _CONSOLIDATED_LOG_ENTITIES.set(cache_key, entity_id)
-        return entity_id
+        # NB: only cache the entities once they have been committed
+        cache = get_consolidated_log_entities_cache()
+        for cache_key, entity_id in cache_entries.items():
+            cache.set(cache_key, entity_id)
 
-    async def _consolidate_log_entity_path(self, entity_path: list[Log.EntityPathNode]):
-        parent_entity_id = None
-        for entity in entity_path:
-            parent_entity_id = await self._consolidate_log_entity(
-                entity, parent_entity_id
+    @staticmethod
+    def _iter_log_custom_fields(log: Log) -> Iterator[tuple[str, CustomField]]:
+        for field in log.source:
+            yield "source", field
+        if log.actor:
+            for field in log.actor.extra:
+                yield "actor.extra", field
+        if log.resource:
+            for field in log.resource.extra:
+                yield "resource.extra", field
+        for field in log.details:
+            yield "details", field
+
+    def _is_custom_field_registered(
+        self, path: str, name: str, value: str | None, type: str, seen_at: datetime
+    ) -> bool:
+        cached = get_registered_custom_fields_cache().get(
+            (self.repo.id, path, name, value)
+        )
+        return (
+            cached is not None
+            and cached[0] == type
+            and seen_at < cached[1] + _CUSTOM_FIELD_LAST_SEEN_RESOLUTION
+        )
+
+    async def register_log_custom_fields(self, logs: list[Log]):
+        """
+        Register the custom fields (and enum values) of the logs in the custom field
+        registry. The fields that have been recently registered are skipped.
+        """
+        # (path, name) => (type, last seen)
+        fields: dict[tuple[str, str], tuple[str, datetime]] = {}
+        # (path, name, value) => last seen
+        enum_values: dict[tuple[str, str, str], datetime] = {}
+        for log in logs:
+            seen_at = log.emitted_at
+            for path, field in self._iter_log_custom_fields(log):
+                if not self._is_custom_field_registered(
+                    path, field.name, None, field.type, seen_at
+                ):
+                    key = (path, field.name)
+                    if key not in fields or fields[key][1] < seen_at:
+                        fields[key] = (field.type, seen_at)
+                if field.type != CustomFieldType.ENUM:
+                    continue
+                value = str(field.value)
+                if len(value.encode()) > _CUSTOM_FIELD_ENUM_VALUE_MAX_SIZE:
+                    continue
+                if not self._is_custom_field_registered(
+                    path, field.name, value, field.type, seen_at
+                ):
+                    key = (path, field.name, value)
+                    enum_values[key] = max(enum_values.get(key, seen_at), seen_at)
+        if not fields and not enum_values:
+            return
+
+        # NB: rows are inserted in a consistent order so that concurrent registrations
+        # cannot deadlock
+        cache_entries = {}
+        if fields:
+            stmt = insert(LogCustomField).values(
+                [
+                    dict(
+                        repo_id=self.repo.id,
+                        path=path,
+                        name=name,
+                        type=type,
+                        last_seen=last_seen,
+                    )
+                    for (path, name), (type, last_seen) in sorted(fields.items())
+                ]
+            )
+            result = await self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[
+                        LogCustomField.repo_id,
+                        LogCustomField.path,
+                        LogCustomField.name,
+                    ],
+                    set_=dict(
+                        # the type of a field is the type of its latest occurrence
+                        type=case(
+                            (
+                                stmt.excluded.last_seen >= LogCustomField.last_seen,
+                                stmt.excluded.type,
+                            ),
+                            else_=LogCustomField.type,
+                        ),
+                        last_seen=func.greatest(
+                            LogCustomField.last_seen, stmt.excluded.last_seen
+                        ),
+                    ),
+                ).returning(
+                    LogCustomField.path,
+                    LogCustomField.name,
+                    LogCustomField.type,
+                    LogCustomField.last_seen,
+                )
+            )
+            for row in result.all():
+                cache_entries[(self.repo.id, row.path, row.name, None)] = (
+                    row.type,
+                    row.last_seen,
+                )
+        if enum_values:
+            stmt = insert(LogCustomFieldEnumValue).values(
+                [
+                    dict(
+                        repo_id=self.repo.id,
+                        path=path,
+                        name=name,
+                        value=value,
+                        last_seen=last_seen,
+                    )
+                    for (path, name, value), last_seen in sorted(enum_values.items())
+                ]
+            )
+            result = await self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[
+                        LogCustomFieldEnumValue.repo_id,
+                        LogCustomFieldEnumValue.path,
+                        LogCustomFieldEnumValue.name,
+                        LogCustomFieldEnumValue.value,
+                    ],
+                    set_=dict(
+                        last_seen=func.greatest(
+                            LogCustomFieldEnumValue.last_seen, stmt.excluded.last_seen
+                        ),
+                    ),
+                ).returning(
+                    LogCustomFieldEnumValue.path,
+                    LogCustomFieldEnumValue.name,
+                    LogCustomFieldEnumValue.value,
+                    LogCustomFieldEnumValue.last_seen,
+                )
             )
+            for row in result.all():
+                cache_entries[(self.repo.id, row.path, row.name, row.value)] = (
+                    CustomFieldType.ENUM,
+                    row.last_seen,
+                )
+        await self.session.commit()
+
+        # NB: only cache the registrations once they have been committed
+        cache = get_registered_custom_fields_cache()
+        for cache_key, cache_value in cache_entries.items():
+            cache.set(cache_key, cache_value)
+
+    async def _consolidate_logs(self, logs: list[Log]):
+        """
+        Update the data derived from the saved logs (log entities, custom field registry).
+        """
+        await self._consolidate_log_entity_paths([log.entity_path for log in logs])
+        await self.register_log_custom_fields(logs)
 
     async def _has_entity_children(self, entity_ref: str) -> bool:
         return (
@@ -1252,10 +3077,31 @@ class LogService:
             wait_for_completion=self._refresh,
             refresh=self._refresh,
         )
+        await bump_log_write_generation(self.session, self.repo)
+        await get_attachment_store().delete_all(f"{self.repo.id}/")
+        await self.session.execute(
+            delete(LogAttachmentBlob).where(LogAttachmentBlob.repo_id == self.repo.id)
+        )
+        for model in LogCustomField, LogCustomFieldEnumValue:
+            await self.session.execute(
+                delete(model).where(model.repo_id == self.repo.id)
+            )
+        await self.session.execute(
+            delete(LogIngestionQueueItem).where(
+                LogIngestionQueueItem.repo_id == self.repo.id
+            )
+        )
+        await self.session.execute(
+            delete(LogIdempotencyKey).where(LogIdempotencyKey.repo_id == self.repo.id)
+        )
         await self.session.execute(
             delete(LogEntity).where(LogEntity.repo_id == self.repo.id)
         )
+        await self._bump_log_entity_generation()
         await self.session.commit()
+        invalidate_consolidated_log_entities(self.repo.id)
+        invalidate_custom_field_types(self.repo.id)
+        invalidate_registered_custom_fields(self.repo.id)
 
     @staticmethod
     async def _iter_paginated_items[T](
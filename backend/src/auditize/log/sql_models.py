@@ -1,9 +1,23 @@
+from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import Boolean, ForeignKey, String, UniqueConstraint, literal_column
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    String,
+    Text,
+    UniqueConstraint,
+    literal_column,
+    text,
+)
 from sqlalchemy.orm import Mapped, column_property, mapped_column
 
-from auditize.database.sql.models import HasId, SqlModel
+from auditize.database.sql.models import HasCreatedAt, HasId, SqlModel
 
 
 class LogEntity(SqlModel, HasId):
@@ -38,3 +52,117 @@ class LogEntity(SqlModel, HasId):
     )
 
     __table_args__ = (UniqueConstraint("repo_id", "ref"),)
+
+
+class LogIngestionQueueItem(SqlModel, HasId, HasCreatedAt):
+    """
+    A log waiting to be saved into Elasticsearch by the ingest worker
+    (the id of the item is the id of the log).
+    """
+
+    __tablename__ = "log_ingestion_queue"
+
+    repo_id: Mapped[UUID] = mapped_column(
+        ForeignKey("repo.id", ondelete="CASCADE"), index=True
+    )
+    log: Mapped[dict] = mapped_column(JSON)
+    attempts: Mapped[int] = mapped_column(default=0)
+    # The error of the last failed attempt to save the log
+    error: Mapped[str | None] = mapped_column(Text)
+    # Set when the log could not be saved and will not be retried, the item is kept
+    # so that the failure is not silently lost
+    failed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index(None, "created_at", postgresql_where=text("failed_at IS NULL")),
+    )
+
+
+class LogIdempotencyKey(SqlModel):
+    """
+    An idempotency key supplied by a client when creating a log, and the id
+    of the log it has been used for.
+    """
+
+    __tablename__ = "log_idempotency_key"
+
+    repo_id: Mapped[UUID] = mapped_column(
+        ForeignKey("repo.id", ondelete="CASCADE"), primary_key=True
+    )
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    log_id: Mapped[UUID] = mapped_column()
+    # The SHA-256 digest of the request payload, so that a key cannot be reused
+    # for a different request
+    request_hash: Mapped[str | None] = mapped_column(String(64))
+    # False as long as the log has not been saved
+    completed: Mapped[bool] = mapped_column(default=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class LogWriteRateLimitBucket(SqlModel):
+    """
+    The state of a token bucket used to rate limit log writes
+    (see auditize.log.rate_limit).
+    """
+
+    __tablename__ = "log_write_rate_limit_bucket"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class LogAttachmentBlob(SqlModel):
+    """
+    An attachment content saved in the attachment store. Attachment contents are
+    deduplicated per repository by SHA-256 digest: identical contents are stored
+    once and shared by all the attachments referencing them.
+    """
+
+    __tablename__ = "log_attachment_blob"
+
+    repo_id: Mapped[UUID] = mapped_column(
+        ForeignKey("repo.id", ondelete="CASCADE"), primary_key=True
+    )
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # The size and encoding of the content as stored
+    size: Mapped[int] = mapped_column(BigInteger)
+    encoding: Mapped[str | None] = mapped_column(String(16))
+    # The number of attachments (across all logs of the repository) using this content
+    ref_count: Mapped[int] = mapped_column()
+
+
+class LogCustomField(SqlModel):
+    """
+    A custom field (source, details, actor / resource extra fields) used by
+    the logs of a repository, registered when the logs are saved so that the
+    available fields can be listed without scanning the logs.
+    """
+
+    __tablename__ = "log_custom_field"
+
+    repo_id: Mapped[UUID] = mapped_column(
+        ForeignKey("repo.id", ondelete="CASCADE"), primary_key=True
+    )
+    # The custom field group, as the path of the field in the log (e.g. "actor.extra")
+    path: Mapped[str] = mapped_column(String(32), primary_key=True)
+    name: Mapped[str] = mapped_column(primary_key=True)
+    # The type of the most recently emitted occurrence of the field
+    type: Mapped[str] = mapped_column(String(16))
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class LogCustomFieldEnumValue(SqlModel):
+    """
+    A value of an enum custom field, registered along with the custom field.
+    """
+
+    __tablename__ = "log_custom_field_enum_value"
+
+    repo_id: Mapped[UUID] = mapped_column(
+        ForeignKey("repo.id", ondelete="CASCADE"), primary_key=True
+    )
+    path: Mapped[str] = mapped_column(String(32), primary_key=True)
+    name: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(primary_key=True)
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -16,7 +16,7 @@ from auditize.api.models.page_pagination import (
     PagePaginationParams,
 )
 from auditize.api.models.search import PagePaginatedSearchParams
-from auditize.repo.sql_models import Repo, RepoStatus
+from auditize.repo.sql_models import Repo, RepoLogIdType, RepoStatus
 
 
 def _RepoLogI18nProfileIdField(**kwargs):  # noqa
@@ -59,11 +59,24 @@ def _RepoRetentionPeriodField(**kwargs):  # noqa
     )
 
 
+def _RepoLogIdTypeField(**kwargs):  # noqa
+    return Field(
+        description=(
+            "The type of the ids generated for the logs of the repository: "
+            "`uuid4` (random) or `uuid7` (time-ordered, which makes the logs "
+            "of the repository more efficiently stored and sortable by id)"
+        ),
+        json_schema_extra={"example": "uuid7"},
+        **kwargs,
+    )
+
+
 class RepoCreate(BaseModel):
     name: str = _RepoNameField()
     status: RepoStatus = _RepoStatusField(default=RepoStatus.ENABLED)
     retention_period: Optional[int] = _RepoRetentionPeriodField(default=None)
     log_i18n_profile_id: Optional[UUID] = _RepoLogI18nProfileIdField(default=None)
+    log_id_type: RepoLogIdType = _RepoLogIdTypeField(default=RepoLogIdType.UUID4)
 
 
 class RepoUpdate(BaseModel):
@@ -71,12 +84,16 @@ class RepoUpdate(BaseModel):
     status: RepoStatus = _RepoStatusField(default=None)
     retention_period: Optional[int] = _RepoRetentionPeriodField(default=None)
     log_i18n_profile_id: Optional[UUID] = _RepoLogI18nProfileIdField(default=None)
+    log_id_type: RepoLogIdType = _RepoLogIdTypeField(default=None)
 
 
 class RepoStats(BaseModel, HasDatetimeSerialization):
     last_log_date: datetime | None = Field(description="The last log date")
     log_count: int = Field(description="The log count")
     storage_size: int = Field(description="The database storage size")
+    failed_ingestion_count: int = Field(
+        description="The number of logs that could not be saved from the ingestion queue"
+    )
 
     model_config = ConfigDict(
         json_schema_extra={
@@ -84,6 +101,7 @@ class RepoStats(BaseModel, HasDatetimeSerialization):
                 "last_log_date": "2024-01-03T00:00:00.000Z",
                 "log_count": 1000,
                 "storage_size": 100889890,
+                "failed_ingestion_count": 0,
             }
         }
     )
@@ -100,6 +118,7 @@ class RepoResponse(_BaseRepoResponse, HasDatetimeSerialization):
     status: RepoStatus = _RepoStatusField()
     retention_period: int | None = _RepoRetentionPeriodField()
     log_i18n_profile_id: UUID | None = _RepoLogI18nProfileIdField()
+    log_id_type: RepoLogIdType = _RepoLogIdTypeField()
 
 
 class RepoWithStatsResponse(RepoResponse):
@@ -117,6 +136,7 @@ class RepoWithStatsResponse(RepoResponse):
             status=repo.status,
             retention_period=repo.retention_period,
             log_i18n_profile_id=repo.log_i18n_profile_id,
+            log_id_type=repo.log_id_type,
             stats=None,
         )
 
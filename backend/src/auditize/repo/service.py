@@ -22,6 +22,7 @@ from auditize.exceptions import (
     ValidationError,
 )
 from auditize.i18n.lang import Lang
+from auditize.log.attachment_store import get_attachment_store
 from auditize.log.index import create_index, delete_index
 from auditize.log_i18n_profile.models import LogLabels
 from auditize.log_i18n_profile.service import get_log_i18n_profile_translation
@@ -61,6 +62,7 @@ async def create_repo(
         status=repo_create.status,
         retention_period=repo_create.retention_period,
         log_i18n_profile_id=repo_create.log_i18n_profile_id,
+        log_id_type=repo_create.log_id_type,
         log_db_name=(
             existing_log_db_name
             if existing_log_db_name
@@ -118,7 +120,11 @@ async def get_repo_stats(session: AsyncSession, repo_id: UUID) -> RepoStats:
     repo = await _get_repo(session, repo_id)
     log_service = await LogService.for_maintenance(session, repo)
     stats = RepoStats(
-        first_log_date=None, last_log_date=None, log_count=0, storage_size=0
+        first_log_date=None,
+        last_log_date=None,
+        log_count=0,
+        storage_size=0,
+        failed_ingestion_count=await log_service.get_failed_ingestion_count(),
     )
 
     try:
@@ -227,6 +233,7 @@ async def get_user_repos(
 async def delete_repo(session: AsyncSession, repo_id: UUID):
     repo = await get_repo(session, repo_id)
     await delete_index(repo)
+    await get_attachment_store().delete_all(f"{repo.id}/")
     await delete_sql_model(session, Repo, repo.id)
 
 
@@ -1,8 +1,9 @@
 import enum
+from datetime import datetime
 from uuid import UUID
 
+from sqlalchemy import DateTime, ForeignKey
 from sqlalchemy import Enum as SqlEnum
-from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from auditize.database.sql.models import HasDates, HasId, SqlModel
@@ -14,6 +15,11 @@ class RepoStatus(enum.StrEnum):
     DISABLED = "disabled"
 
 
+class RepoLogIdType(enum.StrEnum):
+    UUID4 = "uuid4"  # random
+    UUID7 = "uuid7"  # time-ordered
+
+
 class Repo(SqlModel, HasId, HasDates):
     from auditize.log_i18n_profile.sql_models import LogI18nProfile
 
@@ -25,6 +31,9 @@ class Repo(SqlModel, HasId, HasDates):
         SqlEnum(RepoStatus, native_enum=False), default=RepoStatus.ENABLED
     )
     retention_period: Mapped[int | None] = mapped_column()
+    log_id_type: Mapped[RepoLogIdType] = mapped_column(
+        SqlEnum(RepoLogIdType, native_enum=False), default=RepoLogIdType.UUID4
+    )
     log_i18n_profile_id: Mapped[UUID | None] = mapped_column(
         ForeignKey("log_i18n_profile.id")
     )
@@ -33,3 +42,11 @@ class Repo(SqlModel, HasId, HasDates):
     )
     reindex_cursor: Mapped[str | None] = mapped_column(default=None)
     reindexed_logs_count: Mapped[int] = mapped_column(default=0)
+    # The time of the last write of the repository logs, used as a write generation
+    # by the caches of log searches (see auditize.log.service)
+    log_written_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+    # Bumped each time log entities are deleted or modified, it invalidates the
+    # consolidated log entities cached by all the processes (see auditize.log.service)
+    log_entity_generation: Mapped[int] = mapped_column(default=0)
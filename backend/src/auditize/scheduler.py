@@ -11,6 +11,16 @@ async def log_expiration_job():
         await LogService.apply_log_retention_period(session)
 
 
+async def log_idempotency_key_expiration_job():
+    async with open_db_session() as session:
+        await LogService.purge_expired_idempotency_keys(session)
+
+
+async def attachment_tmp_content_purge_job():
+    async with open_db_session() as session:
+        await LogService.purge_stale_attachment_tmp_contents(session)
+
+
 def build_scheduler():
     config = get_config()
     scheduler = AsyncIOScheduler()
@@ -18,4 +28,12 @@ def build_scheduler():
         log_expiration_job,
         CronTrigger.from_crontab(config.log_expiration_schedule),
     )
+    scheduler.add_job(
+        log_idempotency_key_expiration_job,
+        CronTrigger.from_crontab("0 * * * *"),  # every hour
+    )
+    scheduler.add_job(
+        attachment_tmp_content_purge_job,
+        CronTrigger.from_crontab("30 * * * *"),  # every hour
+    )
     return scheduler
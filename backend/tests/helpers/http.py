@@ -63,6 +63,7 @@ class HttpTestHelper(AsyncClient):
         self,
         path,
         *,
+        headers=None,
         json=None,
         files=None,
         data=None,
@@ -72,6 +73,7 @@ class HttpTestHelper(AsyncClient):
         return await self.assert_request(
             "POST",
             path,
+            headers=headers,
             json=json,
             files=files,
             data=data,
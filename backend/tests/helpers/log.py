@@ -1,4 +1,4 @@
-import base64
+import hashlib
 import typing
 from copy import deepcopy
 from typing import Any
@@ -152,10 +152,38 @@ class PreparedLog:
         expected["saved_at"] = matchers.IsA(str)
         expected["emitted_at"] = matchers.IsA(str)
         for expected_attachment in expected["attachments"]:
-            expected_attachment["data"] = base64.b64encode(
-                expected_attachment["data"]
-            ).decode()
+            # NB: the attachment content lives in the attachment store
+            data = expected_attachment.pop("data")
+            expected_attachment["size"] = len(data)
+            expected_attachment["sha256"] = hashlib.sha256(data).hexdigest()
+            expected_attachment["encoding"] = None
+            expected_attachment["key"] = matchers.IsA(str)
             expected_attachment["saved_at"] = matchers.IsA(str)
+        expected["search_text"] = [
+            field["value"]
+            for field in (
+                expected["source"]
+                + expected["details"]
+                + (expected["actor"]["extra"] if expected["actor"] else [])
+                + (expected["resource"]["extra"] if expected["resource"] else [])
+            )
+            if field["type"] in ("string", "json")
+        ] + ([expected["resource"]["name"]] if expected["resource"] else [])
+        expected["entity_refs"] = [entity["ref"] for entity in expected["entity_path"]]
+        expected["tag_refs"] = [
+            tag["ref"] for tag in expected["tags"] if tag["ref"] is not None
+        ]
+        expected["tag_types"] = [tag["type"] for tag in expected["tags"]]
+        expected["tag_names"] = [
+            tag["name"] for tag in expected["tags"] if tag["name"] is not None
+        ]
+        expected["attachment_types"] = [
+            attachment["type"] for attachment in expected["attachments"]
+        ]
+        expected["attachment_mime_types"] = [
+            attachment["mime_type"] for attachment in expected["attachments"]
+        ]
+        expected["attachment_count"] = len(expected["attachments"])
         expected["log_id"] = self.id
         del expected["id"]
         return expected
@@ -53,6 +53,7 @@ class PreparedRepo:
             "status": "enabled",
             "log_i18n_profile_id": None,
             "retention_period": None,
+            "log_id_type": "uuid4",
             **(extra or {}),
         }
 
@@ -64,6 +65,7 @@ class PreparedRepo:
                 "status": self.data.get("status", "enabled"),
                 "retention_period": self.data.get("retention_period", None),
                 "log_i18n_profile_id": self.data.get("log_i18n_profile_id", None),
+                "log_id_type": self.data.get("log_id_type", "uuid4"),
                 **(extra or {}),
             }
         )
@@ -0,0 +1,100 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from auditize.helpers.cache import AsyncCache, LruCache
+
+
+def test_lru_cache_get_set():
+    cache = LruCache(max_size=10)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert len(cache) == 1
+
+
+def test_lru_cache_eviction():
+    cache = LruCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "a" is now the most recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_ttl():
+    cache = LruCache(max_size=10, ttl=60)
+    with patch("auditize.helpers.cache.time.monotonic", return_value=1000):
+        cache.set("a", 1)
+    with patch("auditize.helpers.cache.time.monotonic", return_value=1059):
+        assert cache.get("a") == 1
+    with patch("auditize.helpers.cache.time.monotonic", return_value=1060):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_disabled():
+    cache = LruCache(max_size=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_lru_cache_invalidate():
+    cache = LruCache(max_size=10)
+    cache.set(("repo_1", "a"), 1)
+    cache.set(("repo_1", "b"), 2)
+    cache.set(("repo_2", "a"), 3)
+    assert cache.invalidate(lambda key: key[0] == "repo_1") == 2
+    assert cache.get(("repo_1", "a")) is None
+    assert cache.get(("repo_2", "a")) == 3
+
+
+@pytest.mark.anyio
+async def test_async_cache_coalescing():
+    cache = AsyncCache(max_size=10, ttl=60)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    assert await asyncio.gather(*(cache.get("a", compute) for _ in range(5))) == [1] * 5
+    assert calls == 1
+    assert await cache.get("a", compute) == 1
+    assert calls == 1
+
+
+@pytest.mark.anyio
+async def test_async_cache_stale_while_revalidate():
+    cache = AsyncCache(max_size=10, ttl=10, stale_ttl=60)
+    values = iter([1, 2])
+
+    async def compute():
+        return next(values)
+
+    with patch("auditize.helpers.cache.time.monotonic", return_value=1000):
+        assert await cache.get("a", compute) == 1
+    with patch("auditize.helpers.cache.time.monotonic", return_value=1010):
+        # the outdated value is served while being refreshed in the background
+        assert await cache.get("a", compute) == 1
+        await asyncio.sleep(0)
+        assert await cache.get("a", compute) == 2
+
+
+@pytest.mark.anyio
+async def test_async_cache_error():
+    cache = AsyncCache(max_size=10, ttl=60)
+
+    async def compute():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        await cache.get("a", compute)
+    # the failed computation is not cached
+    assert await cache.get("a", lambda: asyncio.sleep(0, result=1)) == 1
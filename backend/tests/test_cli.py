@@ -2,13 +2,21 @@ import json
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from unittest import mock
+from uuid import UUID
 
 import pytest
+from sqlalchemy import select
 
 from auditize.__main__ import async_main
+from auditize.config import get_config
+from auditize.database.dbm import get_elastic_client, open_db_session
+from auditize.log.models import Log
+from auditize.log.service import LogService
+from auditize.log.sql_models import LogIngestionQueueItem
 from auditize.version import __version__
 from conftest import RepoBuilder
 from helpers.http import HttpTestHelper
+from helpers.log import PreparedLog
 
 pytestmark = pytest.mark.anyio
 
@@ -163,3 +171,156 @@ async def test_empty_repo(superadmin_client: HttpTestHelper, repo_builder: RepoB
     assert (await superadmin_client.get(f"/api/repos/{repo.id}/logs/entities")).json()[
         "items"
     ] == []
+
+
+async def test_empty_repo_then_create_log(
+    superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    # Make sure that the entities are consolidated again once the repo has been emptied
+    # (i.e. the consolidation cache has been properly invalidated)
+    repo = await repo_builder({})
+    await repo.create_log(superadmin_client)
+    await async_main(["empty-repo", repo.id])
+    await repo.create_log(superadmin_client)
+    assert (await superadmin_client.get(f"/api/repos/{repo.id}/logs/entities")).json()[
+        "items"
+    ] == [
+        {
+            "ref": "entity",
+            "name": "Entity",
+            "parent_entity_ref": None,
+            "has_children": False,
+        }
+    ]
+
+
+async def test_ingest_worker(
+    superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo = await repo_builder({})
+    with mock.patch.object(get_config(), "log_ingestion_queue", True):
+        resp = await superadmin_client.assert_post(
+            f"/repos/{repo.id}/logs",
+            json=PreparedLog.prepare_data(),
+            expected_status_code=202,
+        )
+        log_id = resp.json()["id"]
+        resp = await superadmin_client.assert_post_ok(
+            f"/repos/{repo.id}/logs/bulk",
+            json=[PreparedLog.prepare_data(), PreparedLog.prepare_data()],
+        )
+        assert [item["status"] for item in resp.json()["items"]] == [202, 202]
+
+    # the logs are queued, not saved yet
+    assert (await repo.get_log_count()) == 0
+    await superadmin_client.assert_get_not_found(f"/repos/{repo.id}/logs/{log_id}")
+
+    await async_main(["ingest-worker", "--once"])
+
+    assert (await repo.get_log_count()) == 3
+    await superadmin_client.assert_get_ok(f"/repos/{repo.id}/logs/{log_id}")
+    assert (await superadmin_client.get(f"/api/repos/{repo.id}/logs/entities")).json()[
+        "items"
+    ] == [
+        {
+            "ref": "entity",
+            "name": "Entity",
+            "parent_entity_ref": None,
+            "has_children": False,
+        }
+    ]
+
+    # the queue is now empty
+    await async_main(["ingest-worker", "--once"])
+    assert (await repo.get_log_count()) == 3
+
+
+async def test_ingest_worker_import_conflict(
+    superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo = await repo_builder({})
+    log_data = PreparedLog.prepare_data(
+        {
+            "id": "019463d5-d6dc-7d15-8b7c-3b5e3a3b1f0e",
+            "emitted_at": "2024-01-15T10:30:00.000Z",
+        }
+    )
+    with mock.patch.object(get_config(), "log_ingestion_queue", True):
+        await superadmin_client.assert_post(
+            f"/repos/{repo.id}/logs/import", json=log_data, expected_status_code=202
+        )
+        # a log with the same id is already waiting in the queue
+        await superadmin_client.assert_post_constraint_violation(
+            f"/repos/{repo.id}/logs/import", json=log_data
+        )
+
+    await async_main(["ingest-worker", "--once"])
+    assert (await repo.get_log_count()) == 1
+
+
+async def test_ingest_worker_import_existing_log(
+    superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo = await repo_builder({})
+    log_data = PreparedLog.prepare_data(
+        {
+            "id": "019463d5-d6dc-7d15-8b7c-3b5e3a3b1f0e",
+            "emitted_at": "2024-01-15T10:30:00.000Z",
+        }
+    )
+    await superadmin_client.assert_post_created(
+        f"/repos/{repo.id}/logs/import", json=log_data
+    )
+    with mock.patch.object(get_config(), "log_ingestion_queue", True):
+        await superadmin_client.assert_post(
+            f"/repos/{repo.id}/logs/import", json=log_data, expected_status_code=202
+        )
+
+    await async_main(["ingest-worker", "--once"])
+    assert (await repo.get_log_count()) == 1
+
+    # the failure is kept and reported
+    async with open_db_session() as session:
+        (item,) = await session.scalars(
+            select(LogIngestionQueueItem).where(
+                LogIngestionQueueItem.repo_id == UUID(repo.id)
+            )
+        )
+    assert item.failed_at is not None
+    assert item.error == f"Log {log_data['id']} already exists"
+    resp = await superadmin_client.assert_get_ok(f"/repos/{repo.id}?include=stats")
+    assert resp.json()["stats"]["failed_ingestion_count"] == 1
+
+    # failed items are not processed again
+    async with open_db_session() as session:
+        assert await LogService.process_ingestion_queue(session) == 0
+
+
+async def test_ingest_worker_already_saved_log(
+    superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo = await repo_builder({})
+    with mock.patch.object(get_config(), "log_ingestion_queue", True):
+        resp = await superadmin_client.assert_post(
+            f"/repos/{repo.id}/logs",
+            json=PreparedLog.prepare_data(),
+            expected_status_code=202,
+        )
+    log_id = resp.json()["id"]
+
+    # simulate a previous attempt that saved the log but could not remove it
+    # from the queue
+    async with open_db_session() as session:
+        item = await session.get(LogIngestionQueueItem, UUID(log_id))
+        service = await LogService.for_maintenance(session, repo.id)
+        await get_elastic_client().create(
+            index=service.write_alias,
+            id=log_id,
+            document=Log.model_validate(item.log).to_es_document(),
+            refresh=True,
+        )
+
+    await async_main(["ingest-worker", "--once"])
+    assert (await repo.get_log_count()) == 1
+    async with open_db_session() as session:
+        assert await session.get(LogIngestionQueueItem, UUID(log_id)) is None
@@ -40,6 +40,27 @@ def test_get_config():
     assert config.is_smtp_enabled() is False
     assert config.cors_allow_origins == []
     assert config.log_expiration_schedule == "0 1 * * *"
+    assert config.log_write_buffer_size == 0
+    assert config.log_write_buffer_latency == 50
+    assert config.log_entity_cache_size == 100_000
+    assert config.log_entity_cache_ttl == 3600
+    assert config.log_custom_field_type_cache_ttl == 60
+    assert config.log_search_cache_size == 0
+    assert config.log_search_cache_ttl == 10
+    assert config.log_aggregation_cache_ttl == 10
+    assert config.log_ingestion_queue is False
+    assert config.log_idempotency_key_ttl == 86400
+    assert config.log_write_rate_limit_apikey == 0
+    assert config.log_write_rate_limit_repo == 0
+    assert config.log_write_rate_limit_burst == 10
+    assert config.attachment_store == "elasticsearch"
+    assert config.attachment_store_path is None
+    assert config.attachment_s3_endpoint_url is None
+    assert config.attachment_s3_bucket is None
+    assert config.attachment_s3_region == "us-east-1"
+    assert config.attachment_s3_access_key_id is None
+    assert config.attachment_s3_secret_access_key is None
+    assert config.attachment_compression is False
     assert config.cookie_secure is False
     assert config.test_mode is True
     assert config.online_doc is False
@@ -77,6 +98,27 @@ def test_config_minimum_viable_config():
     assert config.is_smtp_enabled() is False
     assert config.cors_allow_origins == []
     assert config.log_expiration_schedule == "0 1 * * *"
+    assert config.log_write_buffer_size == 0
+    assert config.log_write_buffer_latency == 50
+    assert config.log_entity_cache_size == 100_000
+    assert config.log_entity_cache_ttl == 3600
+    assert config.log_custom_field_type_cache_ttl == 60
+    assert config.log_search_cache_size == 0
+    assert config.log_search_cache_ttl == 10
+    assert config.log_aggregation_cache_ttl == 10
+    assert config.log_ingestion_queue is False
+    assert config.log_idempotency_key_ttl == 86400
+    assert config.log_write_rate_limit_apikey == 0
+    assert config.log_write_rate_limit_repo == 0
+    assert config.log_write_rate_limit_burst == 10
+    assert config.attachment_store == "elasticsearch"
+    assert config.attachment_store_path is None
+    assert config.attachment_s3_endpoint_url is None
+    assert config.attachment_s3_bucket is None
+    assert config.attachment_s3_region == "us-east-1"
+    assert config.attachment_s3_access_key_id is None
+    assert config.attachment_s3_secret_access_key is None
+    assert config.attachment_compression is False
     assert config.cookie_secure is False
     assert config.test_mode is False
     assert config.online_doc is False
@@ -148,6 +190,165 @@ def test_config_var_log_expiration_schedule_invalid():
         )
 
 
+def test_config_var_log_write_buffer():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_WRITE_BUFFER_SIZE": "500",
+            "AUDITIZE_LOG_WRITE_BUFFER_LATENCY": "20",
+        }
+    )
+    assert config.log_write_buffer_size == 500
+    assert config.log_write_buffer_latency == 20
+
+
+def test_config_var_log_entity_cache():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_ENTITY_CACHE_SIZE": "1000",
+            "AUDITIZE_LOG_ENTITY_CACHE_TTL": "60",
+        }
+    )
+    assert config.log_entity_cache_size == 1000
+    assert config.log_entity_cache_ttl == 60
+
+
+def test_config_var_log_custom_field_type_cache_ttl():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_CUSTOM_FIELD_TYPE_CACHE_TTL": "0",
+        }
+    )
+    assert config.log_custom_field_type_cache_ttl == 0
+
+
+def test_config_var_log_search_cache():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_SEARCH_CACHE_SIZE": "1000",
+            "AUDITIZE_LOG_SEARCH_CACHE_TTL": "60",
+        }
+    )
+    assert config.log_search_cache_size == 1000
+    assert config.log_search_cache_ttl == 60
+
+
+def test_config_var_log_aggregation_cache_ttl():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_AGGREGATION_CACHE_TTL": "0",
+        }
+    )
+    assert config.log_aggregation_cache_ttl == 0
+
+
+def test_config_var_log_ingestion_queue():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_INGESTION_QUEUE": "true",
+        }
+    )
+    assert config.log_ingestion_queue is True
+
+
+def test_config_var_log_idempotency_key_ttl():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_IDEMPOTENCY_KEY_TTL": "3600",
+        }
+    )
+    assert config.log_idempotency_key_ttl == 3600
+
+
+def test_config_var_log_write_rate_limit():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_LOG_WRITE_RATE_LIMIT_APIKEY": "50",
+            "AUDITIZE_LOG_WRITE_RATE_LIMIT_REPO": "200.5",
+            "AUDITIZE_LOG_WRITE_RATE_LIMIT_BURST": "5",
+        }
+    )
+    assert config.log_write_rate_limit_apikey == 50
+    assert config.log_write_rate_limit_repo == 200.5
+    assert config.log_write_rate_limit_burst == 5
+
+
+def test_config_var_attachment_store_filesystem():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_ATTACHMENT_STORE": "filesystem",
+            "AUDITIZE_ATTACHMENT_STORE_PATH": "/var/lib/auditize/attachments",
+        }
+    )
+    assert config.attachment_store == "filesystem"
+    assert config.attachment_store_path == "/var/lib/auditize/attachments"
+
+
+def test_config_var_attachment_store_filesystem_missing_path():
+    with pytest.raises(ConfigError, match="AUDITIZE_ATTACHMENT_STORE_PATH"):
+        Config.load_from_env(
+            {**MINIMUM_VIABLE_CONFIG, "AUDITIZE_ATTACHMENT_STORE": "filesystem"}
+        )
+
+
+def test_config_var_attachment_store_s3():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_ATTACHMENT_STORE": "s3",
+            "AUDITIZE_ATTACHMENT_S3_ENDPOINT_URL": "http://localhost:9000",
+            "AUDITIZE_ATTACHMENT_S3_BUCKET": "auditize",
+            "AUDITIZE_ATTACHMENT_S3_REGION": "eu-west-3",
+            "AUDITIZE_ATTACHMENT_S3_ACCESS_KEY_ID": "access_key",
+            "AUDITIZE_ATTACHMENT_S3_SECRET_ACCESS_KEY": "secret_key",
+        }
+    )
+    assert config.attachment_store == "s3"
+    assert config.attachment_s3_endpoint_url == "http://localhost:9000"
+    assert config.attachment_s3_bucket == "auditize"
+    assert config.attachment_s3_region == "eu-west-3"
+    assert config.attachment_s3_access_key_id == "access_key"
+    assert config.attachment_s3_secret_access_key == "secret_key"
+
+
+def test_config_var_attachment_store_s3_incomplete():
+    with pytest.raises(
+        ConfigError, match="Attachment store configuration is incomplete"
+    ):
+        Config.load_from_env(
+            {
+                **MINIMUM_VIABLE_CONFIG,
+                "AUDITIZE_ATTACHMENT_STORE": "s3",
+                "AUDITIZE_ATTACHMENT_S3_ENDPOINT_URL": "http://localhost:9000",
+            }
+        )
+
+
+def test_config_var_attachment_store_invalid():
+    with pytest.raises(ConfigError):
+        Config.load_from_env(
+            {**MINIMUM_VIABLE_CONFIG, "AUDITIZE_ATTACHMENT_STORE": "ftp"}
+        )
+
+
+def test_config_var_attachment_compression():
+    config = Config.load_from_env(
+        {
+            **MINIMUM_VIABLE_CONFIG,
+            "AUDITIZE_ATTACHMENT_COMPRESSION": "true",
+        }
+    )
+    assert config.attachment_compression is True
+
+
 def test_config_smtp_enabled():
     config = Config.load_from_env(
         {
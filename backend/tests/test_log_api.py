@@ -1,10 +1,20 @@
 import base64
+import hashlib
 import json
 from datetime import datetime
 from unittest.mock import patch
+from uuid import UUID
 
 import pytest
-
+from sqlalchemy import select
+
+from auditize.config import get_config
+from auditize.database import get_dbm
+from auditize.database.dbm import open_db_session
+from auditize.exceptions import ConstraintViolation
+from auditize.log.attachment_store import get_attachment_store
+from auditize.log.service import LogService
+from auditize.log.sql_models import LogAttachmentBlob
 from conftest import ApikeyBuilder, RepoBuilder, UserBuilder
 from helpers import matchers
 from helpers.http import HttpTestHelper
@@ -61,6 +71,27 @@ async def test_create_log_minimal_fields(
     )
 
 
+async def test_create_log_with_log_id_type(
+    log_write_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo_uuid4 = await repo_builder({})
+    log = await repo_uuid4.create_log(log_write_client)
+    assert UUID(log.id).version == 4
+
+    repo_uuid7 = await repo_builder({"log_id_type": "uuid7"})
+    log_ids = []
+    for _ in range(3):
+        log = await repo_uuid7.create_log(log_write_client)
+        log_ids.append(UUID(log.id))
+    resp = await log_write_client.assert_post_ok(
+        f"/repos/{repo_uuid7.id}/logs/bulk",
+        json=[PreparedLog.prepare_data(), PreparedLog.prepare_data()],
+    )
+    log_ids.extend(UUID(item["id"]) for item in resp.json()["items"])
+    assert all(log_id.version == 7 for log_id in log_ids)
+    assert log_ids == sorted(log_ids)
+
+
 async def test_create_log_with_emitted_at(
     log_write_client: HttpTestHelper, repo: PreparedRepo
 ):
@@ -626,6 +657,560 @@ async def test_import_log_forbidden(
     )
 
 
+async def test_create_logs_bulk(log_rw_client: HttpTestHelper, repo: PreparedRepo):
+    logs_data = [
+        PreparedLog.prepare_data(),
+        PreparedLog.prepare_data(
+            {"action": {"type": "user_logout", "category": "authentication"}}
+        ),
+    ]
+    resp = await log_rw_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/bulk",
+        json=logs_data,
+        expected_json={
+            "errors": False,
+            "items": [
+                {"status": 201, "id": matchers.IsA(str), "error": None},
+                {"status": 201, "id": matchers.IsA(str), "error": None},
+            ],
+        },
+    )
+    for item, log_data in zip(resp.json()["items"], logs_data):
+        await log_rw_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/{item['id']}",
+            expected_json=PreparedLog.build_expected_api_response(
+                {"id": item["id"], **log_data}
+            ),
+        )
+    assert await repo.get_log_count() == 2
+
+
+async def test_create_logs_bulk_partial_failure(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await repo.create_log_with(
+        log_write_client,
+        {"entity_path": [{"ref": "Entity A", "name": "Entity A"}]},
+    )
+
+    await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/bulk",
+        json=[
+            PreparedLog.prepare_data(
+                {"entity_path": [{"ref": "Another ref", "name": "Entity A"}]}
+            ),
+            PreparedLog.prepare_data(),
+        ],
+        expected_json={
+            "errors": True,
+            "items": [
+                {
+                    "status": 409,
+                    "id": None,
+                    "error": {
+                        "message": matchers.IsA(str),
+                        "localized_message": None,
+                    },
+                },
+                {"status": 201, "id": matchers.IsA(str), "error": None},
+            ],
+        },
+    )
+    assert await repo.get_log_count() == 2
+
+
+async def test_create_logs_bulk_entity_conflict_within_batch(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/bulk",
+        json=[
+            PreparedLog.prepare_data(
+                {"entity_path": [{"ref": "Entity A", "name": "Entity A"}]}
+            ),
+            PreparedLog.prepare_data(
+                {"entity_path": [{"ref": "Another ref", "name": "Entity A"}]}
+            ),
+        ],
+        expected_json={
+            "errors": True,
+            "items": [
+                {"status": 201, "id": matchers.IsA(str), "error": None},
+                {
+                    "status": 409,
+                    "id": None,
+                    "error": {
+                        "message": matchers.IsA(str),
+                        "localized_message": None,
+                    },
+                },
+            ],
+        },
+    )
+    assert await repo.get_log_count() == 1
+
+
+async def test_create_logs_bulk_invalid_log(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_write_client.assert_post_bad_request(
+        f"/repos/{repo.id}/logs/bulk",
+        json=[PreparedLog.prepare_data(), {"action": {"type": "user_login"}}],
+    )
+    assert await repo.get_log_count() == 0
+
+
+async def test_create_logs_bulk_empty(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_write_client.assert_post_bad_request(
+        f"/repos/{repo.id}/logs/bulk", json=[]
+    )
+
+
+async def test_create_logs_bulk_forbidden(
+    no_permission_client: HttpTestHelper, repo: PreparedRepo
+):
+    await no_permission_client.assert_post_forbidden(
+        f"/repos/{repo.id}/logs/bulk", json=[PreparedLog.prepare_data()]
+    )
+
+
+async def test_create_log_idempotency_key(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    log_data = PreparedLog.prepare_data()
+    resp = await log_write_client.assert_post_created(
+        f"/repos/{repo.id}/logs",
+        headers={"Idempotency-Key": "key-1"},
+        json=log_data,
+    )
+    log_id = resp.json()["id"]
+
+    # replay, the original log is returned
+    await log_write_client.assert_post_created(
+        f"/repos/{repo.id}/logs",
+        headers={"Idempotency-Key": "key-1"},
+        json=log_data,
+        expected_json=resp.json(),
+    )
+
+    # the same key with a different payload
+    await log_write_client.assert_post_constraint_violation(
+        f"/repos/{repo.id}/logs",
+        headers={"Idempotency-Key": "key-1"},
+        json=PreparedLog.prepare_data({"action": {"type": "other", "category": "c"}}),
+    )
+
+    # another key
+    resp = await log_write_client.assert_post_created(
+        f"/repos/{repo.id}/logs",
+        headers={"Idempotency-Key": "key-2"},
+        json=log_data,
+    )
+    assert resp.json()["id"] != log_id
+
+    assert await repo.get_log_count() == 2
+
+
+async def test_create_log_idempotency_key_after_failure(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await repo.create_log_with(
+        log_write_client,
+        {"entity_path": [{"ref": "Entity A", "name": "Entity A"}]},
+    )
+
+    # the key of a failed request can be reused
+    await log_write_client.assert_post_constraint_violation(
+        f"/repos/{repo.id}/logs",
+        headers={"Idempotency-Key": "key"},
+        json=PreparedLog.prepare_data(
+            {"entity_path": [{"ref": "Another ref", "name": "Entity A"}]}
+        ),
+    )
+    await log_write_client.assert_post_created(
+        f"/repos/{repo.id}/logs",
+        headers={"Idempotency-Key": "key"},
+        json=PreparedLog.prepare_data(),
+    )
+    assert await repo.get_log_count() == 2
+
+
+async def test_create_log_idempotency_key_per_repo(
+    log_write_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo_1 = await repo_builder({})
+    repo_2 = await repo_builder({})
+    for repo in repo_1, repo_2:
+        await log_write_client.assert_post_created(
+            f"/repos/{repo.id}/logs",
+            headers={"Idempotency-Key": "key"},
+            json=PreparedLog.prepare_data(),
+        )
+        assert await repo.get_log_count() == 1
+
+
+async def test_create_logs_bulk_idempotency_key(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await repo.create_log_with(
+        log_write_client,
+        {"entity_path": [{"ref": "Entity A", "name": "Entity A"}]},
+    )
+    logs_data = [
+        PreparedLog.prepare_data(),
+        PreparedLog.prepare_data(
+            {"entity_path": [{"ref": "Another ref", "name": "Entity A"}]}
+        ),
+    ]
+    resp = await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/bulk",
+        headers={"Idempotency-Key": "key"},
+        json=logs_data,
+    )
+    log_id = resp.json()["items"][0]["id"]
+    assert resp.json()["items"][1]["status"] == 409
+
+    # replay the batch once the failed log has been fixed
+    logs_data[1] = PreparedLog.prepare_data()
+    resp = await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/bulk",
+        headers={"Idempotency-Key": "key"},
+        json=logs_data,
+        expected_json={
+            "errors": False,
+            "items": [
+                {"status": 201, "id": log_id, "error": None},
+                {"status": 201, "id": matchers.IsA(str), "error": None},
+            ],
+        },
+    )
+    assert await repo.get_log_count() == 3
+
+
+async def test_import_logs_bulk_idempotency_key(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    logs_data = [
+        PreparedLog.prepare_data({"emitted_at": "2024-01-15T10:30:00.000Z"}),
+        PreparedLog.prepare_data({"emitted_at": "2024-01-16T10:30:00.000Z"}),
+    ]
+    resp = await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/import/bulk",
+        headers={"Idempotency-Key": "key"},
+        json=logs_data,
+    )
+    log_ids = [item["id"] for item in resp.json()["items"]]
+
+    # replay
+    await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/import/bulk",
+        headers={"Idempotency-Key": "key"},
+        json=logs_data,
+        expected_json={
+            "errors": False,
+            "items": [
+                {"status": 201, "id": log_id, "error": None} for log_id in log_ids
+            ],
+        },
+    )
+    assert await repo.get_log_count() == 2
+
+
+async def test_create_log_rate_limit_apikey(
+    log_write_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo_1 = await repo_builder({})
+    repo_2 = await repo_builder({})
+    # allow a burst of 2 logs, then almost nothing
+    with (
+        patch.object(get_config(), "log_write_rate_limit_apikey", 0.01),
+        patch.object(get_config(), "log_write_rate_limit_burst", 200),
+    ):
+        await repo_1.create_log(log_write_client)
+        await repo_2.create_log(log_write_client)
+        resp = await log_write_client.assert_post(
+            f"/repos/{repo_1.id}/logs",
+            json=PreparedLog.prepare_data(),
+            expected_status_code=429,
+        )
+        assert 0 < int(resp.headers["Retry-After"]) <= 100
+        # bulk requests consume one token per log
+        await log_write_client.assert_post(
+            f"/repos/{repo_2.id}/logs/bulk",
+            json=[PreparedLog.prepare_data()],
+            expected_status_code=429,
+        )
+
+
+async def test_create_logs_bulk_rate_limit_repo(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    with (
+        patch.object(get_config(), "log_write_rate_limit_repo", 0.01),
+        patch.object(get_config(), "log_write_rate_limit_burst", 300),
+    ):
+        await log_write_client.assert_post_ok(
+            f"/repos/{repo.id}/logs/bulk",
+            json=[PreparedLog.prepare_data(), PreparedLog.prepare_data()],
+        )
+        await log_write_client.assert_post(
+            f"/repos/{repo.id}/logs/bulk",
+            json=[PreparedLog.prepare_data(), PreparedLog.prepare_data()],
+            expected_status_code=429,
+        )
+        await log_write_client.assert_post_created(
+            f"/repos/{repo.id}/logs", json=PreparedLog.prepare_data()
+        )
+    assert await repo.get_log_count() == 3
+
+
+async def test_add_attachment_rate_limit(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    with (
+        patch.object(get_config(), "log_write_rate_limit_repo", 0.01),
+        patch.object(get_config(), "log_write_rate_limit_burst", 200),
+    ):
+        log = await repo.create_log(log_write_client)
+        await log.upload_attachment(log_write_client)
+        await log_write_client.assert_post(
+            f"/repos/{repo.id}/logs/{log.id}/attachments",
+            files={"file": ("file.txt", b"text content")},
+            data={"type": "text"},
+            expected_status_code=429,
+        )
+
+
+async def test_create_logs_bulk_rate_limit_over_capacity(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    with (
+        patch.object(get_config(), "log_write_rate_limit_repo", 0.01),
+        patch.object(get_config(), "log_write_rate_limit_burst", 200),
+    ):
+        # a batch larger than the bucket capacity is allowed on a full bucket
+        # but is charged in full
+        await log_write_client.assert_post_ok(
+            f"/repos/{repo.id}/logs/bulk",
+            json=[PreparedLog.prepare_data() for _ in range(5)],
+        )
+        await log_write_client.assert_post(
+            f"/repos/{repo.id}/logs",
+            json=PreparedLog.prepare_data(),
+            expected_status_code=429,
+        )
+    assert await repo.get_log_count() == 5
+
+
+async def test_create_log_rate_limit_refund(
+    log_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    # bucket capacities: 3 tokens for the repository, 1.5 tokens for the API key
+    with (
+        patch.object(get_config(), "log_write_rate_limit_repo", 0.01),
+        patch.object(get_config(), "log_write_rate_limit_apikey", 0.005),
+        patch.object(get_config(), "log_write_rate_limit_burst", 300),
+    ):
+        await repo.create_log(log_write_client)
+        # rejected by the API key bucket, the repository bucket must not be charged
+        await log_write_client.assert_post(
+            f"/repos/{repo.id}/logs",
+            json=PreparedLog.prepare_data(),
+            expected_status_code=429,
+        )
+        with patch.object(get_config(), "log_write_rate_limit_apikey", 0):
+            await log_write_client.assert_post_ok(
+                f"/repos/{repo.id}/logs/bulk",
+                json=[PreparedLog.prepare_data() for _ in range(2)],
+            )
+    assert await repo.get_log_count() == 3
+
+
+async def test_import_logs_bulk(log_write_client: HttpTestHelper, repo: PreparedRepo):
+    existing_log = await repo.create_log(log_write_client)
+
+    await log_write_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/import/bulk",
+        json=[
+            PreparedLog.prepare_data(
+                {"id": UNKNOWN_UUID, "emitted_at": "2024-01-15T10:30:00.000Z"}
+            ),
+            PreparedLog.prepare_data(
+                {"id": existing_log.id, "emitted_at": "2024-01-15T10:30:00.000Z"}
+            ),
+        ],
+        expected_json={
+            "errors": True,
+            "items": [
+                {"status": 201, "id": UNKNOWN_UUID, "error": None},
+                {
+                    "status": 409,
+                    "id": None,
+                    "error": {
+                        "message": f"Log {existing_log.id} already exists",
+                        "localized_message": None,
+                    },
+                },
+            ],
+        },
+    )
+    assert await repo.get_log_count() == 2
+
+
+async def test_create_log_with_attachments(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    log_data = PreparedLog.prepare_data()
+    resp = await log_rw_client.assert_post(
+        f"/repos/{repo.id}/logs/multipart",
+        data={
+            "log": json.dumps(log_data),
+            "attachments": json.dumps(
+                [
+                    {"type": "text_file"},
+                    {
+                        "type": "binary",
+                        "name": "data.bin",
+                        "mime_type": "application/octet-stream",
+                    },
+                ]
+            ),
+        },
+        files=[
+            ("files", ("file.txt", b"text content", "text/plain")),
+            ("files", ("file.bin", b"binary content")),
+        ],
+        expected_status_code=201,
+    )
+    log = PreparedLog(resp.json()["id"], log_data, repo)
+
+    await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}",
+        expected_json=log.expected_api_response(
+            {
+                "attachments": [
+                    {
+                        "name": "file.txt",
+                        "type": "text_file",
+                        "mime_type": "text/plain",
+                        "saved_at": DATETIME_FORMAT,
+                    },
+                    {
+                        "name": "data.bin",
+                        "type": "binary",
+                        "mime_type": "application/octet-stream",
+                        "saved_at": DATETIME_FORMAT,
+                    },
+                ]
+            }
+        ),
+    )
+    for i, expected_content in enumerate((b"text content", b"binary content")):
+        resp = await log_rw_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/{log.id}/attachments/{i}"
+        )
+        assert resp.content == expected_content
+
+
+async def test_create_log_with_attachments_no_attachment(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    log_data = PreparedLog.prepare_data()
+    resp = await log_rw_client.assert_post(
+        f"/repos/{repo.id}/logs/multipart",
+        data={"log": json.dumps(log_data)},
+        files={},
+        expected_status_code=201,
+    )
+    log = PreparedLog(resp.json()["id"], log_data, repo)
+    await log.assert_db()
+
+
+async def test_create_log_with_attachments_mismatch(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_rw_client.assert_post_bad_request(
+        f"/repos/{repo.id}/logs/multipart",
+        data={
+            "log": json.dumps(PreparedLog.prepare_data()),
+            "attachments": json.dumps([{"type": "text"}, {"type": "text"}]),
+        },
+        files=[("files", ("file.txt", b"text content"))],
+    )
+    assert await repo.get_log_count() == 0
+
+
+async def test_create_log_with_attachments_invalid_log(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_rw_client.assert_post_bad_request(
+        f"/repos/{repo.id}/logs/multipart",
+        data={
+            "log": json.dumps({"action": {"type": "user_login"}}),
+            "attachments": json.dumps([{"type": "text"}]),
+        },
+        files=[("files", ("file.txt", b"text content"))],
+    )
+
+
+async def test_create_log_with_attachments_too_large(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_rw_client.assert_post(
+        f"/repos/{repo.id}/logs/multipart",
+        data={
+            "log": json.dumps(PreparedLog.prepare_data()),
+            "attachments": json.dumps([{"type": "text"}, {"type": "text"}]),
+        },
+        files=[
+            ("files", ("small.txt", b"small content")),
+            ("files", ("large.txt", b"A" * 2048)),
+        ],
+        expected_status_code=413,
+    )
+    assert await repo.get_log_count() == 0
+    # no attachment content is left behind
+    async with open_db_session() as session:
+        blobs = await session.scalars(
+            select(LogAttachmentBlob).where(LogAttachmentBlob.repo_id == UUID(repo.id))
+        )
+        assert list(blobs) == []
+
+
+async def test_create_log_with_attachments_save_error(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    with patch.object(
+        LogService, "_write_log", side_effect=ConstraintViolation("Conflict")
+    ):
+        await log_rw_client.assert_post_constraint_violation(
+            f"/repos/{repo.id}/logs/multipart",
+            data={
+                "log": json.dumps(PreparedLog.prepare_data()),
+                "attachments": json.dumps([{"type": "text"}]),
+            },
+            files=[("files", ("file.txt", b"text content"))],
+        )
+    # the attachment content is released along with the unsaved log
+    async with open_db_session() as session:
+        blobs = await session.scalars(
+            select(LogAttachmentBlob).where(LogAttachmentBlob.repo_id == UUID(repo.id))
+        )
+        assert list(blobs) == []
+
+
+async def test_create_log_with_attachments_forbidden(
+    log_read_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_read_client.assert_post_forbidden(
+        f"/repos/{repo.id}/logs/multipart",
+        data={"log": json.dumps(PreparedLog.prepare_data())},
+        files={},
+    )
+
+
 async def test_add_attachment_binary_and_all_fields(
     log_write_client: HttpTestHelper, repo: PreparedRepo
 ):
@@ -659,6 +1244,44 @@ async def test_add_attachment_binary_and_all_fields(
         }
     )
 
+    # the attachment content is not kept in the log document but in the attachment store
+    db_log = await get_dbm().elastic_client.get(
+        index=f"{repo.log_db_name}_read", id=log.id
+    )
+    (attachment,) = db_log["_source"]["attachments"]
+    assert attachment["key"] == f"{repo.id}/sha256/{hashlib.sha256(data).hexdigest()}"
+    assert await get_attachment_store().get(attachment["key"]) == data
+
+
+async def test_add_attachment_deduplication(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    log_1 = await repo.create_log(log_rw_client)
+    log_2 = await repo.create_log(log_rw_client)
+    await log_1.upload_attachment(log_rw_client, data=b"same content", name="a.txt")
+    await log_2.upload_attachment(log_rw_client, data=b"same content", name="b.txt")
+    await log_2.upload_attachment(log_rw_client, data=b"other content")
+
+    keys = [
+        attachment["key"]
+        for log in (log_1, log_2)
+        for attachment in (await repo.get_log(log.id))["attachments"]
+    ]
+    # identical contents are stored once
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+
+    async with open_db_session() as session:
+        blobs = await session.scalars(
+            select(LogAttachmentBlob).where(LogAttachmentBlob.repo_id == UUID(repo.id))
+        )
+    assert sorted((blob.size, blob.ref_count) for blob in blobs) == [(12, 2), (13, 1)]
+
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log_2.id}/attachments/0"
+    )
+    assert resp.content == b"same content"
+
 
 async def test_add_attachment_too_large(
     log_rw_client: HttpTestHelper,
@@ -830,71 +1453,237 @@ async def test_get_log_forbidden_entity(
             }
         }
     )
-    async with apikey.client() as client:
-        client: HttpTestHelper
-        await client.assert_get_ok(f"/repos/{repo.id}/logs/{log_1.id}")
-        await client.assert_get_not_found(f"/repos/{repo.id}/logs/{log_2.id}")
+    async with apikey.client() as client:
+        client: HttpTestHelper
+        await client.assert_get_ok(f"/repos/{repo.id}/logs/{log_1.id}")
+        await client.assert_get_not_found(f"/repos/{repo.id}/logs/{log_2.id}")
+
+
+@pytest.mark.parametrize(
+    "repo_status,status_code", [("readonly", 200), ("disabled", 403)]
+)
+async def test_get_log_not_enabled_repo_status(
+    superadmin_client: HttpTestHelper,
+    repo: PreparedRepo,
+    repo_status: str,
+    status_code: int,
+):
+    log = await repo.create_log(superadmin_client)
+    await repo.update_status(superadmin_client, repo_status)
+    await superadmin_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}", expected_status_code=status_code
+    )
+
+
+async def test_get_log_attachment_text_and_minimal_fields(
+    log_read_client: HttpTestHelper, log_write_client, repo: PreparedRepo
+):
+    log = await repo.create_log(log_write_client)
+
+    await log_write_client.assert_post(
+        f"/repos/{repo.id}/logs/{log.id}/attachments",
+        files={"file": ("file.txt", "test data")},
+        data={"type": "text_file"},
+        expected_status_code=204,
+    )
+
+    resp = await log_read_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0"
+    )
+    assert resp.headers["Content-Disposition"] == "attachment; filename=file.txt"
+    assert resp.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert resp.content == b"test data"
+
+
+async def test_get_log_attachment_binary_and_all_fields(
+    log_read_client: HttpTestHelper,
+    log_write_client: HttpTestHelper,
+    repo: PreparedRepo,
+):
+    log = await repo.create_log(log_write_client)
+
+    data_base64 = "srX7jaKuqoXJQm7YocqmFzSwjObc0ycvnMYor28L9Kc="
+    data = base64.b64decode(data_base64)
+
+    await log_write_client.assert_post(
+        f"/repos/{repo.id}/logs/{log.id}/attachments",
+        files={"file": ("file.bin", data)},
+        data={"type": "binary", "name": "test_file.bin", "mime_type": "image/jpeg"},
+        expected_status_code=204,
+    )
+
+    resp = await log_read_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0"
+    )
+    assert resp.headers["Content-Disposition"] == "attachment; filename=test_file.bin"
+    assert resp.headers["Content-Type"] == "image/jpeg"
+    assert resp.content == data
+
+
+async def test_get_log_attachment_cache_headers(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    log = await repo.create_log(log_rw_client)
+    await log.upload_attachment(log_rw_client, data=b"test data")
+
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0"
+    )
+    etag = f'"{hashlib.sha256(b"test data").hexdigest()}"'
+    assert resp.headers["ETag"] == etag
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert "immutable" in resp.headers["Cache-Control"]
+
+    # matching ETag
+    resp = await log_rw_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"If-None-Match": f'"other", W/{etag}'},
+        expected_status_code=304,
+    )
+    assert resp.content == b""
+    assert resp.headers["ETag"] == etag
+
+    # not matching ETag
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"If-None-Match": '"other"'},
+    )
+    assert resp.content == b"test data"
+
+
+@pytest.mark.parametrize(
+    "range_header,expected_content,expected_content_range",
+    [
+        ("bytes=0-3", b"test", "bytes 0-3/9"),
+        ("bytes=5-", b"data", "bytes 5-8/9"),
+        ("bytes=5-100", b"data", "bytes 5-8/9"),
+        ("bytes=-4", b"data", "bytes 5-8/9"),
+        ("bytes=-100", b"test data", "bytes 0-8/9"),
+    ],
+)
+async def test_get_log_attachment_range(
+    log_rw_client: HttpTestHelper,
+    repo: PreparedRepo,
+    range_header: str,
+    expected_content: bytes,
+    expected_content_range: str,
+):
+    log = await repo.create_log(log_rw_client)
+    await log.upload_attachment(log_rw_client, data=b"test data")
+
+    resp = await log_rw_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Range": range_header},
+        expected_status_code=206,
+    )
+    assert resp.content == expected_content
+    assert resp.headers["Content-Range"] == expected_content_range
 
 
-@pytest.mark.parametrize(
-    "repo_status,status_code", [("readonly", 200), ("disabled", 403)]
-)
-async def test_get_log_not_enabled_repo_status(
-    superadmin_client: HttpTestHelper,
-    repo: PreparedRepo,
-    repo_status: str,
-    status_code: int,
+@pytest.mark.parametrize("range_header", ["bytes=0-1,4-5", "bytes=5-2", "items=0-1"])
+async def test_get_log_attachment_range_ignored(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo, range_header: str
 ):
-    log = await repo.create_log(superadmin_client)
-    await repo.update_status(superadmin_client, repo_status)
-    await superadmin_client.assert_get(
-        f"/repos/{repo.id}/logs/{log.id}", expected_status_code=status_code
+    log = await repo.create_log(log_rw_client)
+    await log.upload_attachment(log_rw_client, data=b"test data")
+
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Range": range_header},
     )
+    assert resp.content == b"test data"
 
 
-async def test_get_log_attachment_text_and_minimal_fields(
-    log_read_client: HttpTestHelper, log_write_client, repo: PreparedRepo
+async def test_get_log_attachment_range_not_satisfiable(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
 ):
-    log = await repo.create_log(log_write_client)
+    log = await repo.create_log(log_rw_client)
+    await log.upload_attachment(log_rw_client, data=b"test data")
 
-    await log_write_client.assert_post(
-        f"/repos/{repo.id}/logs/{log.id}/attachments",
-        files={"file": ("file.txt", "test data")},
-        data={"type": "text_file"},
-        expected_status_code=204,
+    resp = await log_rw_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Range": "bytes=9-"},
+        expected_status_code=416,
     )
+    assert resp.headers["Content-Range"] == "bytes */9"
 
-    resp = await log_read_client.assert_get(
-        f"/repos/{repo.id}/logs/{log.id}/attachments/0"
+
+async def test_get_log_attachment_if_range(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    log = await repo.create_log(log_rw_client)
+    await log.upload_attachment(log_rw_client, data=b"test data")
+    etag = f'"{hashlib.sha256(b"test data").hexdigest()}"'
+
+    resp = await log_rw_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Range": "bytes=0-3", "If-Range": etag},
+        expected_status_code=206,
+    )
+    assert resp.content == b"test"
+
+    # the attachment does not match, the whole content is returned
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Range": "bytes=0-3", "If-Range": '"other"'},
     )
-    assert resp.headers["Content-Disposition"] == "attachment; filename=file.txt"
-    assert resp.headers["Content-Type"] == "text/plain; charset=utf-8"
     assert resp.content == b"test data"
 
 
-async def test_get_log_attachment_binary_and_all_fields(
-    log_read_client: HttpTestHelper,
-    log_write_client: HttpTestHelper,
-    repo: PreparedRepo,
+async def test_get_log_attachment_compressed(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
 ):
-    log = await repo.create_log(log_write_client)
+    data = b"test data " * 100
+    log = await repo.create_log(log_rw_client)
+    with patch.object(get_config(), "attachment_compression", True):
+        await log.upload_attachment(
+            log_rw_client, data=data, mime_type="text/plain; charset=utf-8"
+        )
+        await log.upload_attachment(
+            log_rw_client, data=b"binary data " * 100, mime_type="image/png"
+        )
 
-    data_base64 = "srX7jaKuqoXJQm7YocqmFzSwjObc0ycvnMYor28L9Kc="
-    data = base64.b64decode(data_base64)
+    text_attachment, binary_attachment = (await repo.get_log(log.id))["attachments"]
+    assert text_attachment["encoding"] == "gzip"
+    assert text_attachment["size"] == len(data)
+    assert binary_attachment["encoding"] is None
+    stored = await get_attachment_store().get(text_attachment["key"])
+    assert len(stored) < len(data)
 
-    await log_write_client.assert_post(
-        f"/repos/{repo.id}/logs/{log.id}/attachments",
-        files={"file": ("file.bin", data)},
-        data={"type": "binary", "name": "test_file.bin", "mime_type": "image/jpeg"},
-        expected_status_code=204,
+    # the client accepts gzip, the stored content is sent as is
+    # (and transparently decoded by the HTTP client)
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Accept-Encoding": "gzip"},
     )
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert resp.content == data
+    gzip_etag = resp.headers["ETag"]
 
-    resp = await log_read_client.assert_get(
-        f"/repos/{repo.id}/logs/{log.id}/attachments/0"
+    # the client does not accept gzip, the content is decoded server-side
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Accept-Encoding": "gzip;q=0, identity"},
     )
-    assert resp.headers["Content-Disposition"] == "attachment; filename=test_file.bin"
-    assert resp.headers["Content-Type"] == "image/jpeg"
+    assert "Content-Encoding" not in resp.headers
     assert resp.content == data
+    assert resp.headers["ETag"] != gzip_etag
+
+    # ranges apply to the original content
+    resp = await log_rw_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Accept-Encoding": "gzip", "Range": "bytes=10-13"},
+        expected_status_code=206,
+    )
+    assert "Content-Encoding" not in resp.headers
+    assert resp.content == b"test"
+
+    await log_rw_client.assert_get(
+        f"/repos/{repo.id}/logs/{log.id}/attachments/0",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag},
+        expected_status_code=304,
+    )
 
 
 async def test_get_log_attachment_not_found_log_id(
@@ -1066,6 +1855,67 @@ async def test_get_logs_limit_and_cursor(
     )
 
 
+async def test_get_logs_pit(log_rw_client: HttpTestHelper, repo: PreparedRepo):
+    log1 = await repo.create_log(log_rw_client)
+    log2 = await repo.create_log(log_rw_client)
+    log3 = await repo.create_log(log_rw_client)
+
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs",
+        params={"limit": 2, "pit": "true"},
+        expected_json={
+            "items": [log3.expected_api_response(), log2.expected_api_response()],
+            "pagination": {"next_cursor": matchers.IsA(str)},
+        },
+    )
+
+    # a log that would be part of the next page is not visible from the point in time
+    await repo.create_log(
+        log_rw_client, emitted_at=datetime.fromisoformat("2020-01-01T00:00:00Z")
+    )
+    await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs",
+        params={"limit": 2, "cursor": resp.json()["pagination"]["next_cursor"]},
+        expected_json={
+            "items": [log1.expected_api_response()],
+            "pagination": {"next_cursor": None},
+        },
+    )
+
+
+async def test_get_logs_pit_invalid_cursor(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    await log_rw_client.assert_get_bad_request(
+        f"/repos/{repo.id}/logs",
+        params={
+            "cursor": base64.b64encode(
+                json.dumps(
+                    {"repo_id": repo.id, "pit_id": "invalid", "search_after": [1, "id"]}
+                ).encode()
+            ).decode()
+        },
+    )
+
+
+async def test_get_logs_pit_other_repo(
+    log_rw_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo_1 = await repo_builder({})
+    repo_2 = await repo_builder({})
+    for _ in range(3):
+        await repo_1.create_log(log_rw_client)
+
+    resp = await log_rw_client.assert_get_ok(
+        f"/repos/{repo_1.id}/logs", params={"limit": 2, "pit": "true"}
+    )
+    # the cursor cannot be used with another repository, even an empty one
+    await log_rw_client.assert_get_bad_request(
+        f"/repos/{repo_2.id}/logs",
+        params={"limit": 2, "cursor": resp.json()["pagination"]["next_cursor"]},
+    )
+
+
 async def _test_get_logs_filter(
     client: HttpTestHelper,
     repo: PreparedRepo,
@@ -1598,6 +2448,90 @@ async def test_get_logs_full_text_search_resource_name(
     await _test_get_logs_filter(log_rw_client, repo, {"q": "foo bar"}, log)
 
 
+async def test_get_logs_full_text_search_across_fields(
+    log_rw_client: HttpTestHelper, repo: PreparedRepo
+):
+    log = await repo.create_log_with(
+        log_rw_client,
+        {
+            "source": [{"name": "param1", "value": "foo"}],
+            "details": [{"name": "param2", "value": "bar"}],
+            "resource": {
+                "name": "baz",
+                "ref": "config-profile:123",
+                "type": "config_profile",
+            },
+        },
+    )
+    # NB: values of non-text custom fields are not searchable
+    await repo.create_log_with(
+        log_rw_client,
+        {
+            "source": [{"name": "param1", "value": "foo"}],
+            "details": [{"name": "param2", "value": "bar", "type": "enum"}],
+            "resource": {
+                "name": "baz",
+                "ref": "config-profile:123",
+                "type": "config_profile",
+            },
+        },
+    )
+    await _test_get_logs_filter(log_rw_client, repo, {"q": "baz bar foo"}, log)
+
+
+@pytest.mark.parametrize("mapping_version", [6, 7, 8])
+async def test_get_logs_filter_former_mapping_version(
+    log_rw_client: HttpTestHelper,
+    repo: PreparedRepo,
+    apikey_builder: ApikeyBuilder,
+    mapping_version: int,
+):
+    # the logs of an index that has not been reindexed yet lack the flattened fields,
+    # they are searched on the nested fields
+    log = await repo.create_log_with(
+        log_rw_client,
+        {
+            "details": [{"name": "param", "value": "foo"}],
+            "tags": [{"ref": "Tag:1", "type": "rich_tag", "name": "Rich tag"}],
+            "entity_path": [{"ref": "Entity:A", "name": "Entity A"}],
+        },
+    )
+    await log.upload_attachment(
+        log_rw_client, data=b"data", type="text", mime_type="text/plain"
+    )
+    other_log = await repo.create_log(log_rw_client)
+
+    with patch.object(
+        LogService, "_get_read_index_mapping_version", return_value=mapping_version
+    ):
+        for search_params in (
+            {"q": "foo"},
+            {"tag_ref": "Tag:1"},
+            {"tag_type": "rich_tag"},
+            {"tag_name": "Rich tag"},
+            {"has_attachment": True},
+            {"attachment_type": "text"},
+            {"attachment_mime_type": "text/plain"},
+            {"entity_ref": "Entity:A"},
+        ):
+            await _test_get_logs_filter(
+                log_rw_client, repo, search_params, log, extra_log=False
+            )
+        await _test_get_logs_filter(
+            log_rw_client, repo, {"has_attachment": False}, other_log, extra_log=False
+        )
+
+        apikey = await apikey_builder(
+            {
+                "logs": {
+                    "repos": [{"repo_id": repo.id, "readable_entities": ["Entity:A"]}]
+                }
+            }
+        )
+        async with apikey.client() as client:
+            await _test_get_logs_filter(client, repo, {}, log, extra_log=False)
+
+
 async def test_get_logs_filter_entity_id_exact_entity(
     log_rw_client: HttpTestHelper, repo: PreparedRepo
 ):
@@ -3015,6 +3949,15 @@ class _ConsolidatedCustomFieldsTest:
             log_read_client, self.get_path(repo.id)
         )
 
+    @pytest.mark.parametrize("cursor", [["field_1"], {"value_enum": "field_1"}])
+    async def test_invalid_cursor(
+        self, log_read_client: HttpTestHelper, repo: PreparedRepo, cursor
+    ):
+        await log_read_client.assert_get_bad_request(
+            self.get_path(repo.id),
+            params={"cursor": base64.b64encode(json.dumps(cursor).encode()).decode()},
+        )
+
     async def test_not_found(self, log_read_client: HttpTestHelper):
         await log_read_client.assert_get_not_found(self.get_path(UNKNOWN_UUID))
 
@@ -3122,6 +4065,15 @@ class _CustomFieldsEnumValuesTest:
             log_read_client, self.get_path(repo.id, "my_field")
         )
 
+    @pytest.mark.parametrize("cursor", [["value_1"], {"name": "value_1"}])
+    async def test_invalid_cursor(
+        self, log_read_client: HttpTestHelper, repo: PreparedRepo, cursor
+    ):
+        await log_read_client.assert_get_bad_request(
+            self.get_path(repo.id, "my_field"),
+            params={"cursor": base64.b64encode(json.dumps(cursor).encode()).decode()},
+        )
+
     async def test_not_found(self, log_read_client: HttpTestHelper):
         await log_read_client.assert_get_not_found(
             self.get_path(UNKNOWN_UUID, "my_field")
@@ -3236,6 +4188,50 @@ async def test_log_entity_consolidation_move_entity(
     )
 
 
+async def test_log_entity_consolidation_bulk(
+    superadmin_client: HttpTestHelper, repo: PreparedRepo
+):
+    await superadmin_client.assert_post_ok(
+        f"/repos/{repo.id}/logs/bulk",
+        json=[
+            PreparedLog.prepare_data_with_entity_path({}, entity_path=entity_path)
+            for entity_path in (["A", "AA"], ["A", "AB"], ["A", "AA"], ["B"])
+        ],
+    )
+    await superadmin_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/entities",
+        expected_json={
+            "items": [
+                {
+                    "ref": "A",
+                    "name": "A",
+                    "parent_entity_ref": None,
+                    "has_children": True,
+                },
+                {
+                    "ref": "AA",
+                    "name": "AA",
+                    "parent_entity_ref": "A",
+                    "has_children": False,
+                },
+                {
+                    "ref": "AB",
+                    "name": "AB",
+                    "parent_entity_ref": "A",
+                    "has_children": False,
+                },
+                {
+                    "ref": "B",
+                    "name": "B",
+                    "parent_entity_ref": None,
+                    "has_children": False,
+                },
+            ],
+            "pagination": {"next_cursor": None},
+        },
+    )
+
+
 @pytest.mark.parametrize(
     "path",
     [
@@ -3700,10 +4696,18 @@ async def test_get_logs_as_csv_with_export_max_rows(
     for _ in range(15):
         await repo.create_log(log_rw_client)
 
-    resp = await log_rw_client.assert_get_ok(
-        f"/repos/{repo.id}/logs/csv",
-    )
-    assert len(resp.text.splitlines()) == 11  # 10 logs + header
+    with patch.object(
+        LogService,
+        "close_pagination_cursor",
+        autospec=True,
+        side_effect=LogService.close_pagination_cursor,
+    ) as close_pagination_cursor:
+        resp = await log_rw_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/csv",
+        )
+        assert len(resp.text.splitlines()) == 11  # 10 logs + header
+    # the point in time of the export is closed as it stops before the last page
+    close_pagination_cursor.assert_awaited_once()
 
 
 async def test_get_logs_as_csv_with_export_max_rows_unlimited(
@@ -3850,10 +4854,18 @@ async def test_get_logs_as_jsonl_with_export_max_rows(
     for _ in range(15):
         await repo.create_log(log_rw_client)
 
-    resp = await log_rw_client.assert_get_ok(
-        f"/repos/{repo.id}/logs/jsonl",
-    )
-    assert len(_parse_jsonl_logs(resp.text)) == 10
+    with patch.object(
+        LogService,
+        "close_pagination_cursor",
+        autospec=True,
+        side_effect=LogService.close_pagination_cursor,
+    ) as close_pagination_cursor:
+        resp = await log_rw_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/jsonl",
+        )
+        assert len(_parse_jsonl_logs(resp.text)) == 10
+    # the point in time of the export is closed as it stops before the last page
+    close_pagination_cursor.assert_awaited_once()
 
 
 async def test_get_logs_as_jsonl_with_export_max_rows_unlimited(
@@ -3880,3 +4892,63 @@ async def test_get_logs_as_jsonl_forbidden(
     no_permission_client: HttpTestHelper, repo: PreparedRepo
 ):
     await no_permission_client.assert_get_forbidden(f"/repos/{repo.id}/logs/jsonl")
+
+
+async def test_count_logs(log_rw_client: HttpTestHelper, repo: PreparedRepo):
+    for action_type in ("type_1", "type_1", "type_2"):
+        await repo.create_log_with(
+            log_rw_client, {"action": {"type": action_type, "category": "category"}}
+        )
+
+    for exact in ("false", "true"):
+        await log_rw_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/count",
+            params={"exact": exact},
+            expected_json={"count": 3, "exact": True},
+        )
+        await log_rw_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/count",
+            params={"action_type": "type_1", "exact": exact},
+            expected_json={"count": 2, "exact": True},
+        )
+
+    # the exact count is not outdated by a new log
+    await repo.create_log_with(
+        log_rw_client, {"action": {"type": "type_1", "category": "category"}}
+    )
+    await log_rw_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/count",
+        params={"action_type": "type_1", "exact": "true"},
+        expected_json={"count": 3, "exact": True},
+    )
+
+
+async def test_count_logs_authorized_entities(
+    superadmin_client: HttpTestHelper,
+    repo: PreparedRepo,
+    apikey_builder: ApikeyBuilder,
+):
+    for entity in ("A", "B", "B"):
+        await repo.create_log(
+            superadmin_client,
+            PreparedLog.prepare_data_with_entity_path(entity_path=[entity]),
+        )
+
+    apikey = await apikey_builder(
+        {"logs": {"repos": [{"repo_id": repo.id, "readable_entities": ["B"]}]}}
+    )
+    async with apikey.client() as client:
+        await client.assert_get_ok(
+            f"/repos/{repo.id}/logs/count",
+            expected_json={"count": 2, "exact": True},
+        )
+
+
+async def test_count_logs_unknown_repo(log_read_client: HttpTestHelper):
+    await log_read_client.assert_get_not_found(f"/repos/{UNKNOWN_UUID}/logs/count")
+
+
+async def test_count_logs_forbidden(
+    no_permission_client: HttpTestHelper, repo: PreparedRepo
+):
+    await no_permission_client.assert_get_forbidden(f"/repos/{repo.id}/logs/count")
@@ -1,3 +1,5 @@
+import base64
+import hashlib
 import json
 from pathlib import Path
 
@@ -45,7 +47,7 @@ async def test_reindex(repo: PreparedRepo, superadmin_client: HttpTestHelper):
         assert (await repo.get_log(log_2.id)) is not None
 
 
-@pytest.mark.parametrize("version", [1, 2, 3, 4])
+@pytest.mark.parametrize("version", [1, 2, 3, 4, 5, 6, 7, 8])
 async def test_reindex_from_previous_version(
     superadmin_client: HttpTestHelper, version: int
 ):
@@ -80,9 +82,27 @@ async def test_reindex_from_previous_version(
         f"/repos/{repo.id}/logs/{expected_api_response['id']}"
     )
     assert resp.json() == expected_api_response
+
+    # attachment data has been moved out of the document into the attachment store
+    # (since v6, the document only references the content of the attachment store)
+    attachment_data = []
+    for attachment in expected_document["attachments"]:
+        if "data" not in attachment:
+            continue
+        data = base64.b64decode(attachment.pop("data"))
+        attachment["sha256"] = hashlib.sha256(data).hexdigest()
+        attachment["key"] = f"{repo.id}/sha256/{attachment['sha256']}"
+        attachment["encoding"] = None
+        attachment["size"] = len(data)
+        attachment_data.append(data)
     await assert_elastic_log_document(
         repo, expected_api_response["id"], expected_document
     )
+    for i, data in enumerate(attachment_data):
+        resp = await superadmin_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/{expected_api_response['id']}/attachments/{i}"
+        )
+        assert resp.content == data
 
 
 async def test_reindex_already_up_to_date(repo: PreparedRepo, capsys):
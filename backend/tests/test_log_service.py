@@ -1,10 +1,22 @@
+import asyncio
 from datetime import datetime, timedelta
-from uuid import UUID
+from unittest.mock import patch
+from uuid import UUID, uuid4
 
 import pytest
 
-from auditize.database.dbm import open_db_session
-from auditize.log.models import Emitter, EmitterType, LogCreate
+from auditize.database.dbm import get_elastic_client, open_db_session
+from auditize.exceptions import ConstraintViolation, NotFoundError
+from auditize.helpers.cache import AsyncCache, LruCache
+from auditize.log.attachment_store import get_attachment_store
+from auditize.log.buffer import LogWriteBuffer
+from auditize.log.models import (
+    Emitter,
+    EmitterType,
+    Log,
+    LogCreate,
+    LogSearchParams,
+)
 from auditize.log.service import LogService
 from conftest import RepoBuilder
 from helpers.http import HttpTestHelper
@@ -54,6 +66,14 @@ async def test_save_log_db_shape(repo: PreparedRepo):
         "attachments",
         "entity_path",
         "emitter",
+        "search_text",
+        "entity_refs",
+        "tag_refs",
+        "tag_types",
+        "tag_names",
+        "attachment_types",
+        "attachment_mime_types",
+        "attachment_count",
     }
     assert db_log["action"].keys() == {"type", "category"}
     assert db_log["actor"].keys() == {"ref", "type", "name", "extra"}
@@ -62,6 +82,322 @@ async def test_save_log_db_shape(repo: PreparedRepo):
     assert db_log["entity_path"][0].keys() == {"ref", "name"}
 
 
+def test_log_to_es_document():
+    log = Log.from_log_create(
+        make_log_data(
+            source=[{"name": "ip", "value": "127.0.0.1"}],
+            details=[
+                {"name": "count", "value": 42},
+                {"name": "ratio", "value": 0.5},
+                {"name": "enabled", "value": True},
+                {"name": "role", "value": "admin", "type": "enum"},
+                {"name": "date", "value": "2024-01-01T00:00:00Z", "type": "datetime"},
+            ],
+        ),
+        id=UUID(UNKNOWN_UUID),
+        emitter=Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key"),
+    )
+    log.attachments.append(
+        Log.Attachment(
+            name="file.txt", type="text", mime_type="text/plain", key="key", size=5
+        )
+    )
+    assert log.to_es_document() == log.model_dump(context="es")
+    assert Log.model_validate(log.to_es_document(), context="es") == log
+
+
+async def _create_log(repo: PreparedRepo):
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        return await log_service.create_log(
+            make_log_data(),
+            emitter=Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key"),
+        )
+
+
+async def test_log_write_buffer(repo: PreparedRepo):
+    buffer = LogWriteBuffer(get_elastic_client(), max_size=2, max_latency=0.05)
+    with patch("auditize.log.service.get_log_write_buffer", return_value=buffer):
+        # the first two logs are flushed because the buffer is full,
+        # the third one because the latency has elapsed
+        logs = await asyncio.gather(*(_create_log(repo) for _ in range(3)))
+    for log in logs:
+        assert await repo.get_log(log.id)
+    assert await repo.get_log_count() == 3
+
+
+async def test_log_write_buffer_conflict(repo: PreparedRepo):
+    log = await _create_log(repo)
+    document = await repo.get_log(log.id)
+
+    buffer = LogWriteBuffer(get_elastic_client(), max_size=10, max_latency=0.01)
+    with pytest.raises(ConstraintViolation):
+        await buffer.create(repo.write_alias, str(log.id), document, refresh=True)
+
+
+async def test_log_write_buffer_close(repo: PreparedRepo):
+    buffer = LogWriteBuffer(get_elastic_client(), max_size=10, max_latency=3600)
+    with patch("auditize.log.service.get_log_write_buffer", return_value=buffer):
+        task = asyncio.create_task(_create_log(repo))
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        # closing the buffer flushes the pending logs
+        await buffer.close()
+        log = await task
+    assert await repo.get_log(log.id)
+
+
+async def test_search_custom_field_types(repo: PreparedRepo):
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        log = await log_service.create_log(
+            make_log_data(
+                source=[{"name": "port", "value": 80, "type": "integer"}],
+                details=[
+                    {"name": "enabled", "value": True, "type": "boolean"},
+                    {"name": "level", "value": "high", "type": "enum"},
+                ],
+            ),
+            emitter=Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key"),
+        )
+
+        search_params = LogSearchParams(
+            source={"port": "80"}, details={"enabled": "true", "level": "high"}
+        )
+        with patch.object(
+            log_service.es, "search", wraps=log_service.es.search
+        ) as search:
+            logs, _ = await log_service.get_logs(search_params=search_params)
+            assert [found_log.id for found_log in logs] == [log.id]
+            # the 3 field types are resolved with a single aggregation request
+            assert search.call_count == 2
+
+            search.reset_mock()
+            logs, _ = await log_service.get_logs(search_params=search_params)
+            assert [found_log.id for found_log in logs] == [log.id]
+            # the field types are now cached
+            assert search.call_count == 1
+
+
+async def test_search_cache(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    cache = LruCache(100, 60)
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        log_1 = await log_service.create_log(make_log_data(), emitter=emitter)
+
+        with (
+            patch("auditize.log.service._log_search_cache", cache),
+            patch.object(
+                log_service.es, "search", wraps=log_service.es.search
+            ) as search,
+        ):
+            logs, _ = await log_service.get_logs()
+            assert [log.id for log in logs] == [log_1.id]
+            logs, _ = await log_service.get_logs()
+            assert [log.id for log in logs] == [log_1.id]
+            assert search.call_count == 1
+            assert len(cache) == 1
+
+            # a different search is not served from the cache
+            await log_service.get_logs(limit=5)
+            assert search.call_count == 2
+
+            # writing a log invalidates the cached searches of the repository
+            log_2 = await log_service.create_log(make_log_data(), emitter=emitter)
+            search.reset_mock()
+            logs, _ = await log_service.get_logs()
+            assert [log.id for log in logs] == [log_2.id, log_1.id]
+            assert search.call_count == 1
+
+
+async def test_search_cache_write_from_other_process(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    cache = LruCache(100, 60)
+    with patch("auditize.log.service._log_search_cache", cache):
+        async with open_db_session() as session:
+            log_service = await LogService.for_reading(session, UUID(repo.id))
+            await log_service.get_logs()
+            assert len(cache) == 1
+
+        # the log is written through a distinct session, as another process would do
+        async with open_db_session() as session:
+            log_service = await LogService.for_writing(session, UUID(repo.id))
+            new_log = await log_service.create_log(make_log_data(), emitter=emitter)
+
+        async with open_db_session() as session:
+            log_service = await LogService.for_reading(session, UUID(repo.id))
+            logs, _ = await log_service.get_logs()
+            assert [log.id for log in logs] == [new_log.id]
+            # NB: the search has been cached under the new write generation
+            assert len(cache) == 2
+
+
+async def test_log_write_generation_interval(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        with patch.object(log_service, "_refresh", False):
+            await log_service.create_log(make_log_data(), emitter=emitter)
+            written_at = log_service.repo.log_written_at
+            assert written_at is not None
+
+            # the generation is not bumped again within the interval
+            with patch.object(session, "scalar", wraps=session.scalar) as scalar:
+                await log_service._bump_log_write_generation()
+                assert scalar.call_count == 0
+            await log_service.create_log(make_log_data(), emitter=emitter)
+            assert log_service.repo.log_written_at == written_at
+
+
+async def test_log_entity_cache_empty_from_other_process(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    cache = LruCache(100, 60)
+    with patch("auditize.log.service._consolidated_log_entities", cache):
+        async with open_db_session() as session:
+            log_service = await LogService.for_writing(session, UUID(repo.id))
+            await log_service.create_log(make_log_data(), emitter=emitter)
+            assert len(cache) == 1
+
+        # the repository is emptied by another process, whose cache is distinct
+        with patch(
+            "auditize.log.service._consolidated_log_entities", LruCache(100, 60)
+        ):
+            async with open_db_session() as session:
+                log_service = await LogService.for_maintenance(session, UUID(repo.id))
+                await log_service.empty_log_db()
+
+        async with open_db_session() as session:
+            log_service = await LogService.for_writing(session, UUID(repo.id))
+            await log_service.create_log(make_log_data(), emitter=emitter)
+            entity = await log_service._get_log_entity("1")
+            assert entity.name == "Customer 1"
+
+
+async def test_search_cache_unsettled_write(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    cache = LruCache(100, 60)
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        await log_service.create_log(make_log_data(), emitter=emitter)
+
+        # the last write may not be searchable yet outside of the test mode
+        with (
+            patch("auditize.log.service._log_search_cache", cache),
+            patch.object(log_service, "_refresh", False),
+        ):
+            await log_service.get_logs()
+            assert len(cache) == 0
+
+
+async def test_count_cache_unsettled_write(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    cache = AsyncCache(100, 60)
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        await log_service.create_log(make_log_data(), emitter=emitter)
+
+        with patch("auditize.log.service._log_count_cache", cache):
+            assert await log_service.count_logs(exact=True) == (1, True)
+            assert len(cache._entries) == 1
+
+        # the last write may not be searchable yet outside of the test mode
+        cache = AsyncCache(100, 60)
+        with (
+            patch("auditize.log.service._log_count_cache", cache),
+            patch.object(log_service, "_refresh", False),
+        ):
+            assert await log_service.count_logs(exact=True) == (1, True)
+            assert len(cache._entries) == 0
+
+
+async def test_idempotency_key_consolidation_error(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        with patch.object(
+            LogService, "_consolidate_logs", side_effect=RuntimeError("Boom")
+        ):
+            with pytest.raises(RuntimeError):
+                await log_service.create_log(
+                    make_log_data(), emitter=emitter, idempotency_key="key"
+                )
+
+    # the log has been written, a retry must not save it again
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        log = await log_service.create_log(
+            make_log_data(), emitter=emitter, idempotency_key="key"
+        )
+    assert await repo.get_log_count() == 1
+    await repo.get_log(log.id)
+
+
+async def test_consolidate_log_entities_concurrently(repo: PreparedRepo):
+    emitter = Emitter(type=EmitterType.APIKEY, id=UNKNOWN_UUID, name="API Key")
+    refs = [f"entity:{i}" for i in range(10)]
+
+    async def create_logs(refs: list[str]):
+        async with open_db_session() as session:
+            log_service = await LogService.for_writing(session, UUID(repo.id))
+            await log_service.create_logs(
+                [
+                    make_log_data(entity_path=[{"ref": ref, "name": ref}])
+                    for ref in refs
+                ],
+                emitter=emitter,
+            )
+
+    # batches creating the same new entities in opposite orders must not deadlock
+    await asyncio.gather(create_logs(refs), create_logs(refs[::-1]))
+
+    async with open_db_session() as session:
+        log_service = await LogService.for_writing(session, UUID(repo.id))
+        for ref in refs:
+            await log_service._get_log_entity(ref)
+
+
+async def test_custom_field_registry_latest_type(
+    superadmin_client: HttpTestHelper, repo: PreparedRepo
+):
+    async def assert_field_type(expected_type: str):
+        await superadmin_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/details",
+            expected_json={
+                "items": [{"name": "field", "type": expected_type}],
+                "pagination": {"next_cursor": None},
+            },
+        )
+
+    await repo.create_log_with(
+        superadmin_client,
+        {"details": [{"name": "field", "value": 1, "type": "integer"}]},
+    )
+    await assert_field_type("integer")
+
+    # the type of an older occurrence of the field is ignored...
+    await repo.create_log_with(
+        superadmin_client,
+        {"details": [{"name": "field", "value": "value", "type": "enum"}]},
+        emitted_at=datetime.now() - timedelta(days=1),
+    )
+    await assert_field_type("integer")
+    # ... but its enum value is registered
+    await superadmin_client.assert_get_ok(
+        f"/repos/{repo.id}/logs/details/field/values",
+        expected_json={
+            "items": [{"value": "value"}],
+            "pagination": {"next_cursor": None},
+        },
+    )
+
+    await repo.create_log_with(
+        superadmin_client,
+        {"details": [{"name": "field", "value": "value", "type": "string"}]},
+    )
+    await assert_field_type("string")
+
+
 async def test_log_retention_period_disabled(
     superadmin_client: HttpTestHelper, repo: PreparedRepo
 ):
@@ -106,6 +442,68 @@ async def test_log_retention_period_enabled(
     assert await repo_2.get_log_count() == 2
 
 
+async def test_log_retention_period_purge_attachments(
+    superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
+):
+    repo = await repo_builder({"retention_period": 30})
+    expired_log = await repo.create_log(
+        superadmin_client, emitted_at=datetime.now() - timedelta(days=31)
+    )
+    await expired_log.upload_attachment(superadmin_client, data=b"expired")
+    await expired_log.upload_attachment(superadmin_client, data=b"shared")
+    kept_log = await repo.create_log(
+        superadmin_client, emitted_at=datetime.now() - timedelta(days=29)
+    )
+    await kept_log.upload_attachment(superadmin_client, data=b"kept")
+    await kept_log.upload_attachment(superadmin_client, data=b"shared")
+    expired_key = (await repo.get_log(expired_log.id))["attachments"][0]["key"]
+    kept_keys = [
+        attachment["key"]
+        for attachment in (await repo.get_log(kept_log.id))["attachments"]
+    ]
+
+    async with open_db_session() as session:
+        await LogService.apply_log_retention_period(session)
+
+    attachment_store = get_attachment_store()
+    with pytest.raises(NotFoundError):
+        await attachment_store.get(expired_key)
+    # the content shared with the expired log is still referenced by the kept log
+    assert [await attachment_store.get(key) for key in kept_keys] == [
+        b"kept",
+        b"shared",
+    ]
+
+
+async def test_purge_stale_attachment_tmp_contents(repo: PreparedRepo):
+    def make_uuid7(timestamp: datetime) -> UUID:
+        return UUID(
+            int=int(timestamp.timestamp() * 1000) << 80 | 0x7 << 76 | 0b10 << 62
+        )
+
+    attachment_store = get_attachment_store()
+    stale_keys = [
+        f"{repo.id}/tmp/{make_uuid7(datetime.now() - timedelta(days=2))}",
+        # a temporary key of a former version
+        f"{repo.id}/tmp/{uuid4()}",
+    ]
+    kept_keys = [
+        f"{repo.id}/tmp/{make_uuid7(datetime.now() - timedelta(minutes=5))}",
+        f"{repo.id}/tmp/not-a-uuid",
+    ]
+    for key in stale_keys + kept_keys:
+        await attachment_store.put(key, b"content")
+
+    async with open_db_session() as session:
+        await LogService.purge_stale_attachment_tmp_contents(session)
+
+    for key in stale_keys:
+        with pytest.raises(NotFoundError):
+            await attachment_store.get(key)
+    for key in kept_keys:
+        assert await attachment_store.get(key) == b"content"
+
+
 async def test_log_retention_period_purge_consolidated_data(
     superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
 ):
@@ -184,6 +582,21 @@ async def test_log_retention_period_purge_consolidated_data(
     async with open_db_session() as session:
         await LogService.apply_log_retention_period(session)
 
+    # the custom fields that are only used by expired logs are no longer listed
+    for relative_path, field_name in (
+        ("source", "source_field_to_be_kept"),
+        ("details", "detail_field_to_be_kept"),
+        ("actors/extras", "actor_extra_field_to_be_kept"),
+        ("resources/extras", "resource_extra_field_to_be_kept"),
+    ):
+        await superadmin_client.assert_get_ok(
+            f"/repos/{repo.id}/logs/{relative_path}",
+            expected_json={
+                "items": [{"name": field_name, "type": "string"}],
+                "pagination": {"next_cursor": None},
+            },
+        )
+
 
 async def test_log_retention_period_purge_log_entities_1(
     superadmin_client: HttpTestHelper, repo_builder: RepoBuilder
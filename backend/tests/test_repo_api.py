@@ -112,6 +112,19 @@ async def test_repo_create_with_retention_period(superadmin_client: HttpTestHelp
     )
 
 
+async def test_repo_create_with_log_id_type(superadmin_client: HttpTestHelper):
+    data = {
+        "name": "myrepo",
+        "log_id_type": "uuid7",
+    }
+
+    await superadmin_client.assert_post_created(
+        "/repos",
+        json=data,
+        expected_json=PreparedRepo.build_expected_api_response(data),
+    )
+
+
 async def test_repo_create_missing_name(repo_write_client: HttpTestHelper):
     await repo_write_client.assert_post_bad_request(
         "/repos",
@@ -202,6 +215,16 @@ async def test_repo_update_set_retention_period(
     )
 
 
+async def test_repo_update_log_id_type(
+    repo_write_client: HttpTestHelper, repo: PreparedRepo
+):
+    await repo_write_client.assert_patch_ok(
+        f"/repos/{repo.id}",
+        json={"log_id_type": "uuid7"},
+        expected_json=repo.expected_api_response({"log_id_type": "uuid7"}),
+    )
+
+
 async def test_repo_update_unset_retention_period(
     repo_write_client: HttpTestHelper,
     repo_builder: RepoBuilder,
@@ -294,6 +317,7 @@ async def test_repo_get_with_stats_empty(
                     "last_log_date": None,
                     "log_count": 0,
                     "storage_size": matchers.IsA(int),
+                    "failed_ingestion_count": 0,
                 }
             }
         ),
@@ -319,6 +343,7 @@ async def test_repo_get_with_stats(
                     "last_log_date": "2024-01-02T00:00:00.000Z",
                     "log_count": 2,
                     "storage_size": matchers.IsA(int),
+                    "failed_ingestion_count": 0,
                 }
             }
         ),
@@ -670,6 +695,7 @@ async def test_repo_list_with_stats(
                             "last_log_date": "2024-01-01T00:00:00.123Z",
                             "log_count": 1,
                             "storage_size": matchers.IsA(int),
+                            "failed_ingestion_count": 0,
                         }
                     }
                 )
@@ -730,6 +756,7 @@ async def test_repo_list_user_repos_simple(
                         "retention_period",
                         "stats",
                         "log_i18n_profile_id",
+                        "log_id_type",
                     )
                 ],
                 "pagination": {
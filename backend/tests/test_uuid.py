@@ -0,0 +1,27 @@
+import time
+from unittest.mock import patch
+from uuid import RFC_4122, UUID
+
+from auditize.helpers.uuid import uuid7
+
+
+def test_uuid7_format():
+    value = uuid7()
+    assert isinstance(value, UUID)
+    assert value.version == 7
+    assert value.variant == RFC_4122
+    # the first 48 bits are the timestamp in milliseconds
+    assert abs((value.int >> 80) - time.time_ns() // 1_000_000) < 1000
+
+
+def test_uuid7_ordering():
+    values = [uuid7() for _ in range(10_000)]
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+
+
+def test_uuid7_ordering_same_millisecond():
+    with patch("time.time_ns", return_value=1_700_000_000_000_000_000):
+        values = [uuid7() for _ in range(5000)]
+    assert values == sorted(values)
+    assert all(value.version == 7 for value in values)